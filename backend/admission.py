@@ -0,0 +1,142 @@
+"""
+Admission control: token buckets per client and per upstream.
+
+- Clients: /chat, /chat/stream and /chat/batch take a token from the
+  caller's bucket (CLIENT_RATE_PER_MINUTE, bursts of CLIENT_BURST) or are
+  turned away at the door with 429 and a Retry-After for when the next
+  token arrives. The client is the CLIENT_ID_HEADER value, set by whatever
+  authenticates users in front of us, or else the remote address.
+- Upstreams: calls to rate-limited upstreams (UPSTREAM_RATE_LIMITS, e.g.
+  "alphavantage=5/60,llm=15/60" for 5 calls a minute to Alpha Vantage and
+  15 model calls a minute) wait their turn for a token, up to
+  UPSTREAM_MAX_WAIT_SECONDS. When the wait would be longer the call fails
+  right away with UpstreamRateLimited instead of earning a 429 upstream.
+  Names are the ones passed to http_client ("alphavantage", "search",
+  "duckduckgo") plus "llm" for model calls.
+
+Which turn gets a worker slot next is decided by the turn limiter in
+turn_runner: interactive before bulk, round robin between clients.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import Counter, Histogram
+
+CLIENT_RATE_PER_MINUTE = float(os.getenv("CLIENT_RATE_PER_MINUTE", "30"))
+CLIENT_BURST = float(os.getenv("CLIENT_BURST", "10"))
+CLIENT_ID_HEADER = os.getenv("CLIENT_ID_HEADER", "X-Client-Id")
+UPSTREAM_RATE_LIMITS = os.getenv("UPSTREAM_RATE_LIMITS", "alphavantage=5/60")
+UPSTREAM_MAX_WAIT_SECONDS = float(os.getenv("UPSTREAM_MAX_WAIT_SECONDS", "10"))
+MAX_TRACKED_CLIENTS = 10_000
+
+clients_rejected = Counter(
+    "chat_client_rate_limited_total",
+    "Requests turned away because their client was over its rate",
+)
+upstream_wait = Histogram(
+    "upstream_rate_limit_wait_seconds",
+    "Time calls waited for an upstream rate-limit token",
+    labelnames=("upstream",),
+)
+upstream_rejected = Counter(
+    "upstream_rate_limited_total",
+    "Calls failed locally because an upstream's rate limit would be exceeded",
+    labelnames=("upstream",),
+)
+
+
+class UpstreamRateLimited(Exception):
+    """Raised instead of calling an upstream that is out of rate-limit tokens"""
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate  # tokens per second
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, max_wait: float = 0.0) -> float:
+        """
+        Take a token, possibly one that only arrives in the future, and
+        return the seconds until it can be used. When that would be more
+        than `max_wait` nothing is taken; the return value then says how
+        long until a token would be available.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if wait <= max_wait:
+                # Going negative queues later callers behind this one
+                self.tokens -= 1
+            return wait
+
+
+def parse_rate_limits(spec: str) -> dict:
+    """"name=calls/seconds,..." -> {name: (calls per second, burst)}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = item.partition("=")
+        calls, _, seconds = rate.partition("/")
+        limits[name.strip()] = (float(calls) / float(seconds or 1), float(calls))
+    return limits
+
+
+class ClientLimiter:
+    """One token bucket per client, the least recently seen forgotten first"""
+
+    def __init__(self, rate_per_minute: float = CLIENT_RATE_PER_MINUTE, burst: float = CLIENT_BURST,
+                 max_clients: int = MAX_TRACKED_CLIENTS):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def check(self, client: str) -> float:
+        """0 if the client may go ahead, else the seconds until it may"""
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            bucket = self.buckets.get(client)
+            if bucket is None:
+                bucket = self.buckets[client] = TokenBucket(self.rate, self.burst)
+                if len(self.buckets) > self.max_clients:
+                    self.buckets.popitem(last=False)
+            self.buckets.move_to_end(client)
+        wait = bucket.reserve()
+        if wait > 0:
+            clients_rejected.inc()
+        return wait
+
+
+class UpstreamLimiter:
+    def __init__(self, limits: dict = None, max_wait: float = UPSTREAM_MAX_WAIT_SECONDS):
+        limits = limits if limits is not None else parse_rate_limits(UPSTREAM_RATE_LIMITS)
+        self.buckets = {name: TokenBucket(rate, burst) for name, (rate, burst) in limits.items()}
+        self.max_wait = max_wait
+
+    def acquire(self, upstream: str):
+        """Block until `upstream` may be called; raises UpstreamRateLimited"""
+        bucket = self.buckets.get(upstream)
+        if bucket is None:
+            return
+        wait = bucket.reserve(self.max_wait)
+        if wait > self.max_wait:
+            upstream_rejected.inc(upstream=upstream)
+            raise UpstreamRateLimited(
+                f"Rate limit for '{upstream}' reached, next call possible in {wait:.0f}s"
+            )
+        upstream_wait.observe(wait, upstream=upstream)
+        if wait > 0:
+            time.sleep(wait)
+
+
+client_limiter = ClientLimiter()
+upstream_limiter = UpstreamLimiter()
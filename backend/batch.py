@@ -0,0 +1,250 @@
+"""
+Batch turns for offline and bulk workloads: POST /chat/batch and
+
+    python batch.py prompts.jsonl --output results.jsonl
+
+Each item is {"message": ..., "thread_id": ..., "id": ...}; only message is
+required. Items without a thread_id get their own thread, named after the
+batch and the item. Every item is a full chat turn (tools, checkpoints,
+thread catalog), submitted to the turn scheduler at bulk priority: items
+queue behind any other turn on their thread, including interactive ones,
+and different threads run side by side up to BATCH_MAX_CONCURRENCY. An
+item refused a worker slot is retried after the suggested wait, up to
+BATCH_MAX_REJECTIONS times. Results come back as one JSON object per item in
+the order items finish, then a summary line.
+
+Finished items are recorded in `batch_items`. Running the same batch again
+(the same batch_id, which defaults to a hash of the items) skips items that
+already succeeded and returns their stored result with "resumed": true, so
+an interrupted nightly job can simply be restarted.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from itertools import count
+
+from chatbot_engine import lazy, stream_turn
+from leases import LeaseBusy
+from persistence import DATABASE_PATH, connect
+from turn_runner import BULK, TurnRejected
+from turns import ThreadQueueFull, turn_scheduler
+
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+BATCH_MAX_REJECTIONS = int(os.getenv("BATCH_MAX_REJECTIONS", "5"))
+
+BATCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batch_items (
+    batch_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    response TEXT,
+    error TEXT,
+    trace_id TEXT,
+    finished_at REAL NOT NULL,
+    PRIMARY KEY (batch_id, item_id)
+);
+-- Results go with their thread when it is purged
+CREATE INDEX IF NOT EXISTS idx_batch_items_thread ON batch_items (thread_id);
+"""
+
+
+# ---- items ----
+def parse_items(items) -> list:
+    """
+    Validate raw items (dicts) and fill in their ids, in input order.
+    Raises ValueError naming the first bad item.
+    """
+    parsed, seen = [], set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get("message"), str) or not item["message"].strip():
+            raise ValueError(f"Item {index} needs a non-empty 'message'")
+        item_id = str(item.get("id", index))
+        if item_id in seen:
+            raise ValueError(f"Item {index} repeats id '{item_id}'")
+        seen.add(item_id)
+        thread_id = item.get("thread_id")
+        if thread_id is not None and not isinstance(thread_id, str):
+            raise ValueError(f"Item {index} has a non-string 'thread_id'")
+        parsed.append({"id": item_id, "thread_id": thread_id, "message": item["message"]})
+    if len(parsed) > BATCH_MAX_ITEMS:
+        raise ValueError(f"A batch holds at most {BATCH_MAX_ITEMS} items, got {len(parsed)}")
+    return parsed
+
+
+def parse_jsonl(lines) -> list:
+    items = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {number} is not valid JSON: {e}") from e
+    return parse_items(items)
+
+
+def default_batch_id(items) -> str:
+    """Same items, same id: re-running an unchanged input resumes it"""
+    canonical = json.dumps(items, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.blake2b(canonical, digest_size=8).hexdigest()
+
+
+# ---- resume store ----
+class BatchStore:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.executescript(BATCH_SCHEMA)
+            self.conn.commit()
+
+    def completed(self, batch_id: str) -> dict:
+        """item_id -> stored result of the items that succeeded"""
+        with self.lock:
+            rows = self.conn.execute(
+                """SELECT item_id, thread_id, response, trace_id FROM batch_items
+                   WHERE batch_id = ? AND status = 'ok'""",
+                (batch_id,),
+            ).fetchall()
+        return {
+            item_id: {"thread_id": thread_id, "response": response, "trace_id": trace_id}
+            for item_id, thread_id, response, trace_id in rows
+        }
+
+    def record(self, batch_id: str, result: dict):
+        with self.lock:
+            self.conn.execute(
+                """INSERT OR REPLACE INTO batch_items
+                   (batch_id, item_id, thread_id, status, response, error, trace_id, finished_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (batch_id, result["id"], result["thread_id"], result["status"], result.get("response"),
+                 result.get("error"), result.get("trace_id"), time.time()),
+            )
+            self.conn.commit()
+
+
+@lazy
+def get_batch_store():
+    return BatchStore(connect(DATABASE_PATH))
+
+
+# ---- runner ----
+async def run_item(batch_id: str, item: dict, client: str = "") -> dict:
+    thread_id = item["thread_id"]
+    result = {"batch_id": batch_id, "id": item["id"], "thread_id": thread_id}
+    info = {}
+    started = time.perf_counter()
+    try:
+        for attempt in count():
+            try:
+                # Interactive turns go first when workers are short
+                subscription = await turn_scheduler.submit(thread_id, item["message"], stream_turn,
+                                                           client=client, priority=BULK)
+                try:
+                    chunks = [chunk async for chunk in subscription.chunks()]
+                finally:
+                    info = subscription.info
+                break
+            except (TurnRejected, ThreadQueueFull) as e:
+                if attempt >= BATCH_MAX_REJECTIONS:
+                    raise
+                # Bulk work waits for a quieter moment rather than failing
+                await asyncio.sleep(getattr(e, "retry_after", 1.0))
+        result.update(status="ok", response="".join(chunks))
+    except LeaseBusy as e:
+        result.update(status="error", error=str(e), code="thread_busy")
+    except (TurnRejected, ThreadQueueFull) as e:
+        result.update(status="error", error=str(e), code="server_busy")
+    except Exception as e:
+        result.update(status="error", error=str(e))
+    result.update(trace_id=info.get("trace_id"), duration_ms=round((time.perf_counter() - started) * 1000, 1))
+    return result
+
+
+async def run_batch(items, batch_id: str = None, max_concurrency: int = BATCH_MAX_CONCURRENCY, store=None,
+                    client: str = ""):
+    """
+    Run parsed items and yield one result per item as it finishes, then a
+    summary. Stopping early (e.g. the client went away) cancels the items
+    still running; the finished ones stay recorded for the next run.
+    """
+    batch_id = batch_id or default_batch_id(items)
+    store = store or get_batch_store()
+    started = time.perf_counter()
+    done = await asyncio.to_thread(store.completed, batch_id)
+    counts = {"ok": 0, "error": 0, "resumed": 0}
+
+    # Items of one thread stay together, in order
+    threads = {}
+    for item in items:
+        item = dict(item, thread_id=item["thread_id"] or f"batch-{batch_id}-{item['id']}")
+        if item["id"] in done:
+            counts["resumed"] += 1
+            yield {"batch_id": batch_id, "id": item["id"], "status": "ok", "resumed": True, **done[item["id"]]}
+        else:
+            threads.setdefault(item["thread_id"], []).append(item)
+
+    results = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run_thread(thread_items):
+        for item in thread_items:
+            async with semaphore:
+                result = await run_item(batch_id, item, client)
+            try:
+                await asyncio.to_thread(store.record, batch_id, result)
+            except Exception as e:
+                print(f"Could not record batch item {batch_id}/{item['id']}: {e}")
+            results.put_nowait(result)
+
+    tasks = [asyncio.create_task(run_thread(thread_items)) for thread_items in threads.values()]
+    try:
+        for _ in range(sum(len(thread_items) for thread_items in threads.values())):
+            result = await results.get()
+            counts[result["status"]] += 1
+            yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+    yield {"batch_id": batch_id, "summary": {**counts, "seconds": round(time.perf_counter() - started, 3)}}
+
+
+# ---- CLI ----
+async def run_cli(args):
+    if args.input == "-":
+        items = parse_jsonl(sys.stdin)
+    else:
+        with open(args.input) as f:
+            items = parse_jsonl(f)
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        async for result in run_batch(items, args.batch_id, args.concurrency):
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            if "summary" in result:
+                print(f"batch {result['batch_id']}: {result['summary']}", file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run chat turns from a JSONL file, one item per line")
+    parser.add_argument("input", help="JSONL file of {message, thread_id?, id?} items, or - for stdin")
+    parser.add_argument("--output", help="write NDJSON results here instead of stdout")
+    parser.add_argument("--batch-id", help="resume key (default: a hash of the items)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_MAX_CONCURRENCY)
+    asyncio.run(run_cli(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
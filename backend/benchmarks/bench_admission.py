@@ -0,0 +1,192 @@
+"""
+Admission control under contention, fully offline.
+
+Starts the stub upstream and a fake-LLM server with few worker slots, then
+for --duration seconds runs:
+
+- a greedy client: --greedy-streams concurrent /chat/stream requests
+  under one client id, re-sending as soon as each one ends or is refused
+- --interactive polite clients, one turn at a time with think time
+- optionally a /chat/batch job of --batch-items items (bulk priority)
+
+and reports, per group, turns completed, 429s and latency, the queue wait
+per priority from /metrics, and upstream calls against the configured
+budget. With fair queueing the polite clients' latency should stay close
+to an idle server's while the greedy client absorbs the 429s.
+
+    python benchmarks/bench_admission.py --duration 20
+    python benchmarks/bench_admission.py --client-rate 0   # no per-client limit
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+
+import httpx
+from bench_load import PROMPTS, free_port, start_server
+from common import summarize_ms
+from stub_upstream import start_stub_server
+
+
+class Group:
+    def __init__(self, name: str):
+        self.name = name
+        self.latency = []
+        self.rejected = 0
+        self.retry_after = []
+        self.errors = 0
+
+    def report(self) -> dict:
+        return {
+            "completed": len(self.latency),
+            "rejected_429": self.rejected,
+            "errors": self.errors,
+            "latency": summarize_ms(self.latency),
+            "retry_after_max": max(self.retry_after, default=None),
+        }
+
+
+async def stream_turn(client: httpx.AsyncClient, client_id: str, group: Group, thread_id: str = None):
+    began = time.perf_counter()
+    payload = {"message": PROMPTS[int(began * 1000) % len(PROMPTS)], "thread_id": thread_id or str(uuid.uuid4())}
+    try:
+        async with client.stream("POST", "/chat/stream", json=payload, headers={"X-Client-Id": client_id}) as response:
+            if response.status_code == 429:
+                group.rejected += 1
+                group.retry_after.append(int(response.headers.get("Retry-After", "0")))
+                return False
+            if response.status_code != 200:
+                group.errors += 1
+                return False
+            async for line in response.aiter_lines():
+                if line.startswith("data:") and json.loads(line[5:])["type"] == "error":
+                    group.errors += 1
+                    return False
+    except httpx.HTTPError:
+        group.errors += 1
+        return False
+    group.latency.append(time.perf_counter() - began)
+    return True
+
+
+async def greedy(client, deadline: float, group: Group):
+    while time.time() < deadline:
+        if not await stream_turn(client, "greedy", group):
+            # Ignores Retry-After on purpose, but does not spin
+            await asyncio.sleep(0.05)
+
+
+async def polite(client, index: int, deadline: float, think_time: float, group: Group):
+    thread_id = f"polite-{index}-{uuid.uuid4()}"
+    while time.time() < deadline:
+        await stream_turn(client, f"polite-{index}", group, thread_id)
+        await asyncio.sleep(think_time)
+
+
+async def bulk(client, items: int, group: Group):
+    began = time.perf_counter()
+    body = {"items": [{"message": PROMPTS[i % len(PROMPTS)], "id": str(i)} for i in range(items)]}
+    async with client.stream("POST", "/chat/batch", json=body, headers={"X-Client-Id": "nightly"}) as response:
+        if response.status_code != 200:
+            group.errors += 1
+            return
+        async for line in response.aiter_lines():
+            result = json.loads(line)
+            if result.get("status") == "ok":
+                group.latency.append(time.perf_counter() - began)
+            elif result.get("status") == "error":
+                group.errors += 1
+
+
+async def drive(url: str, args, groups: dict):
+    deadline = time.time() + args.duration
+    limits = httpx.Limits(max_connections=args.greedy_streams + args.interactive + 4)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        tasks = [greedy(client, deadline, groups["greedy"]) for _ in range(args.greedy_streams)]
+        tasks += [polite(client, i, deadline, args.think_time, groups["interactive"]) for i in range(args.interactive)]
+        if args.batch_items:
+            tasks.append(bulk(client, args.batch_items, groups["bulk"]))
+        await asyncio.gather(*tasks)
+        return (await client.get("/metrics")).text
+
+
+def queue_waits(metrics: str) -> dict:
+    """priority -> mean queue wait in ms, from the Prometheus text"""
+    sums = dict(re.findall(r'chat_turn_queue_wait_seconds_sum\{priority="(\w+)"\} ([\d.e-]+)', metrics))
+    counts = dict(re.findall(r'chat_turn_queue_wait_seconds_count\{priority="(\w+)"\} (\d+)', metrics))
+    return {
+        priority: {"waits": int(counts[priority]), "mean_ms": round(float(sums[priority]) / int(counts[priority]) * 1000, 1)}
+        for priority in counts if int(counts[priority])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--greedy-streams", type=int, default=16)
+    parser.add_argument("--interactive", type=int, default=4, help="polite clients")
+    parser.add_argument("--think-time", type=float, default=0.5)
+    parser.add_argument("--batch-items", type=int, default=20)
+    parser.add_argument("--max-concurrent-turns", type=int, default=4)
+    parser.add_argument("--max-waiting-turns", type=int, default=8)
+    parser.add_argument("--client-rate", type=float, default=120, help="turns per minute per client, 0 = off")
+    parser.add_argument("--client-burst", type=float, default=10)
+    parser.add_argument("--upstream-limits", default="alphavantage=10/10,search=10/10")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--first-token-ms", type=float, default=100.0)
+    parser.add_argument("--tool-call-rate", type=float, default=0.5)
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+    args.workers = 1
+
+    _, stub, stub_url = start_stub_server(latency=0.02)
+    os.environ.update(
+        MAX_CONCURRENT_TURNS=str(args.max_concurrent_turns),
+        MAX_WAITING_TURNS=str(args.max_waiting_turns),
+        CLIENT_RATE_PER_MINUTE=str(args.client_rate),
+        CLIENT_BURST=str(args.client_burst),
+        UPSTREAM_RATE_LIMITS=args.upstream_limits,
+        UPSTREAM_MAX_WAIT_SECONDS="2",
+        STARTUP_WARMUP="0",
+    )
+    db_path = os.path.join(tempfile.mkdtemp(prefix="bench-admission-"), "chatbot.db")
+    port = free_port()
+    server = start_server(port, db_path, stub_url, args)
+    groups = {name: Group(name) for name in ("greedy", "interactive", "bulk")}
+    try:
+        began = time.perf_counter()
+        metrics = asyncio.run(drive(f"http://127.0.0.1:{port}", args, groups))
+        elapsed = time.perf_counter() - began
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    budget = sum(
+        float(calls) * (1 + elapsed / float(seconds))
+        for calls, seconds in re.findall(r"=(\d+)/(\d+)", args.upstream_limits)
+    )
+    report = {
+        "elapsed_seconds": round(elapsed, 2),
+        "groups": {name: group.report() for name, group in groups.items()},
+        "queue_wait": queue_waits(metrics),
+        "upstream_calls": stub.requests,
+        "upstream_budget": int(budget) if budget else None,
+    }
+    for name, group in report["groups"].items():
+        print(f"{name:>12}: {group['completed']:4d} ok  {group['rejected_429']:4d} x 429  "
+              f"{group['errors']:3d} errors  {group['latency']}")
+    for priority, wait in report["queue_wait"].items():
+        print(f"queue wait {priority}: {wait['mean_ms']}ms mean over {wait['waits']} turns")
+    print(f"upstream calls: {report['upstream_calls']} (budget {report['upstream_budget']})")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
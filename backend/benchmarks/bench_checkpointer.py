@@ -0,0 +1,108 @@
+"""
+Checkpointer load benchmark.
+
+Runs concurrent writer and reader threads against each SQLite backend on a
+scratch database and reports p50/p99 latency for checkpoint writes (put)
+and reads (get_tuple).
+
+    python benchmarks/bench_checkpointer.py --writers 4 --readers 16 --ops 200
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+import common  # noqa: F401  (puts the backend on sys.path)
+from common import summarize_ms
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.base.id import uuid6
+
+from persistence import PooledSqliteSaver, connect
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+
+def make_checkpoint(turns: int):
+    checkpoint = empty_checkpoint()
+    checkpoint["id"] = str(uuid6(clock_seq=random.getrandbits(14)))
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"question {i} " * 8))
+        messages.append(AIMessage(content=f"answer {i} " * 40))
+    checkpoint["channel_values"] = {"messages": messages}
+    return checkpoint
+
+
+def run(saver, threads: int, writers: int, readers: int, ops: int, turns: int):
+    thread_ids = [f"bench-{i}" for i in range(threads)]
+    for thread_id in thread_ids:
+        config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+        saver.put(config, make_checkpoint(turns), {"source": "input", "step": 0}, {})
+
+    write_latencies, read_latencies = [], []
+    lock = threading.Lock()
+    start = threading.Barrier(writers + readers)
+
+    def writer():
+        local = []
+        start.wait()
+        for step in range(ops):
+            config = {"configurable": {"thread_id": random.choice(thread_ids), "checkpoint_ns": ""}}
+            checkpoint = make_checkpoint(turns)
+            began = time.perf_counter()
+            saver.put(config, checkpoint, {"source": "loop", "step": step}, {})
+            local.append(time.perf_counter() - began)
+        with lock:
+            write_latencies.extend(local)
+
+    def reader():
+        local = []
+        start.wait()
+        for _ in range(ops):
+            config = {"configurable": {"thread_id": random.choice(thread_ids)}}
+            began = time.perf_counter()
+            saver.get_tuple(config)
+            local.append(time.perf_counter() - began)
+        with lock:
+            read_latencies.extend(local)
+
+    workers = [threading.Thread(target=writer) for _ in range(writers)]
+    workers += [threading.Thread(target=reader) for _ in range(readers)]
+    began = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - began
+    return write_latencies, read_latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=50, help="conversation threads to spread load over")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=200, help="operations per worker")
+    parser.add_argument("--turns", type=int, default=10, help="turns of history per checkpoint")
+    args = parser.parse_args()
+
+    backends = {
+        "sqlite": lambda path: SqliteSaver(conn=connect(path)),
+        "pooled": lambda path: PooledSqliteSaver(path),
+    }
+    for name, factory in backends.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            saver = factory(os.path.join(tmp, "bench.db"))
+            writes, reads, elapsed = run(saver, args.threads, args.writers, args.readers, args.ops, args.turns)
+            saver.conn.close()
+        total = len(writes) + len(reads)
+        print(f"[{name}] {total} ops in {elapsed:.2f}s ({total / elapsed:.0f} ops/s)")
+        print(f"  write  {summarize_ms(writes)}")
+        print(f"  read   {summarize_ms(reads)}")
+
+
+if __name__ == "__main__":
+    main()
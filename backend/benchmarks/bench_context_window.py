@@ -0,0 +1,78 @@
+"""
+Prompt size per turn as a thread grows.
+
+Replays a synthetic conversation (every third turn calls a tool that
+returns a bulky payload) through the context stage and reports the tokens
+that would be sent to the model versus the size of the full history. With
+context management the prompt column should level off while the history
+keeps growing.
+
+    python benchmarks/bench_context_window.py --turns 200 --budget 4000
+"""
+
+import argparse
+import json
+import time
+
+import common  # noqa: F401  (puts the backend on sys.path)
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from context_window import build_prompt, estimate_tokens, update_context
+
+
+class ExtractiveSummarizer:
+    """Stands in for the LLM: keeps the head of the existing summary and the new text"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        return AIMessage(content=prompt[-1].content[-1500:])
+
+
+def turn_messages(i: int):
+    question = HumanMessage(content=f"Question {i}: " + "tell me more about the topic " * 6)
+    if i % 3:
+        return [question, AIMessage(content=f"Answer {i}: " + "here is a detailed reply " * 30)]
+    call_id = f"call-{i}"
+    payload = {"results": [{"title": f"Result {n}", "body": "lorem ipsum " * 40} for n in range(8)]}
+    return [
+        question,
+        AIMessage(content="", tool_calls=[{"name": "duckduckgo_search", "args": {"query": f"topic {i}"}, "id": call_id}]),
+        ToolMessage(content=json.dumps(payload), tool_call_id=call_id),
+        AIMessage(content=f"Answer {i}: " + "summarizing the search results " * 20),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=4000)
+    parser.add_argument("--every", type=int, default=20, help="print every N turns")
+    args = parser.parse_args()
+
+    summarizer = ExtractiveSummarizer()
+    state = {"messages": [], "summary": "", "summarized_count": 0}
+    context_time = 0.0
+    print(f"{'turn':>5} {'history_tokens':>15} {'prompt_tokens':>14} {'summarized':>11}")
+    for i in range(1, args.turns + 1):
+        new = turn_messages(i)
+        state["messages"].append(new[0])
+        began = time.perf_counter()
+        state.update(update_context(state, summarizer, budget=args.budget))
+        prompt = build_prompt(state, budget=args.budget)
+        context_time += time.perf_counter() - began
+        state["messages"].extend(new[1:])
+
+        if i % args.every == 0 or i == 1:
+            history = sum(estimate_tokens(m) for m in state["messages"])
+            prompt_tokens = sum(estimate_tokens(m) for m in prompt)
+            print(f"{i:>5} {history:>15} {prompt_tokens:>14} {state['summarized_count']:>11}")
+
+    print(f"\nsummarizer calls: {summarizer.calls} over {args.turns} turns, "
+          f"context stage {context_time / args.turns * 1000:.2f}ms per turn")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Outbound HTTP client benchmark against the local stub upstream.
+
+Compares a fresh requests.get per call with the pooled shared client, then
+checks retry and circuit-breaker behaviour against a failing upstream.
+
+    python benchmarks/bench_http_client.py --calls 200 --concurrency 8
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import common  # noqa: F401  (puts the backend on sys.path)
+import requests
+from common import summarize_ms
+from stub_upstream import start_stub_server
+
+from http_client import CircuitOpenError, HttpClient, UpstreamError
+
+
+def timed(fn, calls: int, concurrency: int):
+    def one(i):
+        began = time.perf_counter()
+        fn(i)
+        return time.perf_counter() - began
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(one, range(calls)))
+    return latencies, time.perf_counter() - began
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    _, _, base_url = start_stub_server(latency=args.latency_ms / 1000)
+    url = f"{base_url}/query"
+
+    def unpooled(i):
+        requests.get(url, params={"symbol": f"S{i % 20}"}, timeout=10).json()
+
+    client = HttpClient()
+
+    def pooled(i):
+        client.get("stub", url, params={"symbol": f"S{i % 20}"}).json()
+
+    for name, fn in (("requests.get", unpooled), ("pooled client", pooled)):
+        latencies, elapsed = timed(fn, args.calls, args.concurrency)
+        print(f"[{name}] {args.calls} calls in {elapsed:.2f}s  {summarize_ms(latencies)}")
+
+    # Flaky upstream: retries should hide most failures
+    _, flaky_state, flaky_url = start_stub_server(fail_rate=0.3)
+    flaky = HttpClient(max_retries=3)
+    failures = 0
+    for i in range(100):
+        try:
+            flaky.get("flaky", f"{flaky_url}/query", params={"symbol": "AAPL"})
+        except UpstreamError:
+            failures += 1
+    print(f"[retry] 100 calls at 30% upstream failure: {failures} surfaced, "
+          f"{flaky_state.requests} upstream requests")
+
+    # Dead upstream: the breaker should stop calls after the threshold
+    _, dead_state, dead_url = start_stub_server(fail_rate=1.0)
+    dead = HttpClient(max_retries=0)
+    fast_failures = 0
+    for i in range(50):
+        try:
+            dead.get("dead", f"{dead_url}/query", params={"symbol": "AAPL"})
+        except CircuitOpenError:
+            fast_failures += 1
+        except UpstreamError:
+            pass
+    print(f"[breaker] 50 calls to a dead upstream: {dead_state.requests} reached it, "
+          f"{fast_failures} failed fast (state={dead.breaker('dead').state})")
+
+
+if __name__ == "__main__":
+    main()
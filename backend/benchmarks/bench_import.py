@@ -0,0 +1,136 @@
+"""
+Import-time and cold-start cost of the backend.
+
+Imports each module (default: main and chatbot_engine) in a fresh
+interpreter under `python -X importtime`, --runs times, and reports the
+median cumulative import time plus the slowest modules it pulls in. With
+--serve it also starts uvicorn and measures how long until /healthz
+answers and until it reports every component ready.
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --serve --budget-ms 1500 --json import.json
+
+--budget-ms makes the script exit non-zero when the median import of the
+first module is over budget, so CI can catch a heavy import creeping back.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import common
+import httpx
+from bench_load import free_port
+
+
+def import_times(module: str, env: dict) -> dict:
+    """module name -> cumulative import time in seconds, from one fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=common.BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        name = name.strip()
+        # A module can show up once per importer; keep its first (real) load
+        times.setdefault(name, int(cumulative_us) / 1e6)
+    return times
+
+
+def cold_start(env: dict, timeout: float = 120.0) -> dict:
+    """Seconds from spawning uvicorn until /healthz answers, and until it is ready"""
+    port = free_port()
+    began = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=common.BACKEND_DIR, env=env,
+    )
+    first_answer = None
+    try:
+        while time.perf_counter() - began < timeout:
+            if server.poll() is not None:
+                raise SystemExit(f"server exited with {server.returncode}")
+            try:
+                health = httpx.get(f"http://127.0.0.1:{port}/healthz", timeout=1).json()
+            except httpx.HTTPError:
+                time.sleep(0.02)
+                continue
+            if first_answer is None:
+                first_answer = time.perf_counter() - began
+            if health["ready"]:
+                return {"healthz_seconds": first_answer, "ready_seconds": time.perf_counter() - began}
+            time.sleep(0.02)
+        raise SystemExit(f"server not ready within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=["main", "chatbot_engine"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest dependencies to list")
+    parser.add_argument("--serve", action="store_true", help="also measure time to /healthz")
+    parser.add_argument("--budget-ms", type=float, help="fail if the first module imports slower")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    env = dict(
+        os.environ,
+        GOOGLE_API_KEY=os.getenv("GOOGLE_API_KEY", "offline"),
+        DATABASE_PATH=os.path.join(tempfile.mkdtemp(prefix="bench-import-"), "chatbot.db"),
+    )
+    # One throwaway import so every run after it reads warm .pyc files
+    import_times(args.modules[0], env)
+
+    report = {"runs": args.runs, "modules": {}}
+    for module in args.modules:
+        runs = [import_times(module, env) for _ in range(args.runs)]
+        total = statistics.median(run[module] for run in runs)
+        names = set().union(*runs) - {module}
+        slowest = sorted(
+            ((name, statistics.median(run.get(name, 0.0) for run in runs)) for name in names),
+            key=lambda item: item[1], reverse=True,
+        )
+        # Drop dotted submodules already covered by a listed parent
+        top = []
+        for name, seconds in slowest:
+            if not any(name.startswith(parent + ".") for parent, _ in top):
+                top.append((name, seconds))
+            if len(top) == args.top:
+                break
+        report["modules"][module] = {
+            "import_ms": round(total * 1000, 1),
+            "slowest_ms": {name: round(seconds * 1000, 1) for name, seconds in top},
+        }
+        print(f"import {module}: {total * 1000:.0f}ms (median of {args.runs})")
+        for name, seconds in top:
+            print(f"    {seconds * 1000:8.1f}ms  {name}")
+
+    if args.serve:
+        serve_env = dict(env, LLM_PROVIDER=os.getenv("LLM_PROVIDER", "fake"))
+        report["cold_start"] = {key: round(value, 3) for key, value in cold_start(serve_env).items()}
+        print(f"cold start: /healthz after {report['cold_start']['healthz_seconds']:.2f}s, "
+              f"ready after {report['cold_start']['ready_seconds']:.2f}s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    first = report["modules"][args.modules[0]]["import_ms"]
+    if args.budget_ms is not None and first > args.budget_ms:
+        raise SystemExit(f"import {args.modules[0]} took {first:.0f}ms, over the {args.budget_ms:.0f}ms budget")
+
+
+if __name__ == "__main__":
+    main()
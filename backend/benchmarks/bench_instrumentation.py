@@ -0,0 +1,111 @@
+"""
+Overhead of the metrics instrumentation.
+
+Measures the per-call cost of a timed node wrapper, then runs the same
+chat turns through two copies of the graph on scratch SQLite databases:
+one with timed nodes, a timed checkpointer and the token-counting model
+callback, one without. The fake LLM runs with no delays so the difference
+is not hidden behind model latency.
+
+    python benchmarks/bench_instrumentation.py --turns 300
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import common  # noqa: F401  (puts the backend on sys.path)
+from common import summarize_ms
+
+SCRATCH = tempfile.mkdtemp(prefix="bench-instrumentation-")
+os.environ.update(
+    LLM_PROVIDER="fake",
+    FAKE_LLM_TOKENS_PER_SECOND="0",
+    FAKE_LLM_TOOL_CALL_RATE="0.3",
+    GOOGLE_API_KEY="offline",
+    DATABASE_PATH=os.path.join(SCRATCH, "app.db"),
+    ALPHA_VANTAGE_URL="http://127.0.0.1:9/query",
+    SEARCH_API_URL="http://127.0.0.1:9/search",
+    HTTP_MAX_RETRIES="0",
+)
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+from langgraph.checkpoint.sqlite import SqliteSaver  # noqa: E402
+from langgraph.graph import END, START, StateGraph  # noqa: E402
+from langgraph.prebuilt import tools_condition  # noqa: E402
+
+import chatbot_engine as engine  # noqa: E402
+from fake_llm import FakeChatModel  # noqa: E402
+from instrumentation import instrument_saver, model_callbacks, timed_node  # noqa: E402
+from persistence import connect  # noqa: E402
+
+
+def build_graph(instrumented: bool, path: str):
+    wrap = timed_node if instrumented else (lambda name, fn: fn)
+    saver = SqliteSaver(conn=connect(path))
+    if instrumented:
+        instrument_saver(saver)
+    graph = StateGraph(engine.get_chat_state())
+    graph.add_node("context", wrap("context", engine.context_node))
+    graph.add_node("chat_node", wrap("chat_node", engine.chat_node))
+    graph.add_node("tools", wrap("tools", engine.tool_node))
+    graph.add_edge(START, "context")
+    graph.add_edge("context", "chat_node")
+    graph.add_conditional_edges("chat_node", tools_condition, {"tools": "tools", "__end__": END})
+    graph.add_edge("tools", "chat_node")
+    llm = FakeChatModel(callbacks=model_callbacks() if instrumented else [])
+    return graph.compile(checkpointer=saver), llm
+
+
+def run_turns(graph, llm, turns: int, offset: int):
+    engine.get_llm.set(llm)
+    engine.get_llm_with_tools.set(llm.bind_tools(engine.get_tools()))
+    latencies = []
+    for i in range(turns):
+        config = {"configurable": {"thread_id": f"thread-{(offset + i) % 20}"}}
+        began = time.perf_counter()
+        for _ in graph.stream(
+            {"messages": [HumanMessage(content=f"Question {offset + i} about AAPL and the market")]},
+            config=config, stream_mode="messages",
+        ):
+            pass
+        latencies.append(time.perf_counter() - began)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    def noop(state):
+        return state
+
+    wrapped = timed_node("noop", noop)
+    for name, fn in (("raw call", noop), ("timed_node call", wrapped)):
+        began = time.perf_counter()
+        for _ in range(200_000):
+            fn(None)
+        print(f"{name:>16}: {(time.perf_counter() - began) / 200_000 * 1e6:.2f}us")
+
+    graphs = {
+        "plain": build_graph(False, os.path.join(SCRATCH, "plain.db")),
+        "instrumented": build_graph(True, os.path.join(SCRATCH, "instrumented.db")),
+    }
+    latencies = {name: [] for name in graphs}
+    # Alternate the two graphs so drift affects both equally
+    for round_ in range(args.rounds):
+        for name, (graph, llm) in graphs.items():
+            latencies[name] += run_turns(graph, llm, args.turns // args.rounds, round_ * args.turns)
+
+    for name, values in latencies.items():
+        print(f"{name:>12}: {len(values)} turns, mean {sum(values) / len(values) * 1000:.2f}ms  {summarize_ms(values)}")
+    plain = sum(latencies["plain"]) / len(latencies["plain"])
+    instrumented = sum(latencies["instrumented"]) / len(latencies["instrumented"])
+    print(f"overhead: {(instrumented - plain) * 1000:.3f}ms per turn ({(instrumented / plain - 1) * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
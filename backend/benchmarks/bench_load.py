@@ -0,0 +1,203 @@
+"""
+Load test for /chat/stream, fully offline.
+
+Starts the stub stock/search upstream and a uvicorn server with the fake
+LLM (LLM_PROVIDER=fake) on a scratch database, then opens many concurrent
+chat sessions. Each session is its own thread and sends --turns messages
+one after another. Reports throughput, time to first token, end-to-end
+latency percentiles, errors and database growth per turn.
+
+    python benchmarks/bench_load.py --sessions 50 --turns 5
+    python benchmarks/bench_load.py --sessions 50 --turns 5 --workers 4
+    python benchmarks/bench_load.py --url http://127.0.0.1:8000 --db chatbot.db
+
+Pass --json to write the numbers to a file, so CI runs can be compared.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import common
+import httpx
+from common import percentile, summarize_ms
+from stub_upstream import start_stub_server
+
+PROMPTS = [
+    "What is the latest AI news?",
+    "What is the price of AAPL today?",
+    "Summarize the market trend for MSFT",
+    "Explain how vector databases work",
+    "Give me three ideas for a weekend project",
+    "How is TSLA doing this week?",
+    "What happened in tech this morning?",
+    "Write a haiku about databases",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def database_bytes(path: str) -> int:
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def start_server(port: int, db_path: str, stub_url: str, args):
+    env = dict(
+        os.environ,
+        LLM_PROVIDER="fake",
+        GOOGLE_API_KEY=os.getenv("GOOGLE_API_KEY", "offline"),
+        DATABASE_PATH=db_path,
+        ALPHA_VANTAGE_URL=f"{stub_url}/query",
+        SEARCH_API_URL=f"{stub_url}/search",
+        FAKE_LLM_TOKENS_PER_SECOND=str(args.tokens_per_second),
+        FAKE_LLM_FIRST_TOKEN_MS=str(args.first_token_ms),
+        FAKE_LLM_TOOL_CALL_RATE=str(args.tool_call_rate),
+        # Measure the server, not the rate limits (see bench_admission.py)
+        CLIENT_RATE_PER_MINUTE=os.getenv("CLIENT_RATE_PER_MINUTE", "0"),
+        UPSTREAM_RATE_LIMITS=os.getenv("UPSTREAM_RATE_LIMITS", ""),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning",
+         "--workers", str(args.workers)],
+        cwd=common.BACKEND_DIR, env=env,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"server exited with {server.returncode}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit("server did not start within 60s")
+
+
+async def run_turn(client: httpx.AsyncClient, thread_id: str, message: str, results: dict, headers=None):
+    began = time.perf_counter()
+    first_token = None
+    try:
+        async with client.stream(
+            "POST", "/chat/stream", json={"message": message, "thread_id": thread_id}, headers=headers
+        ) as response:
+            if response.status_code != 200:
+                results["errors"][f"http_{response.status_code}"] = results["errors"].get(f"http_{response.status_code}", 0) + 1
+                return
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                event = json.loads(line[5:])
+                if event["type"] == "content" and first_token is None:
+                    first_token = time.perf_counter() - began
+                elif event["type"] == "error":
+                    results["errors"]["stream_error"] = results["errors"].get("stream_error", 0) + 1
+                    return
+                elif event["type"] == "done":
+                    break
+    except httpx.HTTPError as e:
+        results["errors"][type(e).__name__] = results["errors"].get(type(e).__name__, 0) + 1
+        return
+    results["latency"].append(time.perf_counter() - began)
+    if first_token is not None:
+        results["ttft"].append(first_token)
+
+
+async def run_session(client, turns: int, think_time: float, results: dict):
+    thread_id = f"load-{uuid.uuid4()}"
+    # Every session is a separate user as far as admission control goes
+    headers = {"X-Client-Id": thread_id}
+    for _ in range(turns):
+        await run_turn(client, thread_id, random.choice(PROMPTS), results, headers)
+        if think_time:
+            await asyncio.sleep(random.uniform(0, think_time))
+
+
+async def drive(url: str, args, results: dict):
+    limits = httpx.Limits(max_connections=args.sessions, max_keepalive_connections=args.sessions)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+        await asyncio.gather(*(
+            run_session(client, args.turns, args.think_time, results) for _ in range(args.sessions)
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=5, help="turns per session")
+    parser.add_argument("--think-time", type=float, default=0.0, help="max seconds between turns")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--url", help="test a running server instead of starting one")
+    parser.add_argument("--db", help="database of the server under --url, for growth numbers")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--first-token-ms", type=float, default=200.0)
+    parser.add_argument("--tool-call-rate", type=float, default=0.3)
+    parser.add_argument("--upstream-latency-ms", type=float, default=50.0)
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+    random.seed(42)
+
+    server = None
+    db_path = args.db
+    url = args.url
+    if url is None:
+        _, _, stub_url = start_stub_server(latency=args.upstream_latency_ms / 1000)
+        db_path = os.path.join(tempfile.mkdtemp(prefix="bench-load-"), "chatbot.db")
+        port = free_port()
+        server = start_server(port, db_path, stub_url, args)
+        url = f"http://127.0.0.1:{port}"
+
+    try:
+        size_before = database_bytes(db_path) if db_path else 0
+        results = {"latency": [], "ttft": [], "errors": {}}
+        began = time.perf_counter()
+        asyncio.run(drive(url, args, results))
+        elapsed = time.perf_counter() - began
+        size_after = database_bytes(db_path) if db_path else 0
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    completed = len(results["latency"])
+    attempted = args.sessions * args.turns
+    report = {
+        "workers": args.workers,
+        "sessions": args.sessions,
+        "turns_attempted": attempted,
+        "turns_completed": completed,
+        "errors": results["errors"],
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_turns_per_second": round(completed / elapsed, 2) if elapsed else 0.0,
+        "ttft_ms": {f"p{p}": round(percentile(results["ttft"], p) * 1000, 2) for p in (50, 95, 99)},
+        "latency_ms": {f"p{p}": round(percentile(results["latency"], p) * 1000, 2) for p in (50, 95, 99)},
+        "db_growth_bytes_per_turn": round((size_after - size_before) / completed) if completed and db_path else None,
+    }
+
+    print(f"{completed}/{attempted} turns in {elapsed:.2f}s  "
+          f"({report['throughput_turns_per_second']} turns/s, {args.sessions} sessions, {args.workers} workers)")
+    print(f"errors: {results['errors'] or 'none'}")
+    print(f"ttft:    {summarize_ms(results['ttft'])}")
+    print(f"latency: {summarize_ms(results['latency'])}")
+    if report["db_growth_bytes_per_turn"] is not None:
+        print(f"db growth: {size_after - size_before} bytes, {report['db_growth_bytes_per_turn']} bytes/turn")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+API latency while deleted threads are purged, fully offline.
+
+Seeds a scratch database with --threads threads of --turns tool-using turns
+(checkpoints written like the graph, see bench_serde.py), starts the
+server with the fake model and stub upstream, and keeps --sessions chat
+sessions plus a /threads poller busy. After --warmup seconds it deletes
+every seeded thread with one POST /threads/bulk-delete and keeps measuring
+until the purge worker has caught up. Reports latency per phase, how long
+the bulk delete call took and how long the purge ran.
+
+    python benchmarks/bench_purge.py --threads 200 --turns 20
+    python benchmarks/bench_purge.py --batch-size 100000   # one transaction per table and thread
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import tempfile
+import time
+import uuid
+
+import httpx
+from bench_load import PROMPTS, free_port, run_turn, start_server
+from bench_serde import write_thread
+from common import summarize_ms
+from stub_upstream import start_stub_server
+
+from persistence import CompactSqliteSaver, connect
+from serde import CompressedSerializer
+
+
+def seed(db_path: str, threads: int, turns: int) -> list:
+    conn = connect(db_path)
+    saver = CompactSqliteSaver(conn, serde=CompressedSerializer(conn))
+    saver.setup()
+    thread_ids = [f"old-{t}" for t in range(threads)]
+    for t, thread_id in enumerate(thread_ids):
+        write_thread(saver, thread_id, turns, seed=t, put_times=[])
+    conn.close()
+    return thread_ids
+
+
+def new_results() -> dict:
+    return {"latency": [], "ttft": [], "errors": {}, "threads": []}
+
+
+async def session(client, phase: dict, stop: asyncio.Event):
+    thread_id = f"live-{uuid.uuid4()}"
+    while not stop.is_set():
+        await run_turn(client, thread_id, PROMPTS[int(time.time() * 1000) % len(PROMPTS)], phase["current"],
+                       headers={"X-Client-Id": thread_id})
+
+
+async def poll_threads(client, phase: dict, stop: asyncio.Event):
+    while not stop.is_set():
+        began = time.perf_counter()
+        await client.get("/threads", params={"limit": 50})
+        phase["current"]["threads"].append(time.perf_counter() - began)
+        await asyncio.sleep(0.05)
+
+
+async def pending(client) -> int:
+    metrics = (await client.get("/metrics")).text
+    match = re.search(r"^threads_pending_purge (\S+)", metrics, re.MULTILINE)
+    return int(float(match.group(1))) if match else 0
+
+
+async def drive(url: str, thread_ids: list, args) -> dict:
+    phases = {"before": new_results(), "purging": new_results(), "after": new_results()}
+    phase = {"current": phases["before"]}
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=args.sessions + 4)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        tasks = [asyncio.create_task(session(client, phase, stop)) for _ in range(args.sessions)]
+        tasks.append(asyncio.create_task(poll_threads(client, phase, stop)))
+        await asyncio.sleep(args.warmup)
+
+        phase["current"] = phases["purging"]
+        began = time.perf_counter()
+        response = await client.post("/threads/bulk-delete", json={"thread_ids": thread_ids})
+        delete_call = time.perf_counter() - began
+        deleted = response.json()["deleted"]
+        await asyncio.sleep(0.5)
+        while await pending(client):
+            await asyncio.sleep(0.2)
+        purge_seconds = time.perf_counter() - began
+
+        phase["current"] = phases["after"]
+        await asyncio.sleep(args.warmup)
+        stop.set()
+        await asyncio.gather(*tasks)
+    return {"phases": phases, "deleted": deleted, "delete_call": delete_call, "purge_seconds": purge_seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=200, help="threads to seed and delete")
+    parser.add_argument("--turns", type=int, default=20, help="turns per seeded thread")
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent chat sessions")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds measured before and after")
+    parser.add_argument("--batch-size", type=int, default=None, help="PURGE_BATCH_SIZE")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--first-token-ms", type=float, default=50.0)
+    parser.add_argument("--tool-call-rate", type=float, default=0.3)
+    args = parser.parse_args()
+    args.workers = 1
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="bench-purge-"), "chatbot.db")
+    began = time.perf_counter()
+    thread_ids = seed(db_path, args.threads, args.turns)
+    print(f"seeded {len(thread_ids)} threads x {args.turns} turns in {time.perf_counter() - began:.1f}s, "
+          f"{os.path.getsize(db_path) / 1e6:.1f} MB")
+
+    _, _, stub_url = start_stub_server(latency=0.02)
+    os.environ.update(STARTUP_WARMUP="0", COMPACTION_INTERVAL_SECONDS="0")
+    if args.batch_size:
+        os.environ["PURGE_BATCH_SIZE"] = str(args.batch_size)
+    port = free_port()
+    server = start_server(port, db_path, stub_url, args)
+    try:
+        report = asyncio.run(drive(f"http://127.0.0.1:{port}", thread_ids, args))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    print(f"bulk-delete of {report['deleted']} threads answered in {report['delete_call'] * 1000:.1f}ms, "
+          f"purge finished after {report['purge_seconds']:.1f}s")
+    for name, results in report["phases"].items():
+        errors = sum(results["errors"].values())
+        print(f"{name:>8}: {len(results['latency']):4d} turns  {errors} errors")
+        print(f"{'turn':>8}  {summarize_ms(results['latency'])}")
+        print(f"{'ttft':>8}  {summarize_ms(results['ttft'])}")
+        print(f"{'/threads':>8}  {summarize_ms(results['threads'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Response cache hit ratio and lookup cost on a repeated-question workload.
+
+Draws prompts from a skewed set of popular questions, each asked in a few
+phrasings (case, punctuation and filler words vary), and feeds them through
+the cache the way stream_turn does: look up, and on a miss "call the model"
+(a fixed simulated latency) and store the answer. Reports hits per tier,
+lookup latency, the model time saved and similar hits that returned the
+answer to a different question (should be 0).
+
+    python benchmarks/bench_response_cache.py --requests 5000 --model-ms 1500
+"""
+
+import argparse
+import random
+import sqlite3
+import time
+
+import common  # noqa: F401  (puts the backend on sys.path)
+from common import summarize_ms
+
+from response_cache import ResponseCache
+
+TOPICS = [
+    "latest AI news", "price of AAPL", "price of MSFT", "weather in London",
+    "how do I reverse a list in python", "what is the capital of Australia",
+    "explain quantum computing", "best pizza recipe", "convert 100 usd to eur",
+    "who won the world cup", "tesla stock price", "what is langgraph",
+]
+PHRASINGS = ["{}", "{}?", "What is the {}?", "what is the {}", "{} please", "Tell me the {}", "{}!!"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--topics", type=int, default=400, help="distinct questions in the long tail")
+    parser.add_argument("--model-ms", type=float, default=1500.0, help="simulated model latency")
+    parser.add_argument("--similarity", type=float, default=0.9)
+    parser.add_argument("--max-entries", type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(7)
+    topics = TOPICS + [f"question number {i} about topic {i * 7 % 31}" for i in range(args.topics)]
+    weights = [1 / (rank + 1) for rank in range(len(topics))]
+    cache = ResponseCache(
+        sqlite3.connect(":memory:", check_same_thread=False),
+        enabled=True, max_entries=args.max_entries, similarity=args.similarity,
+    )
+
+    results = {"exact": 0, "similar": 0, "miss": 0}
+    wrong = 0
+    lookups, saved = [], 0.0
+    for _ in range(args.requests):
+        topic = random.choices(topics, weights)[0]
+        prompt = random.choice(PHRASINGS).format(topic)
+        began = time.perf_counter()
+        hit = cache.lookup(prompt, [])
+        lookups.append(time.perf_counter() - began)
+        if hit is None:
+            results["miss"] += 1
+            cache.store(prompt, [], f"answer about {topic}", cost_seconds=args.model_ms / 1000)
+        else:
+            results[hit.kind] += 1
+            saved += hit.saved_seconds
+            wrong += hit.answer != f"answer about {topic}"
+
+    hits = results["exact"] + results["similar"]
+    print(f"requests: {args.requests}  exact: {results['exact']}  similar: {results['similar']}  "
+          f"miss: {results['miss']}  hit ratio: {hits / args.requests:.1%}  wrong answers: {wrong}")
+    print(f"lookup: {summarize_ms(lookups)}")
+    print(f"model time saved: {saved:.0f}s of {args.requests * args.model_ms / 1000:.0f}s "
+          f"({saved / (args.requests * args.model_ms / 1000):.1%})")
+
+
+if __name__ == "__main__":
+    main()
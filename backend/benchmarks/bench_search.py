@@ -0,0 +1,79 @@
+"""
+Full-text search latency over a large message index.
+
+Fills a scratch database with synthetic conversations (--messages total,
+spread over threads of --per-thread messages) through MessageIndex, so the
+FTS triggers do the indexing, then times /search-style queries for common
+words, rare words, multi-word queries and prefixes.
+
+    python benchmarks/bench_search.py --messages 300000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import common  # noqa: F401  (puts the backend on sys.path)
+from common import summarize_ms
+
+from message_index import MessageIndex
+from persistence import connect
+
+COMMON = ("stock price market news weather python recipe travel music movie "
+          "football election budget coffee running").split()
+FILLER = ("the a of to and in is for on with that this it as at be by from "
+          "about what how please tell me can you give").split()
+
+
+def sentence(rng: random.Random) -> str:
+    words = [rng.choice(FILLER) for _ in range(rng.randint(6, 20))]
+    for _ in range(rng.randint(1, 3)):
+        words.insert(rng.randrange(len(words)), rng.choice(COMMON))
+    if rng.random() < 0.01:
+        words.append(f"zephyr{rng.randrange(1000)}")
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=300_000)
+    parser.add_argument("--per-thread", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-search-"), "search.db")
+    index = MessageIndex(connect(path))
+
+    began = time.perf_counter()
+    for t in range(args.messages // args.per_thread):
+        projected = [
+            (None, "user" if i % 2 == 0 else "assistant", sentence(rng)) for i in range(args.per_thread)
+        ]
+        index.sync_projected(f"thread-{t:06d}", projected)
+    elapsed = time.perf_counter() - began
+    print(f"indexed {args.messages} messages in {elapsed:.1f}s "
+          f"({args.messages / elapsed:.0f}/s), db {os.path.getsize(path) / 1e6:.0f}MB")
+
+    workloads = {
+        "common word": lambda: rng.choice(COMMON),
+        "rare word": lambda: f"zephyr{rng.randrange(1000)}",
+        "two words": lambda: f"{rng.choice(COMMON)} {rng.choice(COMMON)}",
+        "prefix": lambda: rng.choice(COMMON)[:3],
+        "one thread": lambda: rng.choice(COMMON),
+    }
+    for name, make_query in workloads.items():
+        latencies, hits = [], 0
+        for _ in range(args.queries):
+            thread_id = f"thread-{rng.randrange(args.messages // args.per_thread):06d}" if name == "one thread" else None
+            query = make_query()
+            started = time.perf_counter()
+            hits += len(index.search(query, limit=20, thread_id=thread_id)[0])
+            latencies.append(time.perf_counter() - started)
+        print(f"{name:>12}: {hits / args.queries:5.1f} results/query  {summarize_ms(latencies)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Checkpoint storage formats: bytes per turn and read/write time.
+
+Writes the same synthetic conversations (a question, a tool call with an
+Alpha Vantage or search payload, the tool result and an answer per turn,
+one checkpoint per step like the graph) through CompactSqliteSaver in each
+format, on scratch databases:
+
+- plain:          JsonPlus msgpack, messages inline (the old format)
+- zlib:           compressed, messages inline
+- zlib+dict:      compressed with a dictionary trained on other threads
+- blobs+zlib+dict: the default: messages stored once in message_blobs
+- zstd variants when the zstandard package is installed
+
+    python benchmarks/bench_serde.py --threads 20 --turns 30
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import common  # noqa: F401  (puts the backend on sys.path)
+from common import summarize_ms
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.base.id import uuid6
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from stub_upstream import quote_payload, search_payload
+
+from persistence import CompactSqliteSaver, connect
+from retention import database_size
+from serde import CompressedSerializer, train_dictionary, zstandard
+
+WORDS = ("market stock price today news python data model latest report growth analysis "
+         "weather travel budget team project update release version summary result").split()
+SYMBOLS = ("AAPL", "MSFT", "TSLA", "NVDA", "AMZN", "GOOG")
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def turn_messages(rng: random.Random, turn: int):
+    """The four messages one tool-using turn adds to a thread"""
+    call_id = f"call_{turn}_{rng.getrandbits(32):08x}"
+    if rng.random() < 0.5:
+        symbol = rng.choice(SYMBOLS)
+        call = {"name": "get_stock_price", "args": {"symbol": symbol}, "id": call_id}
+        result = quote_payload(symbol)
+    else:
+        query = sentence(rng, 4)
+        call = {"name": "duckduckgo_search", "args": {"query": query}, "id": call_id}
+        result = search_payload(query)
+    return [
+        HumanMessage(content=sentence(rng, rng.randint(5, 25)), id=f"h{turn}-{rng.getrandbits(32)}"),
+        AIMessage(content="", tool_calls=[call], id=f"a{turn}-{rng.getrandbits(32)}"),
+        ToolMessage(content=str(result), tool_call_id=call_id, id=f"t{turn}-{rng.getrandbits(32)}"),
+        AIMessage(content=sentence(rng, rng.randint(30, 120)), id=f"b{turn}-{rng.getrandbits(32)}"),
+    ]
+
+
+def write_thread(saver, thread_id: str, turns: int, seed: int, put_times: list):
+    rng = random.Random(seed)
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    messages = []
+    for turn in range(turns):
+        for step, message in enumerate(turn_messages(rng, turn)):
+            messages = messages + [message]
+            checkpoint = empty_checkpoint()
+            checkpoint["id"] = str(uuid6(clock_seq=rng.getrandbits(14)))
+            checkpoint["channel_values"] = {"messages": messages, "summary": "", "summarized_count": 0}
+            began = time.perf_counter()
+            config = saver.put(config, checkpoint, {"source": "loop", "step": turn * 4 + step}, {})
+            saver.put_writes(config, [("messages", [message])], f"task-{turn}-{step}")
+            put_times.append(time.perf_counter() - began)
+
+
+def run(name: str, serde, message_blobs: bool, args, directory: str):
+    path = os.path.join(directory, f"{name}.db")
+    saver = CompactSqliteSaver(connect(path), serde=serde, message_blobs=message_blobs)
+    saver.setup()
+    empty_bytes, _ = database_size(saver.conn)
+    put_times, get_times = [], []
+    for t in range(args.threads):
+        write_thread(saver, f"thread-{t}", args.turns, seed=t, put_times=put_times)
+    saver.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    used_bytes, free_bytes = database_size(saver.conn)
+    for _ in range(args.reads):
+        config = {"configurable": {"thread_id": f"thread-{random.randrange(args.threads)}"}}
+        began = time.perf_counter()
+        saver.get_tuple(config)
+        get_times.append(time.perf_counter() - began)
+    saver.conn.close()
+    per_turn = (used_bytes - free_bytes - empty_bytes) / (args.threads * args.turns)
+    return per_turn, put_times, get_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=30, help="turns per thread")
+    parser.add_argument("--reads", type=int, default=500, help="get_tuple calls per format")
+    parser.add_argument("--training-threads", type=int, default=20)
+    args = parser.parse_args()
+
+    # Dictionaries are trained on different threads than the ones measured
+    base = JsonPlusSerializer()
+    rng = random.Random(10_000)
+    samples = [
+        base.dumps_typed(message)[1]
+        for _ in range(args.training_threads)
+        for turn in range(args.turns)
+        for message in turn_messages(rng, turn)
+    ]
+
+    def serializer(codec, dictionary=False):
+        serde = CompressedSerializer(codec=codec)
+        if dictionary:
+            serde.use_dictionary(1, train_dictionary(samples, codec=codec))
+        return serde
+
+    formats = {
+        "plain": (serializer("none"), False),
+        "zlib": (serializer("zlib"), False),
+        "zlib+dict": (serializer("zlib", dictionary=True), False),
+        "blobs+zlib+dict": (serializer("zlib", dictionary=True), True),
+    }
+    if zstandard is not None:
+        formats["zstd+dict"] = (serializer("zstd", dictionary=True), False)
+        formats["blobs+zstd+dict"] = (serializer("zstd", dictionary=True), True)
+    else:
+        print("zstandard is not installed, skipping the zstd formats")
+
+    baseline = None
+    with tempfile.TemporaryDirectory() as directory:
+        for name, (serde, message_blobs) in formats.items():
+            per_turn, puts, gets = run(name, serde, message_blobs, args, directory)
+            baseline = baseline or per_turn
+            print(f"{name:>16}: {per_turn / 1024:8.1f} KB/turn ({baseline / per_turn:5.1f}x smaller)")
+            print(f"{'put':>16}  {summarize_ms(puts)}")
+            print(f"{'get_tuple':>16}  {summarize_ms(gets)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Tool result formats: bytes per checkpoint and prompt tokens per turn.
+
+Builds the same synthetic tool-using threads (a question, a stock quote or
+a search per turn, the tool result and an answer) with the tool results
+written as:
+
+- raw:      str() of whatever the tool returned
+- previous: what tool_node used to store: str() of the quote, "- title: url"
+            lines for search
+- compact:  format_tool_result, raw payloads in the side store
+
+and reports the serialized size of the last checkpoint's messages per turn
+(JsonPlus and the default compressed serializer), the prompt tokens per
+turn of history (build_prompt without a budget, so nothing is windowed
+away) and what the side store holds. Exits with status 1 when the compact
+format makes tool results, checkpoints or prompts larger than the previous
+one did. The compressed size is reported only: each payload_id in a
+message artifact is a few incompressible bytes.
+
+    python benchmarks/bench_tool_results.py --threads 20 --turns 30
+"""
+
+import argparse
+import random
+import sys
+
+import common  # noqa: F401  (puts the backend on sys.path)
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from stub_upstream import quote_payload, search_payload
+
+from context_window import build_prompt, estimate_tokens
+from persistence import connect
+from serde import CompressedSerializer
+from tool_results import ToolPayloadStore, format_tool_result
+
+WORDS = ("market stock price today news python data model latest report growth analysis "
+         "weather travel budget team project update release version summary result").split()
+SYMBOLS = ("AAPL", "MSFT", "TSLA", "NVDA", "AMZN", "GOOG")
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def old_format(name: str, raw) -> str:
+    if name == "duckduckgo_search":
+        return "\n".join(f"- {r['title']}: {r['url']}" for r in raw["results"][:5])
+    return str(raw)
+
+
+def build_thread(rng: random.Random, thread_id: str, turns: int, formatter) -> list:
+    messages = []
+    for turn in range(turns):
+        call_id = f"call_{turn}_{rng.getrandbits(32):08x}"
+        if rng.random() < 0.5:
+            symbol = rng.choice(SYMBOLS)
+            call = {"name": "get_stock_price", "args": {"symbol": symbol}, "id": call_id}
+            raw = quote_payload(symbol)
+        else:
+            query = sentence(rng, 4)
+            call = {"name": "duckduckgo_search", "args": {"query": query}, "id": call_id}
+            # What the tool returns: up to max_results raw hits
+            raw = search_payload(query, count=5)
+        content, artifact = formatter(call["name"], raw, thread_id)
+        messages += [
+            HumanMessage(content=sentence(rng, rng.randint(5, 25))),
+            AIMessage(content="", tool_calls=[call]),
+            ToolMessage(content=content, artifact=artifact, name=call["name"], tool_call_id=call_id),
+            AIMessage(content=sentence(rng, rng.randint(30, 120))),
+        ]
+    return messages
+
+
+def measure(name: str, formatter, args) -> dict:
+    plain, compressed = JsonPlusSerializer(), CompressedSerializer()
+    checkpoint_bytes, compressed_bytes, prompt_tokens = 0, 0, 0
+    tool_chars = {"get_stock_price": [], "duckduckgo_search": []}
+    for t in range(args.threads):
+        messages = build_thread(random.Random(t), f"thread-{t}", args.turns, formatter)
+        checkpoint_bytes += len(plain.dumps_typed(messages)[1])
+        compressed_bytes += len(compressed.dumps_typed(messages)[1])
+        prompt = build_prompt({"messages": messages}, budget=10 ** 9)
+        prompt_tokens += sum(estimate_tokens(m) for m in prompt)
+        for message in messages:
+            if isinstance(message, ToolMessage):
+                tool_chars[message.name].append(len(message.content))
+    turns = args.threads * args.turns
+    return {
+        "checkpoint_per_turn": checkpoint_bytes / turns,
+        "compressed_per_turn": compressed_bytes / turns,
+        "prompt_tokens": prompt_tokens / turns,
+        "tool_chars": {tool: sum(chars) / len(chars) for tool, chars in tool_chars.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=30, help="turns per thread")
+    args = parser.parse_args()
+
+    store = ToolPayloadStore(connect(":memory:"))
+    results = {
+        "raw": measure("raw", lambda name, raw, thread_id: (str(raw), None), args),
+        "previous": measure("previous", lambda name, raw, thread_id: (old_format(name, raw), None), args),
+        "compact": measure(
+            "compact", lambda name, raw, thread_id: format_tool_result(name, raw, store, thread_id), args
+        ),
+    }
+    raw, previous = results["raw"], results["previous"]
+    for name, result in results.items():
+        quote, search = result["tool_chars"]["get_stock_price"], result["tool_chars"]["duckduckgo_search"]
+        print(f"{name:>8}: quote {quote:4.0f} chars  search {search:4.0f} chars  "
+              f"checkpoint {result['checkpoint_per_turn'] / 1024:6.2f} KB/turn "
+              f"({raw['checkpoint_per_turn'] / result['checkpoint_per_turn']:4.1f}x raw, "
+              f"{previous['checkpoint_per_turn'] / result['checkpoint_per_turn']:4.2f}x previous)  "
+              f"compressed {result['compressed_per_turn'] / 1024:6.2f} KB/turn  "
+              f"prompt {result['prompt_tokens']:5.0f} tokens/turn "
+              f"({raw['prompt_tokens'] / result['prompt_tokens']:4.1f}x raw, "
+              f"{previous['prompt_tokens'] / result['prompt_tokens']:4.2f}x previous)")
+    rows, size = store.conn.execute("SELECT COUNT(*), SUM(LENGTH(data)) FROM tool_payloads").fetchone()
+    print(f"side store: {rows} payloads, {(size or 0) / max(rows, 1):.0f} bytes each (zlib)")
+
+    compact = results["compact"]
+    larger = [
+        key for key in ("checkpoint_per_turn", "prompt_tokens") if compact[key] > previous[key]
+    ] + [f"{tool} chars" for tool, chars in compact["tool_chars"].items() if chars > previous["tool_chars"][tool]]
+    if larger:
+        print(f"FAIL: compact format is larger than the previous one: {', '.join(larger)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
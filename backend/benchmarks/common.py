@@ -0,0 +1,31 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks are plain scripts run from the backend directory, e.g.
+`python benchmarks/bench_checkpointer.py`; this module puts the backend on
+sys.path so they can import the application modules directly.
+"""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def summarize_ms(values) -> str:
+    """Format latencies (seconds) as p50/p95/p99/max in milliseconds"""
+    return "  ".join(
+        f"{label}={percentile(values, pct) * 1000:8.2f}ms"
+        for label, pct in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+    )
@@ -0,0 +1,132 @@
+"""
+Local stand-in for the Alpha Vantage and search upstreams.
+
+Serves GLOBAL_QUOTE responses on /query and SearxNG-style JSON on /search,
+with configurable latency and failure rate, so tools and benchmarks can
+run offline. Point the backend at it with
+
+    ALPHA_VANTAGE_URL=http://127.0.0.1:8900/query
+    SEARCH_API_URL=http://127.0.0.1:8900/search
+
+    python benchmarks/stub_upstream.py --port 8900 --latency-ms 50 --fail-rate 0.1
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubState:
+    def __init__(self, latency: float = 0.0, fail_rate: float = 0.0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def count(self):
+        with self.lock:
+            self.requests += 1
+
+
+def quote_payload(symbol: str) -> dict:
+    # Deterministic per symbol so repeated runs compare like for like
+    seed = zlib.crc32(symbol.encode())
+    price = 50 + seed % 450 + (seed % 100) / 100
+    change = ((seed >> 8) % 1000 - 500) / 100
+    return {
+        "Global Quote": {
+            "01. symbol": symbol,
+            "02. open": f"{price - change:.4f}",
+            "03. high": f"{price + 1:.4f}",
+            "04. low": f"{price - 1:.4f}",
+            "05. price": f"{price:.4f}",
+            "06. volume": str(seed % 10_000_000),
+            "07. latest trading day": time.strftime("%Y-%m-%d"),
+            "08. previous close": f"{price - change:.4f}",
+            "09. change": f"{change:.4f}",
+            "10. change percent": f"{change / price * 100:.4f}%",
+        }
+    }
+
+
+def search_payload(query: str, count: int = 8) -> dict:
+    return {
+        "query": query,
+        "results": [
+            {
+                "title": f"Result {i + 1} for {query}",
+                "url": f"https://example.com/{i + 1}?q={query.replace(' ', '+')}",
+                "content": f"Snippet {i + 1} about {query}. " * 5,
+            }
+            for i in range(count)
+        ],
+    }
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Send headers and body in one segment; otherwise Nagle plus delayed
+        # ACKs add ~40ms to every keep-alive request
+        disable_nagle_algorithm = True
+        wbufsize = 64 * 1024
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            state.count()
+            if state.latency:
+                time.sleep(state.latency)
+            if state.fail_rate and random.random() < state.fail_rate:
+                return self.send_json({"error": "stub failure"}, status=503)
+
+            url = urlparse(self.path)
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            if url.path == "/query":
+                return self.send_json(quote_payload(params.get("symbol", "").upper()))
+            if url.path == "/search":
+                return self.send_json(search_payload(params.get("q", "")))
+            return self.send_json({"error": "not found"}, status=404)
+
+        def send_json(self, payload, status=200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def start_stub_server(port: int = 0, latency: float = 0.0, fail_rate: float = 0.0):
+    """Start the stub on a daemon thread; returns (server, state, base_url)"""
+    state = StubState(latency, fail_rate)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-upstream", daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Alpha Vantage and search upstream")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server, _, base_url = start_stub_server(args.port, args.latency_ms / 1000, args.fail_rate)
+    print(f"Stub upstream listening on {base_url} (/query, /search)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Tools the chat model can call.
+
+Kept out of chatbot_engine so the tool stack (and DDGS) is only imported
+when the tool registry is first built, see chatbot_engine.get_tools.
+"""
+
+import os
+
+from langchain_core.tools import tool
+
+from admission import upstream_limiter
+from http_client import HTTP_READ_TIMEOUT, http
+
+ALPHA_VANTAGE_URL = os.getenv("ALPHA_VANTAGE_URL", "https://www.alphavantage.co/query")
+ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY", "C9PE94QUEW9VWGFM")
+SEARCH_API_URL = os.getenv("SEARCH_API_URL")
+
+
+def _ddgs_text(query: str, max_results: int):
+    from duckduckgo_search import DDGS
+
+    with DDGS(timeout=int(HTTP_READ_TIMEOUT)) as ddgs:
+        return list(ddgs.text(query, max_results=max_results))
+
+
+@tool
+def duckduckgo_search(query: str, max_results: int = 5) -> dict:
+    """
+    Search DuckDuckGo and return the top results (title, url, snippet).
+    """
+    try:
+        if SEARCH_API_URL:
+            # JSON search endpoint (SearxNG-style), reached through the shared client
+            r = http.get("search", SEARCH_API_URL, params={"q": query, "format": "json"})
+            results = r.json().get("results", [])[:max_results]
+        else:
+            # DDGS brings its own HTTP client, so only the rate limit and circuit breaker apply
+            upstream_limiter.acquire("duckduckgo")
+            results = http.breaker("duckduckgo").call(_ddgs_text, query, max_results)
+        # Raw hits; tool_results.compact_search picks the fields the model sees
+        return {"query": query, "results": [r for r in results if r.get("title") and (r.get("url") or r.get("href"))]}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@tool
+def calculator(first_num: float, second_num: float, operation: str) -> dict:
+    """
+    Perform a basic arithmetic operation on two numbers.
+    Supported operations: add, sub, mul, div
+    """
+    try:
+        if operation == "add":
+            result = first_num + second_num
+        elif operation == "sub":
+            result = first_num - second_num
+        elif operation == "mul":
+            result = first_num * second_num
+        elif operation == "div":
+            if second_num == 0:
+                return {"error": "Division by zero is not allowed"}
+            result = first_num / second_num
+        else:
+            return {"error": f"Unsupported operation '{operation}'"}
+
+        return {
+            "first_num": first_num,
+            "second_num": second_num,
+            "operation": operation,
+            "result": result,
+        }
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@tool
+def get_stock_price(symbol: str) -> dict:
+    """
+    Fetch latest stock price for a given symbol (e.g. 'AAPL', 'TSLA')
+    using Alpha Vantage API.
+    """
+    params = {"function": "GLOBAL_QUOTE", "symbol": symbol, "apikey": ALPHA_VANTAGE_API_KEY}
+    try:
+        r = http.get("alphavantage", ALPHA_VANTAGE_URL, params=params)
+        return r.json()
+    except Exception as e:
+        return {"error": str(e)}
+
+
+TOOLS = [duckduckgo_search, get_stock_price, calculator]
@@ -1,104 +1,152 @@
-from langgraph.graph import StateGraph, START, END
-from typing import TypedDict, Annotated
-from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.checkpoint.sqlite import SqliteSaver
-from langgraph.graph.message import add_messages
-from langchain_core.tools import tool
-from dotenv import load_dotenv
-import sqlite3
-import requests
+"""
+Chat engine: the LangGraph chat graph and the per-thread stores around it.
+
+Nothing expensive happens at import time. The model client, tool
+registry, checkpointer, compiled graph and stores are lazy singletons,
+built on first use or ahead of time by warm_up() (main.py calls it from
+the FastAPI lifespan hook), so the app imports quickly and /healthz can
+answer while the graph is still being built.
+"""
+
+import functools
 import os
+import threading
+import time
+import uuid
+from typing import Annotated, TypedDict
+
+from dotenv import load_dotenv
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.types import StreamWriter
 
 # -------------------- LOAD ENV --------------------
 load_dotenv()
 api_key = os.getenv("GOOGLE_API_KEY")
 
+# Local modules read their settings from the environment at import time
+from thread_catalog import ThreadCatalog, ThreadDeleted, make_thread_name
+from persistence import DATABASE_PATH, connect, create_checkpointer
+from retention import start_compactor
+from purge import ThreadPurger
+from leases import LeaseManager
+from tool_executor import ToolRegistry
+from admission import upstream_limiter
+from tool_cache import TOOL_CACHE_SHARED, SharedToolCache, ToolResultCache
+from tool_results import ToolPayloadStore, compact, format_tool_result, render
+from context_window import build_prompt, content_text, update_context
+from message_index import MessageIndex, project_messages
+from instrumentation import instrument_saver, model_callbacks, timed_node
+from response_cache import RESPONSE_CACHE_CONTEXT_MESSAGES, ResponseCache, replay_chunks
+
+# LLM_PROVIDER=fake swaps in a deterministic offline model for load tests
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "google")
+# Characters of a tool result sent with its tool_end event
+TOOL_EVENT_RESULT_CHARS = int(os.getenv("TOOL_EVENT_RESULT_CHARS", "200"))
+
+
+def lazy(factory):
+    """
+    Turn a zero-argument factory into a thread-safe getter that builds
+    once. getter.ready() says whether it has been built; getter.set(value)
+    replaces the instance (benchmarks swap in their own model this way).
+    """
+    lock = threading.Lock()
+    built = []
+
+    @functools.wraps(factory)
+    def get():
+        if not built:
+            with lock:
+                if not built:
+                    built.append(factory())
+        return built[0]
+
+    def replace(value):
+        with lock:
+            built[:] = [value]
+
+    get.ready = lambda: bool(built)
+    get.set = replace
+    return get
+
+
 # -------------------- LLM INITIALIZATION --------------------
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash-lite",
-    google_api_key=api_key,
-)
+@lazy
+def get_llm():
+    if LLM_PROVIDER == "fake":
+        from fake_llm import FakeChatModel
+        return FakeChatModel(callbacks=model_callbacks())
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash-lite",
+        google_api_key=api_key,
+        callbacks=model_callbacks(),
+    )
+
 
 # -------------------- TOOLS --------------------
+@lazy
+def get_tools():
+    from chat_tools import TOOLS
+    return TOOLS
 
-@tool
-def duckduckgo_search(query: str, max_results: int = 5) -> str:
-    """
-    Search DuckDuckGo and return summarized text for the model.
-    """
-    try:
-        with DDGS() as ddgs:
-            results = list(ddgs.text(query, max_results=max_results))
-        if not results:
-            return "Sorry, I couldn't find any top news related to that topic."
-        # Format title + URL for each result
-        formatted = "\n".join([f"- {r['title']}: {r['href']}" for r in results if r.get("title") and r.get("href")])
-        return formatted
-    except Exception as e:
-        return f"An error occurred: {e}"
-
-
-@tool
-def calculator(first_num: float, second_num: float, operation: str) -> dict:
-    """
-    Perform a basic arithmetic operation on two numbers.
-    Supported operations: add, sub, mul, div
-    """
-    try:
-        if operation == "add":
-            result = first_num + second_num
-        elif operation == "sub":
-            result = first_num - second_num
-        elif operation == "mul":
-            result = first_num * second_num
-        elif operation == "div":
-            if second_num == 0:
-                return {"error": "Division by zero is not allowed"}
-            result = first_num / second_num
-        else:
-            return {"error": f"Unsupported operation '{operation}'"}
-
-        return {
-            "first_num": first_num,
-            "second_num": second_num,
-            "operation": operation,
-            "result": result,
-        }
-    except Exception as e:
-        return {"error": str(e)}
 
+@lazy
+def get_tool_registry():
+    tool_cache = ToolResultCache(shared=SharedToolCache(connect(DATABASE_PATH)) if TOOL_CACHE_SHARED else None)
+    return ToolRegistry(get_tools(), cache=tool_cache)
 
-@tool
-def get_stock_price(symbol: str) -> dict:
-    """
-    Fetch latest stock price for a given symbol (e.g. 'AAPL', 'TSLA') 
-    using Alpha Vantage API.
-    """
-    url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={symbol}&apikey=C9PE94QUEW9VWGFM"
-    try:
-        r = requests.get(url)
-        return r.json()
-    except Exception as e:
-        return {"error": str(e)}
 
+@lazy
+def get_llm_with_tools():
+    return get_llm().bind_tools(get_tools())
 
-# -------------------- COMBINE TOOLS --------------------
-tools = [duckduckgo_search, get_stock_price, calculator]
-llm_with_tools = llm.bind_tools(tools)
 
 # -------------------- GRAPH STATE --------------------
-class ChatState(TypedDict):
-    messages: Annotated[list[BaseMessage], add_messages]
+@lazy
+def get_chat_state():
+    # add_messages pulls in langgraph.graph, so the state type is built lazily too
+    from langgraph.graph.message import add_messages
+
+    class ChatState(TypedDict):
+        messages: Annotated[list[BaseMessage], add_messages]
+        # Rolling summary of messages[:summarized_count], see context_window
+        summary: str
+        summarized_count: int
+
+    return ChatState
 
 # -------------------- NODES --------------------
-def chat_node(state: ChatState):
-    messages = state["messages"]
-    response = llm_with_tools.invoke(messages)
+def context_node(state):
+    # Full history stays in the checkpoint; only the summary boundary moves
+    return update_context(state, get_llm())
+
+
+def chat_node(state):
+    messages = build_prompt(state)
+    upstream_limiter.acquire("llm")
+    response = get_llm_with_tools().invoke(messages)
     return {"messages": [response]}
 
 
-def tool_node(state: ChatState):
+def tool_event(kind: str, call: dict, result=None, duration: float = None, outcome: str = None) -> dict:
+    """Progress event for one tool call, as sent to /chat/stream clients"""
+    event = {"type": kind, "tool": call["name"], "call_id": call["id"]}
+    if kind == "tool_start":
+        event["args"] = call["args"]
+    else:
+        text = render(call["name"], compact(call["name"], result))
+        event.update(
+            duration_ms=round(duration * 1000, 1),
+            outcome=outcome,
+            result=text[:TOOL_EVENT_RESULT_CHARS],
+            truncated=len(text) > TOOL_EVENT_RESULT_CHARS,
+        )
+    return event
+
+
+def tool_node(state, config: RunnableConfig, writer: StreamWriter):
     messages = state["messages"]
     last_message = messages[-1]
     tool_calls = getattr(last_message, "tool_calls", [])
@@ -106,29 +154,25 @@ def tool_node(state: ChatState):
     if not tool_calls:
         return {"messages": []}
 
+    # Execute all requested tools concurrently; results come back in call order,
+    # progress goes to the "custom" stream as each call starts and ends
+    tool_results = get_tool_registry().run_calls(
+        tool_calls,
+        on_event=lambda kind, call, **details: writer(tool_event(kind, call, **details)),
+    )
+    # Compact JSON for the model and the checkpoint, raw payloads set aside
+    thread_id = config["configurable"]["thread_id"]
     tool_messages = []
-    for tool_call in tool_calls:
-        tool_name = tool_call["name"]
-        tool_args = tool_call["args"]
-        tool_id = tool_call["id"]
-
-        # Execute the correct tool
-        tool_result = None
-        for t in tools:
-            if t.name == tool_name:
-                try:
-                    tool_result = t.invoke(tool_args)
-                except Exception as e:
-                    tool_result = {"error": str(e)}
-                break
-
-        tool_message = ToolMessage(content=str(tool_result), tool_call_id=tool_id)
-        tool_messages.append(tool_message)
+    for tool_call, tool_result in zip(tool_calls, tool_results):
+        content, artifact = format_tool_result(tool_call["name"], tool_result, get_tool_payloads(), thread_id)
+        tool_messages.append(
+            ToolMessage(content=content, artifact=artifact, name=tool_call["name"], tool_call_id=tool_call["id"])
+        )
 
     return {"messages": tool_messages}
 
 
-def tools_condition(state: ChatState):
+def tools_condition(state):
     messages = state["messages"]
     if not messages:
         return "__end__"
@@ -139,58 +183,343 @@ def tools_condition(state: ChatState):
     return "__end__"
 
 # -------------------- CHECKPOINT + GRAPH --------------------
-conn = sqlite3.connect(database="chatbot.db", check_same_thread=False)
-checkpointer = SqliteSaver(conn=conn)
+@lazy
+def get_checkpointer():
+    return instrument_saver(create_checkpointer())
+
 
-graph = StateGraph(ChatState)
-graph.add_node("chat_node", chat_node)
-graph.add_node("tools", tool_node)
+@lazy
+def get_leases():
+    # Shared by every worker process using DATABASE_PATH, see leases.py
+    return LeaseManager(connect(DATABASE_PATH))
 
-graph.add_edge(START, "chat_node")
-graph.add_conditional_edges(
-    "chat_node",
-    tools_condition,
-    {"tools": "tools", "__end__": END},
-)
-graph.add_edge("tools", "chat_node")
 
-chatbot = graph.compile(checkpointer=checkpointer)
+@lazy
+def get_graph():
+    from langgraph.graph import StateGraph, START, END
+
+    graph = StateGraph(get_chat_state())
+    graph.add_node("context", timed_node("context", context_node))
+    graph.add_node("chat_node", timed_node("chat_node", chat_node))
+    graph.add_node("tools", timed_node("tools", tool_node))
+
+    graph.add_edge(START, "context")
+    graph.add_edge("context", "chat_node")
+    graph.add_conditional_edges(
+        "chat_node",
+        tools_condition,
+        {"tools": "tools", "__end__": END},
+    )
+    graph.add_edge("tools", "chat_node")
+
+    return graph.compile(checkpointer=get_checkpointer())
 
 # -------------------- THREAD MANAGEMENT --------------------
-def retrieve_all_threads():
-    all_threads = {}
-    i = 1
-    for checkpoint in checkpointer.list(None):
-        cfg = checkpoint.config.get("configurable", {})
-        thread_id = cfg.get("thread_id")
-        name = cfg.get("name")
-
-        if not name:
-            try:
-                config = {"configurable": {"thread_id": thread_id}}
-                state = chatbot.get_state(config=config)
-                messages = state.values.get("messages", []) if state.values else []
-
-                for msg in messages:
-                    if isinstance(msg, HumanMessage):
-                        name = msg.content[:50] + "..." if len(msg.content) > 50 else msg.content
-                        chatbot.update_state(
-                            config={"configurable": {"thread_id": thread_id, "name": name}},
-                            values=None,
-                        )
-                        break
-
-                if not name:
-                    name = f"Chat {i}"
-
-            except Exception as e:
-                print(f"Error generating name for thread {thread_id}: {e}")
-                name = f"Chat {i}"
-
-        all_threads[thread_id] = name
-        i += 1
-
-    return all_threads
+@lazy
+def get_catalog():
+    catalog = ThreadCatalog(connect(DATABASE_PATH))
+    catalog.backfill_from_checkpoints()
+    return catalog
+
+
+@lazy
+def get_message_index():
+    return MessageIndex(connect(DATABASE_PATH))
+
+
+@lazy
+def get_response_cache():
+    return ResponseCache(connect(DATABASE_PATH))
+
+
+@lazy
+def get_tool_payloads():
+    return ToolPayloadStore(connect(DATABASE_PATH))
+
+
+@lazy
+def get_purger():
+    return ThreadPurger(get_checkpointer(), get_catalog(), leases=get_leases(), conn=connect(DATABASE_PATH))
+
+
+# -------------------- STARTUP --------------------
+# Order matters: the stores first, so /healthz reports them ready early
+COMPONENTS = {
+    "catalog": get_catalog,
+    "message_index": get_message_index,
+    "response_cache": get_response_cache,
+    "tool_payloads": get_tool_payloads,
+    "leases": get_leases,
+    "checkpointer": get_checkpointer,
+    "llm": get_llm,
+    "tools": get_tool_registry,
+    "graph": get_graph,
+}
+_background_jobs = []
+_background_jobs_lock = threading.Lock()
+
+
+def warm_up():
+    """Build every component now instead of on the first request"""
+    for build in COMPONENTS.values():
+        build()
+    start_background_jobs()
+
+
+def start_background_jobs():
+    """Start the checkpoint compactor and the thread purger once per process"""
+    with _background_jobs_lock:
+        if not _background_jobs:
+            _background_jobs.append(start_compactor(get_checkpointer(), leases=get_leases()))
+            _background_jobs.append(get_purger().start())
+
+
+def readiness() -> dict:
+    """component name -> whether it has been built"""
+    return {name: build.ready() for name, build in COMPONENTS.items()}
+
+
+# Old module attributes, built on first access
+_LEGACY_ATTRIBUTES = {
+    "llm": get_llm,
+    "llm_with_tools": get_llm_with_tools,
+    "tools": get_tools,
+    "tool_registry": get_tool_registry,
+    "ChatState": get_chat_state,
+    "checkpointer": get_checkpointer,
+    "leases": get_leases,
+    "chatbot": get_graph,
+    "catalog": get_catalog,
+    "message_index": get_message_index,
+    "response_cache": get_response_cache,
+}
+
+
+def __getattr__(name):
+    if name in _LEGACY_ATTRIBUTES:
+        return _LEGACY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def retrieve_all_threads(limit=100, cursor=None, order="last_activity", direction="desc"):
+    """Return one page of threads from the catalog and the next-page cursor"""
+    return get_catalog().list_threads(limit=limit, cursor=cursor, order=order, direction=direction)
+
+
+def start_turn(thread_id: str, message: str):
+    get_catalog().start_turn(thread_id, make_thread_name(message))
+
+
+def finish_turn(thread_id: str):
+    config = {"configurable": {"thread_id": thread_id}}
+    state = get_graph().get_state(config=config)
+    messages = state.values.get("messages", []) if state.values else []
+    get_catalog().finish_turn(thread_id, len(messages))
+    get_message_index().sync(thread_id, messages)
+    return messages
+
+
+def conversation_version(thread_id: str) -> int:
+    """
+    Indexed message count for a thread. Threads from before the index
+    existed are indexed from their checkpoint on first access.
+    """
+    version = get_message_index().version(thread_id)
+    if version is None:
+        state = get_graph().get_state(config={"configurable": {"thread_id": thread_id}})
+        messages = state.values.get("messages", []) if state.values else []
+        if not messages:
+            return 0
+        version = get_message_index().sync(thread_id, messages)
+    return version
+
+
+def get_conversation_page(thread_id: str, before=None, after=None, limit=100):
+    """One page of user/assistant messages and whether more exist beyond it"""
+    return get_message_index().page(thread_id, before=before, after=after, limit=limit)
+
+
+def search_messages(query: str, limit=20, thread_id=None):
+    """Ranked message snippets matching `query`, with their thread names, and whether ranking was capped"""
+    # Deleted threads keep their index rows until the purge reaches them
+    results, truncated = get_message_index().search(
+        query, limit=limit, thread_id=thread_id, exclude=get_catalog().deleted_ids()
+    )
+    names = get_catalog().names(result["thread_id"] for result in results)
+    for result in results:
+        result["thread_name"] = names[result["thread_id"]]
+    return results, truncated
+
+
+def recent_context(messages):
+    """The user/assistant messages a cached answer has to follow"""
+    if RESPONSE_CACHE_CONTEXT_MESSAGES <= 0:
+        return []
+    projected = project_messages(messages)[-RESPONSE_CACHE_CONTEXT_MESSAGES:]
+    return [(role, content) for _, role, content in projected]
+
+
+def stream_turn(thread_id: str, message: str, info: dict = None, events: bool = False):
+    """
+    Run one chat turn and yield the AI response text chunk by chunk.
+    This is blocking; callers on the event loop go through turn_runner.
+    When `info` is given it receives the turn's trace_id (the LangChain run
+    id, which is also the LangSmith trace id when tracing is on), its
+    timing once it ends and, for turns answered from the response cache,
+    info["cached"].
+
+    With `events`, progress events are yielded as dicts between the text
+    chunks: tool_start / tool_end for each tool call and node whenever a
+    graph node finishes.
+
+    Turns on one thread never overlap, even across worker processes: the
+    turn holds the thread's lease throughout and raises LeaseBusy if it
+    cannot get it within THREAD_LEASE_WAIT_SECONDS. Turns on deleted
+    threads raise ThreadDeleted.
+    """
+    with get_leases().acquire(f"thread:{thread_id}"):
+        # Checked under the lease, which the purge also takes
+        if get_catalog().is_deleted(thread_id):
+            raise ThreadDeleted(f"Thread '{thread_id}' has been deleted")
+        completed = False
+        try:
+            yield from _run_turn(thread_id, message, info, events)
+            completed = True
+        finally:
+            if not completed:
+                # A failed or abandoned turn may still have checkpointed its
+                # message and tool results; keep the catalog and index in step
+                try:
+                    finish_turn(thread_id)
+                except Exception as e:
+                    print(f"Could not sync thread {thread_id} after a failed turn: {e}")
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+
+def _run_turn(thread_id: str, message: str, info: dict = None, events: bool = False):
+    chatbot = get_graph()
+    response_cache = get_response_cache()
+    config = {"configurable": {"thread_id": thread_id}}
+    run_id = uuid.uuid4()
+    turn_started = time.perf_counter()
+    if info is not None:
+        info["trace_id"] = str(run_id)
+
+    # Get current state
+    state = chatbot.get_state(config=config)
+    messages = state.values.get("messages", []) if state.values else []
+
+    # If this is the first message, set the thread name
+    if len(messages) == 0:
+        chatbot.update_state(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "name": make_thread_name(message),
+                },
+                "metadata": {
+                    "thread_id": thread_id,
+                },
+                "run_name": "chat_turn",
+            },
+            values={"messages": []},
+        )
+    start_turn(thread_id, message)
+
+    use_cache = response_cache.is_enabled_for(thread_id)
+    context = recent_context(messages) if use_cache else None
+    # Answers from deleted threads are never served
+    cached = response_cache.lookup(message, context, live=get_catalog().is_live) if use_cache else None
+    if cached is not None:
+        # Record the turn as if chat_node had answered it, then replay
+        chatbot.update_state(
+            config,
+            {"messages": [HumanMessage(content=message), AIMessage(content=cached.answer)]},
+            as_node="chat_node",
+        )
+        if info is not None:
+            info["cached"] = cached.kind
+            info["timing"] = {"total_ms": _ms(time.perf_counter() - turn_started), "nodes": {}}
+        yield from replay_chunks(cached.answer)
+        finish_turn(thread_id)
+        return
+    if response_cache.enabled and not use_cache:
+        response_cache.bypass()
+
+    started = time.perf_counter()
+    first_token_at = None
+    node_seconds = {}
+    node_started = started
+    for mode, payload in chatbot.stream(
+        {"messages": [HumanMessage(content=message)]},
+        config={**config, "run_id": run_id},
+        stream_mode=["messages", "updates", "custom"],
+    ):
+        if mode == "messages":
+            message_chunk, metadata = payload
+            # Skip tokens from the summarizer call in the context node
+            if metadata.get("langgraph_node") != "chat_node":
+                continue
+            if isinstance(message_chunk, AIMessage) and message_chunk.content:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                yield message_chunk.content
+        elif mode == "updates":
+            # Nodes run one at a time, so a node ran since the previous one finished
+            now = time.perf_counter()
+            for node in payload:
+                node_seconds[node] = node_seconds.get(node, 0.0) + now - node_started
+                if events:
+                    yield {"type": "node", "node": node, "duration_ms": _ms(now - node_started)}
+            node_started = now
+        elif events:
+            yield payload
+
+    if info is not None:
+        info["timing"] = {
+            "total_ms": _ms(time.perf_counter() - turn_started),
+            "first_token_ms": _ms(first_token_at - turn_started) if first_token_at is not None else None,
+            "nodes": {node: _ms(seconds) for node, seconds in node_seconds.items()},
+        }
+    messages_after = finish_turn(thread_id)
+    if use_cache:
+        turn = messages_after[len(messages):]
+        answer = turn[-1] if turn and isinstance(turn[-1], AIMessage) else None
+        if answer is not None and not answer.tool_calls:
+            response_cache.store(
+                message, context, content_text(answer),
+                cost_seconds=time.perf_counter() - started,
+                used_tools=any(isinstance(m, ToolMessage) for m in turn),
+                thread_id=thread_id,
+            )
+
+
+def is_thread_deleted(thread_id: str) -> bool:
+    return get_catalog().is_deleted(thread_id)
+
+
+def delete_threads(thread_ids) -> int:
+    """
+    Hide the threads right away and leave their data to the purge worker.
+    Returns how many were not already deleted.
+    """
+    thread_ids = list(thread_ids)
+    count = get_catalog().mark_deleted(thread_ids)
+    get_response_cache().forget_threads(thread_ids)
+    get_purger().wake()
+    return count
+
+
+def delete_thread(thread_id: str):
+    delete_threads([thread_id])
+
+
+def sweep_threads(older_than_days: float) -> int:
+    """Delete every thread idle for more than `older_than_days`"""
+    return get_purger().sweep(older_than_days)
 
 # -------------------- TEST --------------------
 if __name__ == "__main__":
@@ -201,7 +530,7 @@ if __name__ == "__main__":
     user_message = HumanMessage(content="AI latest news 2025")
 
     # Invoke chatbot
-    response = chatbot.invoke(
+    response = get_graph().invoke(
         {"messages": [user_message]},
         config=config,
     )
@@ -0,0 +1,141 @@
+"""
+Context-window management for chat_node.
+
+The checkpoint keeps the complete message history, but the model only ever
+sees a bounded prompt:
+
+- a rolling summary of everything older than the window, stored in the
+  graph state (`summary`, plus `summarized_count` messages folded into it)
+- the newest messages that fit CONTEXT_TOKEN_BUDGET, starting on a user
+  message so tool results are never separated from their tool call
+- tool outputs in the prompt cut to CONTEXT_TOOL_OUTPUT_MAX_CHARS
+
+The summary is only refreshed when the unsummarized history outgrows the
+budget. The window is then shrunk to CONTEXT_WINDOW_TARGET of the budget,
+so the extra summarization call happens every few turns rather than on
+every turn. Token counts are a chars/4 estimate, which is close enough
+for budgeting.
+"""
+
+import os
+
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+
+from admission import upstream_limiter
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000"))
+CONTEXT_WINDOW_TARGET = float(os.getenv("CONTEXT_WINDOW_TARGET", "0.6"))
+CONTEXT_TOOL_OUTPUT_MAX_CHARS = int(os.getenv("CONTEXT_TOOL_OUTPUT_MAX_CHARS", "2000"))
+CONTEXT_SUMMARY_MAX_CHARS = int(os.getenv("CONTEXT_SUMMARY_MAX_CHARS", "4000"))
+
+# Rough per-message overhead for role markers and tool-call metadata
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Update the existing summary with the new messages below. Keep facts, names, numbers, "
+    "user preferences and open questions; drop pleasantries. Reply with the summary only."
+)
+
+
+def content_text(message) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    # Multimodal content blocks: count only the text parts
+    return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+
+def estimate_tokens(message) -> int:
+    tokens = len(content_text(message)) // 4 + _MESSAGE_OVERHEAD_TOKENS
+    for call in getattr(message, "tool_calls", None) or []:
+        tokens += len(str(call.get("args", ""))) // 4 + _MESSAGE_OVERHEAD_TOKENS
+    return tokens
+
+
+def truncate_tool_output(message, max_chars: int = CONTEXT_TOOL_OUTPUT_MAX_CHARS):
+    if not isinstance(message, ToolMessage) or max_chars <= 0:
+        return message
+    text = content_text(message)
+    if len(text) <= max_chars:
+        return message
+    return message.model_copy(
+        update={"content": text[:max_chars] + f"... [truncated {len(text) - max_chars} chars]"}
+    )
+
+
+def window_start(messages, budget: int, floor: int = 0) -> int:
+    """
+    Index of the first message in the newest window that fits `budget`
+    tokens, never earlier than `floor`. The window always starts on a
+    HumanMessage and always includes the latest user turn, even when that
+    turn alone is over budget.
+    """
+    last_human = next(
+        (i for i in range(len(messages) - 1, floor - 1, -1) if isinstance(messages[i], HumanMessage)),
+        floor,
+    )
+    start, used = len(messages), 0
+    for i in range(len(messages) - 1, floor - 1, -1):
+        used += estimate_tokens(truncate_tool_output(messages[i]))
+        if used > budget and i < last_human:
+            break
+        start = i
+    while start < last_human and not isinstance(messages[start], HumanMessage):
+        start += 1
+    return start
+
+
+def summarize(llm, previous_summary: str, messages, max_chars: int = CONTEXT_SUMMARY_MAX_CHARS) -> str:
+    transcript = "\n".join(
+        f"{message.type}: {content_text(truncate_tool_output(message, 500))}"
+        for message in messages
+        if content_text(message)
+    )
+    prompt = [
+        SystemMessage(content=SUMMARY_PROMPT),
+        HumanMessage(content=f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"),
+    ]
+    upstream_limiter.acquire("llm")
+    return content_text(llm.invoke(prompt))[:max_chars]
+
+
+def update_context(state, llm, budget: int = CONTEXT_TOKEN_BUDGET) -> dict:
+    """
+    Fold messages that no longer fit the budget into the rolling summary.
+    Returns the state update (empty when nothing needs to change).
+    """
+    messages = state["messages"]
+    summary = state.get("summary") or ""
+    summarized_count = state.get("summarized_count") or 0
+
+    summary_tokens = len(summary) // 4
+    pending = sum(estimate_tokens(truncate_tool_output(m)) for m in messages[summarized_count:])
+    if pending + summary_tokens <= budget:
+        return {}
+
+    target = int(budget * CONTEXT_WINDOW_TARGET) - len(summary) // 4
+    start = window_start(messages, max(target, 0), floor=summarized_count)
+    if start <= summarized_count:
+        return {}
+    return {
+        # The summary may use at most a quarter of the budget (chars/4 tokens)
+        "summary": summarize(
+            llm, summary, messages[summarized_count:start],
+            max_chars=min(CONTEXT_SUMMARY_MAX_CHARS, budget),
+        ),
+        "summarized_count": start,
+    }
+
+
+def build_prompt(state, budget: int = CONTEXT_TOKEN_BUDGET) -> list:
+    """The messages actually sent to the model for this step"""
+    messages = state["messages"]
+    summary = state.get("summary") or ""
+    summarized_count = state.get("summarized_count") or 0
+
+    start = window_start(messages, max(budget - len(summary) // 4, 0), floor=summarized_count)
+    prompt = [truncate_tool_output(message) for message in messages[start:]]
+    if summary:
+        prompt.insert(0, SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+    return prompt
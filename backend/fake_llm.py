@@ -0,0 +1,118 @@
+"""
+Deterministic stand-in for the Gemini chat model.
+
+Selected with LLM_PROVIDER=fake so the server, load tests and benchmarks
+run offline. Answers are generated from the prompt text, so the same
+prompt always gets the same answer and the same tool decisions:
+
+- the first token arrives after FAKE_LLM_FIRST_TOKEN_MS, then tokens stream
+  at FAKE_LLM_TOKENS_PER_SECOND (0 disables all delays)
+- answers are FAKE_LLM_ANSWER_TOKENS words long
+- a FAKE_LLM_TOOL_CALL_RATE share of user prompts trigger a tool call:
+  get_stock_price when the prompt contains a ticker-like word (AAPL),
+  otherwise duckduckgo_search; the answer after the tool result quotes it
+"""
+
+import json
+import os
+import re
+import time
+import zlib
+from typing import List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from context_window import content_text
+
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "100"))
+FAKE_LLM_FIRST_TOKEN_MS = float(os.getenv("FAKE_LLM_FIRST_TOKEN_MS", "200"))
+FAKE_LLM_ANSWER_TOKENS = int(os.getenv("FAKE_LLM_ANSWER_TOKENS", "60"))
+FAKE_LLM_TOOL_CALL_RATE = float(os.getenv("FAKE_LLM_TOOL_CALL_RATE", "0.3"))
+
+_VOCABULARY = (
+    "the market model answer data result system value report update today latest "
+    "price growth signal trend query source detail summary analysis context"
+).split()
+_TICKER = re.compile(r"\b[A-Z]{2,5}\b")
+
+
+class FakeChatModel(BaseChatModel):
+    tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND
+    first_token_ms: float = FAKE_LLM_FIRST_TOKEN_MS
+    answer_tokens: int = FAKE_LLM_ANSWER_TOKENS
+    tool_call_rate: float = FAKE_LLM_TOOL_CALL_RATE
+    tool_names: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"tool_names": [tool.name for tool in tools]})
+
+    # ---- response planning ----
+    def _tool_call(self, messages):
+        """The tool call to make for this prompt, or None"""
+        if not self.tool_names or not messages or not isinstance(messages[-1], HumanMessage):
+            return None
+        prompt = content_text(messages[-1])
+        seed = zlib.crc32(prompt.encode())
+        if (seed % 1000) / 1000 >= self.tool_call_rate:
+            return None
+        ticker = _TICKER.search(prompt)
+        if ticker and "get_stock_price" in self.tool_names:
+            name, args = "get_stock_price", {"symbol": ticker.group()}
+        elif "duckduckgo_search" in self.tool_names:
+            name, args = "duckduckgo_search", {"query": prompt[:100]}
+        else:
+            return None
+        return {"name": name, "args": args, "id": f"call_{seed:08x}"}
+
+    def _answer_tokens(self, messages) -> List[str]:
+        last = messages[-1] if messages else None
+        prompt = content_text(last) if last is not None else ""
+        seed = zlib.crc32(prompt.encode())
+        words = [_VOCABULARY[(seed >> (i % 24) ^ i * 7) % len(_VOCABULARY)] for i in range(self.answer_tokens)]
+        if isinstance(last, ToolMessage):
+            words = ["Based", "on", "the", "tool", "result:", prompt[:80].replace("\n", " ")] + words
+        return [word + " " for word in words]
+
+    def _sleep(self, seconds: float):
+        if self.tokens_per_second > 0 and seconds > 0:
+            time.sleep(seconds)
+
+    # ---- BaseChatModel ----
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        call = self._tool_call(messages)
+        if call is not None:
+            self._sleep(self.first_token_ms / 1000)
+            message = AIMessage(content="", tool_calls=[call])
+        else:
+            tokens = self._answer_tokens(messages)
+            self._sleep(self.first_token_ms / 1000 + len(tokens) / max(self.tokens_per_second, 1e-9))
+            message = AIMessage(content="".join(tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._sleep(self.first_token_ms / 1000)
+        call = self._tool_call(messages)
+        if call is not None:
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[
+                        tool_call_chunk(name=call["name"], args=json.dumps(call["args"]), id=call["id"], index=0)
+                    ],
+                )
+            )
+            return
+        for i, token in enumerate(self._answer_tokens(messages)):
+            if i:
+                self._sleep(1 / max(self.tokens_per_second, 1e-9))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
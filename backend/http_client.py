@@ -0,0 +1,165 @@
+"""
+Shared outbound HTTP client for the tools.
+
+All upstream calls go through one pooled requests.Session, so connections
+are kept alive between calls instead of paying a TCP and TLS handshake
+each time. Each request has connect and read timeouts. Connection
+errors, timeouts, 429 and 5xx responses are retried with full-jitter
+exponential backoff.
+
+Upstreams with a rate limit (see admission.py) wait for a token before
+each attempt. Every upstream also has a circuit breaker. After BREAKER_FAILURE_THRESHOLD
+consecutive failures, calls fail fast for BREAKER_RESET_SECONDS. Then a
+single trial call decides whether the circuit closes again.
+"""
+
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from admission import upstream_limiter
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.25"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "4"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+
+class UpstreamError(Exception):
+    """Raised when an upstream still fails after all retries"""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        with self.lock:
+            state = self.state
+            if state == "open" or (state == "half_open" and self.trial_in_flight):
+                raise CircuitOpenError(f"Upstream '{self.name}' is unavailable, try again later")
+            if state == "half_open":
+                self.trial_in_flight = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn through the breaker; any exception counts as a failure"""
+        self.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+def backoff_delay(attempt: int, base: float = HTTP_BACKOFF_BASE, cap: float = HTTP_BACKOFF_MAX) -> float:
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class HttpClient:
+    def __init__(self, *, pool_size: int = HTTP_POOL_SIZE,
+                 timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+                 max_retries: int = HTTP_MAX_RETRIES):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def breaker(self, upstream: str) -> CircuitBreaker:
+        with self.lock:
+            if upstream not in self.breakers:
+                self.breakers[upstream] = CircuitBreaker(upstream)
+            return self.breakers[upstream]
+
+    def request(self, upstream: str, method: str, url: str, **kwargs) -> requests.Response:
+        breaker = self.breaker(upstream)
+        kwargs.setdefault("timeout", self.timeout)
+        # Wait for a rate-limit token first: being turned away locally says
+        # nothing about the upstream, so it must not start a breaker trial
+        upstream_limiter.acquire(upstream)
+        breaker.before_call()
+
+        # Every way out of here settles the call with the breaker, so a
+        # half-open trial can never stay in flight
+        succeeded = False
+        try:
+            attempt = 0
+            while True:
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                    if response.status_code not in RETRY_STATUSES:
+                        succeeded = True
+                        return response
+                    error = UpstreamError(f"{upstream} returned HTTP {response.status_code}")
+                    retry_after = response.headers.get("Retry-After")
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = UpstreamError(f"{upstream} request failed: {e}")
+                    retry_after = None
+
+                if attempt >= self.max_retries:
+                    raise error
+                delay = backoff_delay(attempt)
+                if retry_after and retry_after.isdigit():
+                    delay = min(max(delay, float(retry_after)), HTTP_BACKOFF_MAX)
+                time.sleep(delay)
+                attempt += 1
+                upstream_limiter.acquire(upstream)
+        finally:
+            if succeeded:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+
+    def get(self, upstream: str, url: str, **kwargs) -> requests.Response:
+        return self.request(upstream, "GET", url, **kwargs)
+
+
+http = HttpClient()
@@ -0,0 +1,139 @@
+"""
+Timing and counting for the graph, its model calls and the checkpointer.
+
+A slow turn can be spent in chat_node (the model), tool_node, checkpoint
+reads and writes, or SSE delivery. The pieces here record each of those
+into the metrics registry so /metrics shows where the time goes:
+
+- `timed_node` wraps a graph node function
+- `instrument_saver` wraps a checkpointer's get/put/list methods in place
+- `TokenCounter`, a model callback, records tokens in and out per node,
+  from the provider's usage metadata when present and the chars/4 estimate
+  otherwise
+
+Each timer is two perf_counter calls and a locked histogram update,
+a few microseconds (see benchmarks/bench_instrumentation.py).
+Set INSTRUMENTATION_ENABLED=0 to skip the wrappers entirely.
+"""
+
+import functools
+import os
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from context_window import estimate_tokens
+from metrics import Counter, Histogram
+
+INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_ENABLED", "1") == "1"
+
+node_duration = Histogram(
+    "graph_node_duration_seconds",
+    "Wall time of graph node executions",
+    labelnames=("node", "outcome"),
+)
+checkpoint_duration = Histogram(
+    "checkpoint_operation_duration_seconds",
+    "Wall time of checkpointer reads and writes",
+    labelnames=("operation", "outcome"),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+llm_tokens = Counter(
+    "llm_tokens_total",
+    "Model tokens sent and received, by node (estimated when the provider reports no usage)",
+    labelnames=("node", "direction"),
+)
+
+SAVER_OPERATIONS = ("get_tuple", "list", "put", "put_writes")
+
+
+def timed_node(name: str, fn):
+    """Wrap a node function so each run is recorded under `name`"""
+    if not INSTRUMENTATION_ENABLED:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            return fn(*args, **kwargs)
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            node_duration.observe(time.perf_counter() - started, node=name, outcome=outcome)
+
+    return wrapper
+
+
+def _timed_call(operation: str, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            return method(*args, **kwargs)
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            checkpoint_duration.observe(time.perf_counter() - started, operation=operation, outcome=outcome)
+
+    return wrapper
+
+
+def _timed_iteration(operation: str, method):
+    # list() is a generator; time the whole iteration, not just its creation
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield from method(*args, **kwargs)
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            checkpoint_duration.observe(time.perf_counter() - started, operation=operation, outcome=outcome)
+
+    return wrapper
+
+
+def instrument_saver(saver):
+    """Time the saver's sync read/write methods by wrapping them on the instance"""
+    if not INSTRUMENTATION_ENABLED:
+        return saver
+    for operation in SAVER_OPERATIONS:
+        method = getattr(saver, operation)
+        wrap = _timed_iteration if operation == "list" else _timed_call
+        setattr(saver, operation, wrap(operation, method))
+    return saver
+
+
+class TokenCounter(BaseCallbackHandler):
+    """Model callback recording tokens in and out per graph node"""
+
+    def __init__(self):
+        self.pending = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node", "none")
+        self.pending[run_id] = (node, sum(estimate_tokens(m) for batch in messages for m in batch))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        node, estimated_in = self.pending.pop(run_id, ("none", 0))
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or {}
+                tokens_out = usage.get("output_tokens") or (estimate_tokens(message) if message else 0)
+                llm_tokens.inc(usage.get("input_tokens") or estimated_in, node=node, direction="input")
+                llm_tokens.inc(tokens_out, node=node, direction="output")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.pending.pop(run_id, None)
+
+
+def model_callbacks() -> list:
+    return [TokenCounter()] if INSTRUMENTATION_ENABLED else []
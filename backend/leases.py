@@ -0,0 +1,161 @@
+"""
+Cross-process leases stored in SQLite.
+
+With several uvicorn workers sharing one database, two turns on the same
+thread_id can land in different processes, where in-process locks cannot
+see each other, and their checkpoints would interleave. A turn therefore
+takes a lease on its thread first: a row in `leases` owned by the turn
+until it releases it or the lease expires. Expiry only matters when a
+worker dies mid-turn; live leases are renewed by a keeper thread every
+third of LEASE_TTL_SECONDS.
+
+The same leases keep periodic jobs (checkpoint compaction) to one worker
+at a time.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from metrics import Counter, Histogram
+
+LEASE_TTL_SECONDS = float(os.getenv("LEASE_TTL_SECONDS", "60"))
+THREAD_LEASE_WAIT_SECONDS = float(os.getenv("THREAD_LEASE_WAIT_SECONDS", "30"))
+
+lease_wait = Histogram(
+    "thread_lease_wait_seconds",
+    "Time a turn waited for its thread lease",
+    labelnames=("outcome",),
+)
+lease_conflicts = Counter(
+    "thread_lease_conflicts_total",
+    "Lease attempts that found the lease held by another turn",
+)
+
+LEASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class LeaseBusy(Exception):
+    """Raised when a lease is still held by someone else after waiting"""
+
+
+class Lease:
+    def __init__(self, manager, key: str, owner: str):
+        self.manager = manager
+        self.key = key
+        self.owner = owner
+        self.released = False
+
+    def release(self):
+        # Safe to call more than once, like TurnSlot.release
+        if not self.released:
+            self.released = True
+            self.manager._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class LeaseManager:
+    def __init__(self, conn: sqlite3.Connection, ttl: float = LEASE_TTL_SECONDS):
+        self.conn = conn
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.held = {}
+        self.process_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._keeper = None
+        with self.lock:
+            self.conn.executescript(LEASE_SCHEMA)
+            self.conn.commit()
+
+    def try_acquire(self, key: str, ttl: float = None, renew: bool = True):
+        """
+        Take the lease if it is free or expired; returns a Lease or None.
+        With renew=False the lease is left to expire after `ttl` seconds,
+        which is how periodic jobs claim a round.
+        """
+        owner = f"{self.process_id}-{uuid.uuid4().hex[:8]}"
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        with self.lock:
+            # A single upsert is atomic across processes: the conflict branch
+            # only takes over leases that have expired
+            cursor = self.conn.execute(
+                """INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?)
+                   ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                   WHERE leases.expires_at < ?""",
+                (key, owner, now + ttl, now),
+            )
+            self.conn.commit()
+            if cursor.rowcount != 1:
+                return None
+            lease = Lease(self, key, owner)
+            if renew:
+                self.held[(key, owner)] = lease
+        if renew:
+            self._ensure_keeper()
+        return lease
+
+    def acquire(self, key: str, wait: float = THREAD_LEASE_WAIT_SECONDS) -> Lease:
+        """Take the lease, polling for up to `wait` seconds; raises LeaseBusy"""
+        started = time.monotonic()
+        delay = 0.02
+        while True:
+            lease = self.try_acquire(key)
+            if lease is not None:
+                lease_wait.observe(time.monotonic() - started, outcome="acquired")
+                return lease
+            lease_conflicts.inc()
+            remaining = wait - (time.monotonic() - started)
+            if remaining <= 0:
+                lease_wait.observe(time.monotonic() - started, outcome="busy")
+                raise LeaseBusy(f"'{key}' is busy with another request")
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.25)
+
+    def _release(self, lease: Lease):
+        with self.lock:
+            self.held.pop((lease.key, lease.owner), None)
+            self.conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (lease.key, lease.owner))
+            self.conn.commit()
+
+    def renew(self):
+        """Push back the expiry of every lease this process holds"""
+        with self.lock:
+            if not self.held:
+                return
+            expires_at = time.time() + self.ttl
+            self.conn.executemany(
+                "UPDATE leases SET expires_at = ? WHERE key = ? AND owner = ?",
+                [(expires_at, key, owner) for key, owner in self.held],
+            )
+            self.conn.commit()
+
+    def _ensure_keeper(self):
+        if self._keeper is not None:
+            return
+        with self.lock:
+            if self._keeper is not None:
+                return
+
+            def run():
+                while True:
+                    time.sleep(self.ttl / 3)
+                    try:
+                        self.renew()
+                    except sqlite3.Error as e:
+                        print(f"Lease renewal failed: {e}")
+
+            self._keeper = threading.Thread(target=run, name="lease-keeper", daemon=True)
+            self._keeper.start()
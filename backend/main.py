@@ -1,20 +1,73 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict
-import uuid
-import json
 import asyncio
+import functools
+import json
+import math
+import os
+import uuid
+import time
+from starlette.background import BackgroundTask
 from chatbot_engine import (
-    chatbot,
+    get_checkpointer,
+    get_response_cache,
+    get_tool_payloads,
+    readiness,
     retrieve_all_threads,
-    checkpointer,
-    ChatState
+    conversation_version,
+    get_conversation_page,
+    search_messages,
+    stream_turn,
+    delete_thread as delete_thread_data,
+    delete_threads,
+    is_thread_deleted,
+    sweep_threads,
+    start_background_jobs,
+    warm_up,
 )
+from admission import CLIENT_ID_HEADER, client_limiter
+from batch import BATCH_MAX_CONCURRENCY, default_batch_id, parse_items, parse_jsonl, run_batch
+from leases import LeaseBusy
+from thread_catalog import ThreadDeleted
+from turn_runner import TurnRejected
+from turns import Subscription, ThreadQueueFull, turn_scheduler
+from sse import HEARTBEAT_FRAME, SSEEncoder, coalesce
+from metrics import Counter, Gauge, Histogram, render_metrics
+from retention import RetentionPolicy, compact
+from message_index import MAX_PAGE_SIZE, MAX_SEARCH_RESULTS, etag_matches, make_etag
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 
-app = FastAPI(title="Personal Assistant Chatbot API")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+BULK_DELETE_MAX_THREADS = 10000
+# Build the model, tools and graph at startup; 0 leaves them to the first request
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") == "1"
+
+startup = {"error": None}
+
+
+async def _warm_up():
+    try:
+        await asyncio.to_thread(warm_up)
+    except Exception as e:
+        startup["error"] = str(e)
+        print(f"Startup warm-up failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the server (and /healthz) is up meanwhile
+    if STARTUP_WARMUP:
+        startup["task"] = asyncio.create_task(_warm_up())
+    else:
+        start_background_jobs()
+    yield
+
+
+app = FastAPI(title="Personal Assistant Chatbot API", lifespan=lifespan)
 
 # CORS configuration
 app.add_middleware(
@@ -23,12 +76,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Read by the frontend to resume a dropped stream
+    expose_headers=["X-Turn-Id"],
 )
 
 # Pydantic models
 class Message(BaseModel):
     role: str
     content: str
+    seq: Optional[int] = None
+    created_at: Optional[float] = None
 
 class ChatRequest(BaseModel):
     message: str
@@ -41,168 +98,394 @@ class ChatResponse(BaseModel):
 class Thread(BaseModel):
     thread_id: str
     name: str
+    created_at: Optional[float] = None
+    last_activity: Optional[float] = None
+    message_count: int = 0
 
 class ThreadsResponse(BaseModel):
     threads: List[Thread]
+    next_cursor: Optional[str] = None
 
 class ConversationResponse(BaseModel):
     messages: List[Message]
+    has_more: bool = False
+
+class SearchResult(BaseModel):
+    thread_id: str
+    thread_name: str
+    seq: int
+    role: str
+    snippet: str
+    score: float
+    created_at: Optional[float] = None
+
+class SearchResponse(BaseModel):
+    results: List[SearchResult]
+    # True when SEARCH_CANDIDATES cut ranking short and older matches were not scored
+    truncated: bool = False
+
+class ResponseCacheSetting(BaseModel):
+    enabled: bool
 
 class DeleteThreadRequest(BaseModel):
     thread_id: str
 
+class BulkDeleteRequest(BaseModel):
+    thread_ids: List[str]
+
+class SweepRequest(BaseModel):
+    older_than_days: float
+
+class CompactRequest(BaseModel):
+    keep_latest: Optional[int] = None
+    tool_loop_max_age_hours: Optional[float] = None
+    vacuum: bool = True
+    full_vacuum: bool = False
+
 
 @app.get("/")
 async def root():
     return {"message": "Personal Assistant Chatbot API"}
 
 
+@app.get("/healthz")
+async def healthz():
+    """
+    Liveness: answers as soon as the process serves requests. `ready` turns
+    true once every lazily built component exists.
+    """
+    components = readiness()
+    return {
+        "status": "ok",
+        "ready": all(components.values()),
+        "components": components,
+        "error": startup["error"],
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of the backend metrics"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/threads", response_model=ThreadsResponse)
-async def get_threads():
-    """Get all conversation threads"""
+def get_threads(
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    order: str = Query("last_activity", pattern="^(last_activity|created_at)$"),
+    direction: str = Query("desc", pattern="^(asc|desc)$"),
+):
+    """Get one page of conversation threads from the thread catalog"""
     try:
-        threads_dict = retrieve_all_threads()
-        threads = [
-            Thread(thread_id=tid, name=name)
-            for tid, name in threads_dict.items()
-        ]
-        return ThreadsResponse(threads=threads)
+        threads, next_cursor = retrieve_all_threads(
+            limit=limit, cursor=cursor, order=order, direction=direction
+        )
+        return ThreadsResponse(
+            threads=[Thread(**thread) for thread in threads],
+            next_cursor=next_cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def generate_stream(message: str, thread_id: str):
-    """Generator function for streaming responses"""
+stream_ttft = Histogram(
+    "chat_stream_time_to_first_token_seconds",
+    "Time from request to the first content frame of /chat/stream",
+)
+stream_duration = Histogram(
+    "chat_stream_duration_seconds",
+    "Total time from request to the done or error frame of /chat/stream",
+    labelnames=("outcome",),
+)
+stream_frames = Counter(
+    "chat_stream_frames_total",
+    "SSE frames written by /chat/stream",
+    labelnames=("type",),
+)
+stream_delivery = Histogram(
+    "chat_stream_delivery_seconds",
+    "Per stream, total time spent handing content frames to the client",
+)
+active_streams = Gauge("chat_active_streams", "Open /chat/stream responses")
+stream_resumes = Counter(
+    "chat_stream_resumes_total",
+    "Reconnects to /chat/stream/resume by whether the turn could still be replayed",
+    labelnames=("outcome",),
+)
+
+
+async def generate_stream(thread_id: str, subscription: Subscription):
+    """
+    Generator function for streaming responses. Frame ids are
+    "<turn id>:<chunks sent>"; /chat/stream/resume continues after any of them.
+    """
+    encoder = SSEEncoder()
+    started = time.perf_counter()
+    first_token_at = None
+    delivery = 0.0
+    progress = {}
+
+    def frame_id():
+        return f"{subscription.turn.id}:{subscription.start + progress.get('chunks', 0)}"
+
+    active_streams.inc()
     try:
-        config = {'configurable': {'thread_id': thread_id}}
-        
-        # Get current state
-        state = chatbot.get_state(config=config)
-        messages = state.values.get('messages', []) if state.values else []
-        
-        # If this is the first message, set the thread name
-        if len(messages) == 0:
-            # Create a meaningful name from the first message
-            preview = message[:50] + "..." if len(message) > 50 else message
-            chatbot.update_state(
-                config={
-                    "configurable": {
-                        "thread_id": thread_id,
-                        "name": preview
-                    },
-                    "metadata": {
-                        "thread_id": thread_id
-                    },
-                    "run_name": "chat_turn",
-                },
-                values={"messages": []}
-            )
-        
-        # Stream the response
-        for message_chunk, metadata in chatbot.stream(
-            {"messages": [HumanMessage(content=message)]},
-            config=config,
-            stream_mode="messages",
-        ):
-            if isinstance(message_chunk, AIMessage) and message_chunk.content:
-                # Send each chunk as JSON
-                chunk_data = {
-                    "type": "content",
-                    "content": message_chunk.content
-                }
-                yield f"data: {json.dumps(chunk_data)}\n\n"
-                await asyncio.sleep(0.01)  # Small delay for smoother streaming
+        # The turn runs on a turn worker; chunks are coalesced before framing
+        async for content in coalesce(subscription.chunks(), progress=progress):
+            if content is None:
+                stream_frames.inc(type="heartbeat")
+                yield HEARTBEAT_FRAME
+                continue
+            # Time suspended here is time the server spends writing to the client
+            yielded_at = time.perf_counter()
+            if isinstance(content, dict):
+                # Tool and node progress, see stream_turn
+                stream_frames.inc(type=content["type"])
+                yield encoder.frame(content, event=content["type"], event_id=frame_id())
+            else:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    if not subscription.resumed:
+                        stream_ttft.observe(first_token_at - started)
+                stream_frames.inc(type="content")
+                yield encoder.frame({"type": "content", "content": content}, event_id=frame_id())
+            delivery += time.perf_counter() - yielded_at
         
         # Send completion signal
-        completion_data = {
-            "type": "done",
-            "thread_id": thread_id
-        }
-        yield f"data: {json.dumps(completion_data)}\n\n"
+        stream_frames.inc(type="done")
+        stream_duration.observe(time.perf_counter() - started, outcome="done")
+        yield encoder.frame({"type": "done", "thread_id": thread_id, **subscription.info}, event_id=frame_id())
         
+    except LeaseBusy as e:
+        stream_frames.inc(type="error")
+        stream_duration.observe(time.perf_counter() - started, outcome="busy")
+        yield encoder.frame(
+            {"type": "error", "error": str(e), "code": "thread_busy", **subscription.info}, event_id=frame_id()
+        )
+    except ThreadDeleted as e:
+        stream_frames.inc(type="error")
+        stream_duration.observe(time.perf_counter() - started, outcome="error")
+        yield encoder.frame(
+            {"type": "error", "error": str(e), "code": "thread_deleted", **subscription.info}, event_id=frame_id()
+        )
+    except TurnRejected as e:
+        stream_frames.inc(type="error")
+        stream_duration.observe(time.perf_counter() - started, outcome="busy")
+        yield encoder.frame(
+            {"type": "error", "error": str(e), "code": "server_busy", "retry_after": math.ceil(e.retry_after),
+             **subscription.info},
+            event_id=frame_id(),
+        )
     except Exception as e:
-        error_data = {
-            "type": "error",
-            "error": str(e)
-        }
-        yield f"data: {json.dumps(error_data)}\n\n"
+        stream_frames.inc(type="error")
+        stream_duration.observe(time.perf_counter() - started, outcome="error")
+        yield encoder.frame({"type": "error", "error": str(e), **subscription.info}, event_id=frame_id())
+    finally:
+        stream_delivery.observe(delivery)
+        active_streams.dec()
+        subscription.detach()
 
 
-@app.post("/chat/stream")
-async def chat_stream(request: ChatRequest):
-    """Send a message and get a streaming response"""
+def admit_client(request: Request) -> str:
+    """Identify the caller and spend one of its rate-limit tokens, or answer 429"""
+    client = request.headers.get(CLIENT_ID_HEADER) or (request.client.host if request.client else "")
+    retry_after = client_limiter.check(client)
+    if retry_after > 0:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many requests from '{client}'",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+    return client
+
+
+async def submit_turn(request: ChatRequest, client: str) -> Subscription:
+    """
+    Queue the turn behind others on its thread, or attach to an identical
+    one already queued or running
+    """
+    if await asyncio.to_thread(is_thread_deleted, request.thread_id):
+        raise HTTPException(status_code=410, detail="Thread has been deleted")
+    try:
+        return await turn_scheduler.submit(
+            request.thread_id, request.message, functools.partial(stream_turn, events=True), client=client
+        )
+    except ThreadQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except TurnRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+
+def stream_response(thread_id: str, subscription: Subscription) -> StreamingResponse:
     return StreamingResponse(
-        generate_stream(request.message, request.thread_id),
+        generate_stream(thread_id, subscription),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
+            "X-Accel-Buffering": "no",
+            "X-Turn-Id": subscription.turn.id,
+        },
+        # Detaches even if the client disconnects before the stream starts
+        background=BackgroundTask(subscription.detach),
     )
 
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, client: str = Depends(admit_client)):
+    """Send a message and get a streaming response"""
+    subscription = await submit_turn(request, client)
+    return stream_response(request.thread_id, subscription)
+
+
+@app.get("/chat/stream/resume")
+async def resume_chat_stream(
+    last_event_id: Optional[str] = Header(None),
+    last_event_id_param: Optional[str] = Query(None, alias="last_event_id"),
+):
+    """
+    Continue a /chat/stream response after the frame whose id is the
+    Last-Event-ID header (or `last_event_id`), or from the start with
+    "<X-Turn-Id>:0". Only replays what the turn produced; the model is
+    never called again. 404 once the turn has left the replay buffer.
+    """
+    turn_id, _, position = (last_event_id or last_event_id_param or "").partition(":")
+    if not position.isdigit():
+        raise HTTPException(status_code=400, detail="Last-Event-ID must be '<turn id>:<position>'")
+    subscription = turn_scheduler.resume(turn_id, int(position))
+    if subscription is None:
+        stream_resumes.inc(outcome="expired")
+        raise HTTPException(status_code=404, detail="Turn not found or no longer available for replay")
+    stream_resumes.inc(outcome="resumed")
+    return stream_response(subscription.turn.thread_id, subscription)
+
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, client: str = Depends(admit_client)):
     """Send a message and get a response (non-streaming fallback)"""
+    subscription = await submit_turn(request, client)
     try:
-        config = {'configurable': {'thread_id': request.thread_id}}
-        
-        # Get current state
-        state = chatbot.get_state(config=config)
-        messages = state.values.get('messages', []) if state.values else []
-        
-        # If this is the first message, set the thread name
-        if len(messages) == 0:
-            preview = request.message[:50] + "..." if len(request.message) > 50 else request.message
-            chatbot.update_state(
-                config={
-                    "configurable": {
-                        "thread_id": request.thread_id,
-                        "name": preview
-                    },
-                    "metadata": {
-                        "thread_id": request.thread_id
-                    },
-                    "run_name": "chat_turn",
-                },
-                values={"messages": []}
-            )
-        
-        # Stream the response
         full_response = ""
-        for message_chunk, metadata in chatbot.stream(
-            {"messages": [HumanMessage(content=request.message)]},
-            config=config,
-            stream_mode="messages",
-        ):
-            if isinstance(message_chunk, AIMessage):
-                full_response += message_chunk.content
+        async for content in subscription.chunks():
+            if isinstance(content, str):
+                full_response += content
         
         return ChatResponse(
             response=full_response,
             thread_id=request.thread_id
         )
+    except LeaseBusy as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": "1"})
+    except ThreadDeleted as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except TurnRejected as e:
+        # Queued behind another turn on the thread, then refused a worker slot
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        subscription.detach()
+
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/x-jsonlines")
+
+
+async def ndjson_lines(results):
+    async for result in results:
+        yield json.dumps(result, ensure_ascii=False) + "\n"
+
+
+@app.post("/chat/batch")
+async def chat_batch(
+    request: Request,
+    batch_id: Optional[str] = Query(None),
+    max_concurrency: int = Query(BATCH_MAX_CONCURRENCY, ge=1, le=64),
+    client: str = Depends(admit_client),
+):
+    """
+    Run many turns. The body is {"items": [...]} or a JSON list of
+    {message, thread_id?, id?} items, or the same items as NDJSON. Results
+    stream back as NDJSON as items finish; see batch.py for resuming.
+    """
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").split(";")[0].strip() in NDJSON_TYPES:
+            items = parse_jsonl(body.decode().splitlines())
+        else:
+            payload = json.loads(body)
+            items = parse_items(payload.get("items", []) if isinstance(payload, dict) else payload)
+    except ValueError as e:
+        # json.JSONDecodeError is a ValueError too
+        raise HTTPException(status_code=422, detail=str(e))
+    if not items:
+        raise HTTPException(status_code=422, detail="The batch has no items")
+    batch_id = batch_id or default_batch_id(items)
+    return StreamingResponse(
+        ndjson_lines(run_batch(items, batch_id, max_concurrency, client=client)),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-Id": batch_id, "Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/tool-payloads/{payload_id}")
+def get_tool_payload(payload_id: str):
+    """Full raw result of a tool call whose message only keeps the compact form"""
+    payload = get_tool_payloads().get(payload_id)
+    if payload is None or is_thread_deleted(payload["thread_id"]):
+        raise HTTPException(status_code=404, detail="Tool payload not found")
+    return payload
 
 
 @app.get("/conversation/{thread_id}", response_model=ConversationResponse)
-async def get_conversation(thread_id: str):
-    """Get all messages in a conversation thread"""
+def get_conversation(
+    thread_id: str,
+    response: Response,
+    before: Optional[int] = Query(None, ge=0),
+    after: Optional[int] = Query(None, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Get one page of messages in a conversation thread, oldest first.
+    Without a cursor this is the newest `limit` messages; pass the first
+    message's `seq` as `before` to page back, or a `seq` as `after` to fetch
+    what came later. `has_more` says whether the page could go further.
+    """
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="Pass either before or after, not both")
+    if is_thread_deleted(thread_id):
+        raise HTTPException(status_code=404, detail="Thread not found")
     try:
-        config = {'configurable': {'thread_id': thread_id}}
-        state = chatbot.get_state(config=config)
-        messages = state.values.get('messages', []) if state.values else []
-        
-        formatted_messages = []
-        for msg in messages:
-            if isinstance(msg, HumanMessage):
-                formatted_messages.append(Message(role='user', content=msg.content))
-            elif isinstance(msg, AIMessage):
-                formatted_messages.append(Message(role='assistant', content=msg.content))
-        
-        return ConversationResponse(messages=formatted_messages)
+        etag = make_etag(thread_id, conversation_version(thread_id), before, after, limit)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        messages, has_more = get_conversation_page(thread_id, before=before, after=after, limit=limit)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+        return ConversationResponse(
+            messages=[Message(**message) for message in messages],
+            has_more=has_more,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/search", response_model=SearchResponse)
+def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS),
+    thread_id: Optional[str] = None,
+):
+    """Full-text search over every conversation; best matches first"""
+    try:
+        results, truncated = search_messages(q, limit=limit, thread_id=thread_id)
+        return SearchResponse(results=[SearchResult(**result) for result in results], truncated=truncated)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -218,15 +501,79 @@ async def create_thread():
 
 
 @app.delete("/thread/{thread_id}")
-async def delete_thread(thread_id: str):
-    """Delete a conversation thread"""
+def delete_thread(thread_id: str):
+    """Delete a conversation thread; its data is purged in the background"""
     try:
-        checkpointer.delete_thread(thread_id)
+        delete_thread_data(thread_id)
         return {"message": "Thread deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/threads/bulk-delete")
+def bulk_delete_threads(request: BulkDeleteRequest):
+    """Delete many threads at once; their data is purged in the background"""
+    if len(request.thread_ids) > BULK_DELETE_MAX_THREADS:
+        raise HTTPException(status_code=422, detail=f"At most {BULK_DELETE_MAX_THREADS} threads per request")
+    try:
+        return {"deleted": delete_threads(request.thread_ids)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.put("/thread/{thread_id}/response-cache")
+def set_thread_response_cache(thread_id: str, setting: ResponseCacheSetting):
+    """Opt a thread in to or out of the response cache"""
+    try:
+        get_response_cache().set_thread_enabled(thread_id, setting.enabled)
+        return {"thread_id": thread_id, "enabled": setting.enabled}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints are open unless ADMIN_TOKEN is set"""
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.post("/admin/compact", dependencies=[Depends(require_admin)])
+def compact_checkpoints(request: Optional[CompactRequest] = None):
+    """Apply checkpoint retention now and report the bytes reclaimed"""
+    request = request or CompactRequest()
+    policy = RetentionPolicy()
+    if request.keep_latest is not None:
+        policy.keep_latest = request.keep_latest
+    if request.tool_loop_max_age_hours is not None:
+        policy.tool_loop_max_age = request.tool_loop_max_age_hours * 3600
+    try:
+        return compact(
+            get_checkpointer(), policy, vacuum=request.vacuum, full_vacuum=request.full_vacuum
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/admin/threads/sweep", dependencies=[Depends(require_admin)])
+def sweep_old_threads(request: SweepRequest):
+    """Delete every thread without activity for more than `older_than_days`"""
+    if request.older_than_days < 0:
+        raise HTTPException(status_code=422, detail="older_than_days must not be negative")
+    try:
+        return {"deleted": sweep_threads(request.older_than_days)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    from persistence import CHECKPOINT_BACKEND
+
+    # Worker processes share DATABASE_PATH; turns on one thread are
+    # serialized across them by thread leases (see leases.py)
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1 and CHECKPOINT_BACKEND == "memory":
+        raise SystemExit("CHECKPOINT_BACKEND=memory cannot be shared between workers")
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
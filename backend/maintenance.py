@@ -0,0 +1,442 @@
+"""
+Database maintenance commands.
+
+Run from the backend directory:
+
+    python maintenance.py backfill-names [--dry-run] [--all] [--restart]
+    python maintenance.py rebuild-search [--restart]
+    python maintenance.py train-dictionary [--threads N]
+    python maintenance.py migrate-checkpoints [--to compact|plain] [--restart]
+    python maintenance.py purge-threads [--older-than-days N]
+
+backfill-names names threads in the thread catalog after their first user
+message. It replaces the old fix_thread_names.py / fix_direct.py scripts,
+which walked threads one at a time and rewrote every checkpoint row:
+
+- the latest checkpoint of every thread comes from a single window query,
+  read in batches on a read-only connection
+- checkpoint blobs are decoded on a process pool
+- names go to the indexed thread_catalog table in one transaction per
+  batch; checkpoints are never rewritten
+- progress is saved after every batch, so an interrupted run picks up where
+  it stopped (--restart starts over); --dry-run only prints what would change
+
+By default only threads without a catalog name are touched; --all renames
+every thread.
+
+rebuild-search indexes every thread's messages for /conversation and
+/search the same way (batched window query, process pool, resumable),
+then rebuilds the FTS5 index.
+
+train-dictionary builds a compression dictionary from the messages of
+recent threads and stores it in serde_dictionaries; servers use it for
+new checkpoints after their next restart. migrate-checkpoints rewrites
+every checkpoint and pending write into the current format (compressed,
+messages in message_blobs, see serde.py), or back to plain JsonPlus rows
+with --to plain before a downgrade. It is resumable like the others.
+
+purge-threads runs the purge worker (purge.py) to completion: it removes
+the data of deleted threads, after soft-deleting threads idle for more
+than --older-than-days. Servers do the same in the background; this is for
+large cleanups or servers run with PURGE_INTERVAL_SECONDS=0.
+"""
+
+import argparse
+import random
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from context_window import content_text
+from leases import LeaseManager
+from persistence import DATABASE_PATH, CompactSqliteSaver, connect
+from purge import ThreadPurger
+from message_index import MessageIndex, project_messages
+from retention import database_size
+from serde import (
+    CHECKPOINT_COMPRESSION, CHECKPOINT_MESSAGE_BLOBS, SERDE_SCHEMA, CompressedSerializer, MessageBlobs,
+    save_dictionary, train_dictionary,
+)
+from thread_catalog import ThreadCatalog, checkpoint_id_time, make_thread_name
+
+PROGRESS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS maintenance_progress (
+    task TEXT PRIMARY KEY,
+    position TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+# ---- progress ----
+def load_progress(conn: sqlite3.Connection, task: str):
+    row = conn.execute("SELECT position FROM maintenance_progress WHERE task = ?", (task,)).fetchone()
+    return row[0] if row else None
+
+
+def save_progress(conn: sqlite3.Connection, task: str, position):
+    if position is None:
+        conn.execute("DELETE FROM maintenance_progress WHERE task = ?", (task,))
+    else:
+        conn.execute(
+            """INSERT INTO maintenance_progress (task, position, updated_at) VALUES (?, ?, ?)
+               ON CONFLICT(task) DO UPDATE SET position = excluded.position, updated_at = excluded.updated_at""",
+            (task, position, time.time()),
+        )
+    conn.commit()
+
+
+def chunksize(items, args) -> int:
+    return max(1, len(items) // (args.workers * 4))
+
+
+def report(done: int, total: int, started: float, unit: str = "threads", **counts):
+    rate = done / max(time.perf_counter() - started, 1e-9)
+    details = "  ".join(f"{key}={value}" for key, value in counts.items())
+    print(f"\r{done}/{total} {unit} ({rate:.0f}/s)  {details}", end="", file=sys.stderr, flush=True)
+
+
+def latest_checkpoints(reader: sqlite3.Connection, resume_after: str = "", join: str = "", where: str = ""):
+    """
+    (thread count, cursor) over the newest top-level checkpoint of every
+    thread after `resume_after`, in thread_id order. The cursor yields
+    (thread_id, first_checkpoint_id, checkpoint_id, type, blob) and is meant
+    to be read with fetchmany.
+    """
+    total = reader.execute(
+        f"""SELECT COUNT(DISTINCT k.thread_id) FROM checkpoints k {join}
+            WHERE k.checkpoint_ns = '' AND k.thread_id > ? {where}""",
+        (resume_after,),
+    ).fetchone()[0]
+    rows = reader.execute(
+        f"""SELECT thread_id, first_id, checkpoint_id, type, checkpoint FROM (
+                SELECT k.thread_id, k.checkpoint_id, k.type, k.checkpoint,
+                       MIN(k.checkpoint_id) OVER (PARTITION BY k.thread_id) AS first_id,
+                       ROW_NUMBER() OVER (PARTITION BY k.thread_id ORDER BY k.checkpoint_id DESC) AS rn
+                FROM checkpoints k {join}
+                WHERE k.checkpoint_ns = '' AND k.thread_id > ? {where}
+            )
+            WHERE rn = 1
+            ORDER BY thread_id""",
+        (resume_after,),
+    )
+    return total, rows
+
+
+_serde = None
+_reader = None
+
+
+def open_worker(database: str):
+    """Process pool initializer: a serializer and a reader for message blobs"""
+    global _serde, _reader
+    _reader = connect(database, readonly=True)
+    _serde = CompressedSerializer(_reader)
+
+
+def decode_messages(thread_id, type_, blob):
+    """Messages of a serialized checkpoint, old or compact format; runs in the process pool"""
+    checkpoint = MessageBlobs(_serde).resolve_messages(_reader.cursor(), thread_id, _serde.loads_typed((type_, blob)))
+    return checkpoint.get("channel_values", {}).get("messages", [])
+
+
+# ---- backfill-names ----
+def first_user_message_name(item):
+    """Worker: (thread_id, type, blob) -> (thread_id, name or None)"""
+    thread_id, type_, blob = item
+    try:
+        messages = decode_messages(thread_id, type_, blob)
+    except Exception:
+        return thread_id, None
+    for message in messages:
+        if getattr(message, "type", None) == "human":
+            content = content_text(message)
+            if content.strip():
+                return thread_id, make_thread_name(content)
+    return thread_id, None
+
+
+def backfill_names(args):
+    task = "backfill-names" + (":all" if args.all else "")
+    writer = connect(args.database)
+    writer.executescript(PROGRESS_SCHEMA)
+    catalog = ThreadCatalog(writer)
+    if args.restart:
+        save_progress(writer, task, None)
+    resume_after = load_progress(writer, task) or ""
+    if resume_after:
+        print(f"Resuming after thread {resume_after}", file=sys.stderr)
+
+    unnamed = "" if args.all else "AND (c.name IS NULL OR c.name = '')"
+    reader = connect(args.database, readonly=True)
+    total, rows = latest_checkpoints(
+        reader, resume_after, join="LEFT JOIN thread_catalog c ON c.thread_id = k.thread_id", where=unnamed
+    )
+
+    started = time.perf_counter()
+    done = named = unchanged = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=open_worker, initargs=(args.database,)) as pool:
+        while True:
+            batch = rows.fetchmany(args.batch_size)
+            if not batch:
+                break
+            times = {}
+            for thread_id, first_id, last_id, _, _ in batch:
+                try:
+                    times[thread_id] = (checkpoint_id_time(first_id), checkpoint_id_time(last_id))
+                except ValueError:
+                    times[thread_id] = (time.time(), time.time())
+            items = [(thread_id, type_, blob) for thread_id, _, _, type_, blob in batch]
+            entries = []
+            for thread_id, name in pool.map(first_user_message_name, items, chunksize=chunksize(items, args)):
+                if name is None:
+                    unchanged += 1
+                    continue
+                entries.append((thread_id, name, *times[thread_id]))
+            if not args.dry_run:
+                catalog.set_names(entries)
+                save_progress(writer, task, batch[-1][0])
+            named += len(entries)
+            done += len(batch)
+            report(done, total, started, named=named, unnamed=unchanged)
+            if args.dry_run and entries[: args.show]:
+                print(file=sys.stderr)
+                for thread_id, name, *_ in entries[: args.show]:
+                    print(f"  {thread_id}\t{name}")
+
+    print(file=sys.stderr)
+    if not args.dry_run:
+        save_progress(writer, task, None)
+    verb = "would name" if args.dry_run else "named"
+    print(f"{verb} {named} threads, {unchanged} without a user message, "
+          f"{time.perf_counter() - started:.1f}s")
+
+
+# ---- rebuild-search ----
+def projected_messages(item):
+    """Worker: (thread_id, type, blob) -> (thread_id, projected messages or None)"""
+    thread_id, type_, blob = item
+    try:
+        return thread_id, project_messages(decode_messages(thread_id, type_, blob))
+    except Exception:
+        return thread_id, None
+
+
+def rebuild_search(args):
+    """
+    Index every thread's messages into message_index (threads are otherwise
+    indexed lazily on their next turn or fetch), then rebuild the FTS index
+    from it.
+    """
+    task = "rebuild-search"
+    writer = connect(args.database)
+    writer.executescript(PROGRESS_SCHEMA)
+    index = MessageIndex(writer)
+    if args.restart:
+        save_progress(writer, task, None)
+    resume_after = load_progress(writer, task) or ""
+    if resume_after:
+        print(f"Resuming after thread {resume_after}", file=sys.stderr)
+
+    reader = connect(args.database, readonly=True)
+    total, rows = latest_checkpoints(reader, resume_after)
+    started = time.perf_counter()
+    done = messages = failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=open_worker, initargs=(args.database,)) as pool:
+        while True:
+            batch = rows.fetchmany(args.batch_size)
+            if not batch:
+                break
+            items = [(thread_id, type_, blob) for thread_id, _, _, type_, blob in batch]
+            for thread_id, projected in pool.map(projected_messages, items, chunksize=chunksize(items, args)):
+                if projected is None:
+                    failed += 1
+                    continue
+                # sync_projected only appends what the thread is missing
+                messages += index.sync_projected(thread_id, projected)
+            save_progress(writer, task, batch[-1][0])
+            done += len(batch)
+            report(done, total, started, messages=messages, undecodable=failed)
+
+    print(file=sys.stderr)
+    print("Rebuilding the full-text index...", file=sys.stderr)
+    index.rebuild_search()
+    save_progress(writer, task, None)
+    print(f"indexed {done} threads ({messages} messages, {failed} undecodable), "
+          f"{time.perf_counter() - started:.1f}s")
+
+
+# ---- train-dictionary ----
+def train(args):
+    """
+    Train a dictionary on the messages of up to --threads threads (thread
+    ids are random, so the first ones in id order are a fair sample) and
+    compare it with plain compression on a held-out tenth of them.
+    """
+    open_worker(args.database)
+    reader = connect(args.database, readonly=True)
+    _, rows = latest_checkpoints(reader)
+    samples = []
+    for thread_id, _, _, type_, blob in rows.fetchmany(args.threads):
+        try:
+            messages = decode_messages(thread_id, type_, blob)
+        except Exception:
+            continue
+        samples.extend(_serde.base.dumps_typed(message)[1] for message in messages)
+    if len(samples) < 20:
+        raise SystemExit(f"Only {len(samples)} messages found, not enough to train on")
+
+    random.Random(0).shuffle(samples)
+    held_out, training = samples[: len(samples) // 10], samples[len(samples) // 10:]
+    dictionary = train_dictionary(training, codec=args.codec, size=args.size)
+    plain = CompressedSerializer(codec=args.codec)
+    primed = CompressedSerializer(codec=args.codec)
+    primed.use_dictionary(0, dictionary)
+    raw = sum(len(sample) for sample in held_out)
+    without = sum(len(plain.compress("msgpack", sample)[1]) for sample in held_out)
+    with_dictionary = sum(len(primed.compress("msgpack", sample)[1]) for sample in held_out)
+    print(f"{len(training)} messages trained, {len(held_out)} held out ({raw} bytes): "
+          f"{without} bytes with {args.codec}, {with_dictionary} with the {len(dictionary)} byte dictionary")
+    if args.dry_run:
+        return
+    dict_id = save_dictionary(connect(args.database), args.codec, dictionary)
+    print(f"saved dictionary {dict_id}; servers use it for new checkpoints after a restart")
+
+
+# ---- migrate-checkpoints ----
+def migrate_checkpoints(args):
+    """Rewrite checkpoints and pending writes in place, batch by batch in rowid order"""
+    writer = connect(args.database)
+    writer.executescript(PROGRESS_SCHEMA)
+    writer.executescript(SERDE_SCHEMA)
+    compact = args.to == "compact"
+    serde = CompressedSerializer(writer, codec=CHECKPOINT_COMPRESSION if compact else "none")
+    blobs = MessageBlobs(serde)
+    store_blobs = compact and CHECKPOINT_MESSAGE_BLOBS
+    tables = (("checkpoints", "checkpoint"), ("writes", "value"))
+    if args.restart:
+        for table, _ in tables:
+            save_progress(writer, f"migrate-checkpoints:{table}", None)
+    bytes_before, _ = database_size(writer)
+
+    for table, column in tables:
+        task = f"migrate-checkpoints:{table}"
+        resume_after = int(load_progress(writer, task) or 0)
+        total = writer.execute(f"SELECT COUNT(*) FROM {table} WHERE rowid > ?", (resume_after,)).fetchone()[0]
+        started = time.perf_counter()
+        done = rewritten = 0
+        while True:
+            batch = writer.execute(
+                f"SELECT rowid, thread_id, type, {column} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (resume_after, args.batch_size),
+            ).fetchall()
+            if not batch:
+                break
+            cur = writer.cursor()
+            updates = []
+            for rowid, thread_id, type_, blob in batch:
+                if type_ is None:
+                    continue
+                value = serde.loads_typed((type_, blob))
+                if table == "checkpoints":
+                    value = blobs.resolve_messages(cur, thread_id, value)
+                    if store_blobs:
+                        value = blobs.store_messages(cur, thread_id, value)
+                new_type, new_blob = serde.dumps_typed(value)
+                if (new_type, new_blob) != (type_, blob):
+                    updates.append((new_type, new_blob, rowid))
+            cur.executemany(f"UPDATE {table} SET type = ?, {column} = ? WHERE rowid = ?", updates)
+            resume_after = batch[-1][0]
+            # Commits the batch and its progress together
+            save_progress(writer, task, str(resume_after))
+            done += len(batch)
+            rewritten += len(updates)
+            report(done, total, started, unit=table, rewritten=rewritten)
+        print(file=sys.stderr)
+        print(f"{table}: rewrote {rewritten} of {done} rows, {time.perf_counter() - started:.1f}s")
+
+    for table, _ in tables:
+        save_progress(writer, f"migrate-checkpoints:{table}", None)
+    if writer.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        # executescript steps the pragma to completion; execute() frees one page
+        writer.executescript("PRAGMA incremental_vacuum;")
+    bytes_after, free_bytes = database_size(writer)
+    print(f"database: {bytes_before} -> {bytes_after} bytes ({free_bytes} free; "
+          f"POST /admin/compact with full_vacuum returns free pages on older databases)")
+    if not compact:
+        print("message_blobs can be dropped once no server writes the compact format")
+
+
+# ---- purge-threads ----
+def purge_threads(args):
+    """Soft-delete old threads if asked, then purge every deleted thread"""
+    catalog = ThreadCatalog(connect(args.database))
+    purger = ThreadPurger(
+        CompactSqliteSaver(connect(args.database)), catalog,
+        leases=LeaseManager(connect(args.database)), conn=connect(args.database),
+        batch_size=args.batch_size,
+    )
+    if args.older_than_days is not None:
+        print(f"deleted {purger.sweep(args.older_than_days)} threads idle for over {args.older_than_days} days")
+    total = catalog.pending_purge_count()
+    started = time.perf_counter()
+    done = 0
+    while purged := purger.run_once():
+        done += purged
+        report(done, total, started)
+    print(file=sys.stderr)
+    left = catalog.pending_purge_count()
+    print(f"purged {done} threads" + (f", {left} still busy with a turn" if left else ""))
+
+
+# -------------------- CLI --------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Database maintenance for the chatbot backend")
+    parser.add_argument("--database", default=DATABASE_PATH, help="SQLite database (default: DATABASE_PATH)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    names = commands.add_parser("backfill-names", help="Name threads after their first user message")
+    names.add_argument("--all", action="store_true", help="rename threads that already have a name")
+    names.add_argument("--dry-run", action="store_true", help="print names without writing them")
+    names.add_argument("--show", type=int, default=20, help="names printed per batch in a dry run")
+    names.add_argument("--restart", action="store_true", help="ignore saved progress")
+    names.add_argument("--batch-size", type=int, default=500)
+    names.add_argument("--workers", type=int, default=4)
+    names.set_defaults(handler=backfill_names)
+
+    search = commands.add_parser("rebuild-search", help="Index all messages and rebuild the search index")
+    search.add_argument("--restart", action="store_true", help="ignore saved progress")
+    search.add_argument("--batch-size", type=int, default=500)
+    search.add_argument("--workers", type=int, default=4)
+    search.set_defaults(handler=rebuild_search)
+
+    dictionary = commands.add_parser("train-dictionary", help="Train a checkpoint compression dictionary")
+    dictionary.add_argument("--threads", type=int, default=2000, help="threads to sample messages from")
+    dictionary.add_argument("--codec", choices=("zlib", "zstd"), default=CHECKPOINT_COMPRESSION
+                            if CHECKPOINT_COMPRESSION != "none" else "zlib")
+    dictionary.add_argument("--size", type=int, default=32 * 1024, help="dictionary size in bytes")
+    dictionary.add_argument("--dry-run", action="store_true", help="report the gain without saving")
+    dictionary.set_defaults(handler=train)
+
+    migrate = commands.add_parser("migrate-checkpoints", help="Rewrite checkpoints in the current format")
+    migrate.add_argument("--to", choices=("compact", "plain"), default="compact",
+                         help="plain writes uncompressed rows with inline messages, for downgrades")
+    migrate.add_argument("--restart", action="store_true", help="ignore saved progress")
+    migrate.add_argument("--batch-size", type=int, default=200)
+    migrate.set_defaults(handler=migrate_checkpoints)
+
+    purge = commands.add_parser("purge-threads", help="Purge deleted threads now")
+    purge.add_argument("--older-than-days", type=float, help="first delete threads idle for this long")
+    purge.add_argument("--batch-size", type=int, default=500, help="rows per delete transaction")
+    purge.set_defaults(handler=purge_threads)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+Per-thread message index for the conversation view.
+
+/conversation only shows user and assistant text, so that projection is
+written to its own table when a turn finishes. Each row holds the message's
+offset (`seq`) in the projected conversation, its role, content and the time
+it was indexed. Pages are then plain range queries on (thread_id, seq) and
+never deserialize a checkpoint.
+
+`conversation_versions` records how many messages each thread has indexed.
+That count serves two purposes: it marks a thread as indexed, and it is the
+version behind the endpoint's ETag.
+
+`message_fts` is an external-content FTS5 index over message_index.content
+for /search. Triggers keep it in step with message_index, so every indexed
+turn is searchable as soon as it finishes.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from context_window import content_text
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS message_index (
+    id INTEGER PRIMARY KEY,
+    thread_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    message_id TEXT,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (thread_id, seq)
+);
+CREATE TABLE IF NOT EXISTS conversation_versions (
+    thread_id TEXT PRIMARY KEY,
+    message_total INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(
+    content, content='message_index', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS message_index_fts_insert AFTER INSERT ON message_index BEGIN
+    INSERT INTO message_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS message_index_fts_delete AFTER DELETE ON message_index BEGIN
+    INSERT INTO message_fts (message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS message_index_fts_update AFTER UPDATE ON message_index BEGIN
+    INSERT INTO message_fts (message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    INSERT INTO message_fts (rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+MAX_PAGE_SIZE = 500
+MAX_SEARCH_RESULTS = 100
+# 0 ranks every match; otherwise only the newest SEARCH_CANDIDATES are ranked
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "0"))
+
+# Leaves out the messages of threads passed as a JSON array, before ranking
+_EXCLUDE_THREADS = """ AND message_fts.rowid NOT IN (
+    SELECT id FROM message_index WHERE thread_id IN (SELECT value FROM json_each(?)))"""
+
+_SEARCH_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def project_messages(messages):
+    """(message_id, role, content) for every message the conversation view shows"""
+    projected = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            role = "user"
+        elif isinstance(message, AIMessage):
+            role = "assistant"
+        else:
+            continue
+        content = content_text(message)
+        if content:
+            projected.append((message.id, role, content))
+    return projected
+
+
+def fts_query(text: str) -> str:
+    """
+    Turn free text into an FTS5 query: every word must match, the last one
+    as a prefix so results update while the user is typing. Words are quoted
+    so FTS5 operators in the input are searched for literally.
+    """
+    terms = _SEARCH_TERM.findall(text)
+    if not terms:
+        raise ValueError("Search query has no searchable words")
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def make_etag(thread_id: str, version: int, *page) -> str:
+    digest = hashlib.sha1(repr((thread_id, version, page)).encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class MessageIndex:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.executescript(INDEX_SCHEMA)
+            has_search = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'message_fts'"
+            ).fetchone()
+            self.conn.executescript(SEARCH_SCHEMA)
+            if not has_search:
+                # Messages indexed before search existed
+                self.conn.execute("INSERT INTO message_fts (message_fts) VALUES ('rebuild')")
+            self.conn.commit()
+
+    def version(self, thread_id: str):
+        """Number of indexed messages, or None if the thread was never indexed"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT message_total FROM conversation_versions WHERE thread_id = ?", (thread_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def sync(self, thread_id: str, messages) -> int:
+        """Append any messages not yet indexed; history is append-only"""
+        return self.sync_projected(thread_id, project_messages(messages))
+
+    def sync_projected(self, thread_id: str, projected) -> int:
+        """sync() for messages already run through project_messages"""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT message_total FROM conversation_versions WHERE thread_id = ?", (thread_id,)
+            ).fetchone()
+            indexed = row[0] if row else 0
+            if row is not None and indexed == len(projected):
+                return indexed
+            # An upsert rather than INSERT OR REPLACE: REPLACE deletes the old
+            # row without firing the FTS delete trigger
+            self.conn.executemany(
+                """INSERT INTO message_index
+                   (thread_id, seq, message_id, role, content, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(thread_id, seq) DO UPDATE SET
+                       message_id = excluded.message_id,
+                       role = excluded.role,
+                       content = excluded.content,
+                       created_at = excluded.created_at""",
+                [
+                    (thread_id, seq, message_id, role, content, now)
+                    for seq, (message_id, role, content) in enumerate(projected[indexed:], start=indexed)
+                ],
+            )
+            self.conn.execute(
+                """INSERT INTO conversation_versions (thread_id, message_total, updated_at)
+                   VALUES (?, ?, ?)
+                   ON CONFLICT(thread_id) DO UPDATE SET
+                       message_total = excluded.message_total,
+                       updated_at = excluded.updated_at""",
+                (thread_id, len(projected), now),
+            )
+            self.conn.commit()
+        return len(projected)
+
+    def page(self, thread_id: str, before=None, after=None, limit: int = 100):
+        """
+        Messages in ascending seq order plus whether more exist beyond the page.
+        With `after` the page walks forward from that seq; otherwise it ends
+        just before `before` (or at the newest message).
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        if after is not None:
+            query = """SELECT seq, role, content, created_at FROM message_index
+                       WHERE thread_id = ? AND seq > ? ORDER BY seq ASC LIMIT ?"""
+            params = (thread_id, after, limit + 1)
+        else:
+            query = """SELECT seq, role, content, created_at FROM message_index
+                       WHERE thread_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?"""
+            params = (thread_id, before if before is not None else 2 ** 62, limit + 1)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if after is None:
+            rows.reverse()
+        messages = [
+            {"seq": seq, "role": role, "content": content, "created_at": created_at}
+            for seq, role, content, created_at in rows
+        ]
+        return messages, has_more
+
+    def search(self, text: str, limit: int = 20, thread_id: str = None, candidates: int = SEARCH_CANDIDATES,
+               exclude=()):
+        """
+        Best-matching messages for `text`, with highlighted snippets, and
+        whether ranking was cut short. Every match is ranked by bm25 before
+        the limit applies; at a few hundred thousand messages that is
+        ~10ms for most queries and up to ~100ms for a word in every few
+        messages. With `candidates`, searches across all threads rank only
+        the newest that many matches instead, and report truncated=True
+        when there were more. Messages of the threads in `exclude` (deleted
+        ones waiting for the purge) are never matched.
+        """
+        limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+        match = fts_query(text)
+        exclude = sorted(set(exclude))
+        excluding = _EXCLUDE_THREADS if exclude else ""
+        excluded = (json.dumps(exclude),) if exclude else ()
+        truncated = False
+        if thread_id is None and candidates > 0:
+            query = f"""SELECT m.thread_id, m.seq, m.role, m.created_at, c.snippet, c.score
+                        FROM (SELECT rowid, bm25(message_fts) AS score,
+                                     snippet(message_fts, 0, '[', ']', '...', 16) AS snippet
+                              FROM message_fts WHERE message_fts MATCH ?{excluding}
+                              ORDER BY rowid DESC LIMIT ?) c
+                        JOIN message_index m ON m.id = c.rowid
+                        ORDER BY c.score"""
+            # One extra candidate tells whether any were left out
+            params = (match, *excluded, max(candidates, limit) + 1)
+        elif thread_id is None:
+            query = f"""SELECT m.thread_id, m.seq, m.role, m.created_at,
+                               snippet(message_fts, 0, '[', ']', '...', 16), bm25(message_fts)
+                        FROM message_fts JOIN message_index m ON m.id = message_fts.rowid
+                        WHERE message_fts MATCH ?{excluding}
+                        ORDER BY 6
+                        LIMIT ?"""
+            params = (match, *excluded, limit)
+        elif thread_id in exclude:
+            return [], False
+        else:
+            # Bounding rowid to the thread's id range lets FTS5 skip the
+            # doclists of every other thread
+            query = """SELECT m.thread_id, m.seq, m.role, m.created_at,
+                              snippet(message_fts, 0, '[', ']', '...', 16), bm25(message_fts)
+                       FROM message_fts JOIN message_index m ON m.id = message_fts.rowid
+                       WHERE message_fts MATCH ? AND message_fts.rowid BETWEEN ? AND ?
+                             AND m.thread_id = ?
+                       ORDER BY 6
+                       LIMIT ?"""
+        with self.lock:
+            if thread_id is not None:
+                low, high = self.conn.execute(
+                    "SELECT MIN(id), MAX(id) FROM message_index WHERE thread_id = ?", (thread_id,)
+                ).fetchone()
+                if low is None:
+                    return [], False
+                params = (match, low, high, thread_id, limit)
+            rows = self.conn.execute(query, params).fetchall()
+        if thread_id is None and candidates > 0:
+            if len(rows) > max(candidates, limit):
+                truncated = True
+                # Drop the worst-scoring row rather than the extra candidate
+                rows = rows[:-1]
+            rows = rows[:limit]
+        results = [
+            {
+                "thread_id": thread_id,
+                "seq": seq,
+                "role": role,
+                "created_at": created_at,
+                "snippet": snippet,
+                # bm25() is lower-is-better; flip it so higher means more relevant
+                "score": -score,
+            }
+            for thread_id, seq, role, created_at, snippet, score in rows
+        ]
+        return results, truncated
+
+    def rebuild_search(self):
+        """Rebuild the FTS index from message_index"""
+        with self.lock:
+            self.conn.execute("INSERT INTO message_fts (message_fts) VALUES ('rebuild')")
+            self.conn.execute("INSERT INTO message_fts (message_fts) VALUES ('optimize')")
+            self.conn.commit()
+
+    def delete(self, thread_id: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM message_index WHERE thread_id = ?", (thread_id,))
+            self.conn.execute("DELETE FROM conversation_versions WHERE thread_id = ?", (thread_id,))
+            self.conn.commit()
@@ -0,0 +1,259 @@
+"""
+Checkpoint persistence backends.
+
+CHECKPOINT_BACKEND selects how the graph stores its checkpoints:
+
+- pooled (default): one writer connection guarded by a lock plus a bounded
+  pool of read-only connections, so readers never queue behind writes
+- sqlite: the original single shared SqliteSaver connection
+- memory: in-process MemorySaver, for benchmarks and throwaway runs
+
+All SQLite connections run in WAL mode with the pragmas below, and a
+background thread periodically checkpoints chatbot.db-wal back into the
+main database so the WAL file does not grow without bound. The SQLite
+backends store checkpoints compactly: compressed, with messages kept once
+per thread in message_blobs (see serde.py).
+"""
+
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from langgraph.checkpoint.base import CheckpointTuple
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.sqlite.utils import search_where
+
+from serde import CHECKPOINT_MESSAGE_BLOBS, SERDE_SCHEMA, CompressedSerializer, MessageBlobs, has_message_refs
+
+DATABASE_PATH = os.getenv("DATABASE_PATH", "chatbot.db")
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "pooled")
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+WAL_CHECKPOINT_SECONDS = float(os.getenv("WAL_CHECKPOINT_SECONDS", "60"))
+WAL_CHECKPOINT_MODE = os.getenv("WAL_CHECKPOINT_MODE", "TRUNCATE")
+
+BACKENDS = ("pooled", "sqlite", "memory")
+_SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+_WAL_CHECKPOINT_MODES = ("PASSIVE", "FULL", "RESTART", "TRUNCATE")
+
+
+def connect(path: str = DATABASE_PATH, readonly: bool = False) -> sqlite3.Connection:
+    """Open a SQLite connection with the backend's WAL and cache settings"""
+    if SQLITE_SYNCHRONOUS.upper() not in _SYNCHRONOUS_MODES:
+        raise ValueError(f"Unsupported SQLITE_SYNCHRONOUS '{SQLITE_SYNCHRONOUS}'")
+    conn = sqlite3.connect(
+        database=path,
+        check_same_thread=False,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+    )
+    if not readonly:
+        # Only takes effect on new databases; see retention.incremental_vacuum
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS.upper()}")
+    # Negative cache_size is in KiB rather than pages
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    if readonly:
+        conn.execute("PRAGMA query_only=1")
+    return conn
+
+
+class CompactSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver that stores a checkpoint's messages as per-thread blobs and
+    the checkpoint itself with only their hashes. Checkpoints written
+    before, or with message_blobs=False, are read as they are.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, *, serde=None, message_blobs: bool = CHECKPOINT_MESSAGE_BLOBS):
+        super().__init__(conn, serde=serde)
+        self.blobs = MessageBlobs(self.serde)
+        self.message_blobs = message_blobs
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.executescript(SERDE_SCHEMA)
+
+    def _resolve(self, saved):
+        if saved is None or not has_message_refs(saved.checkpoint):
+            return saved
+        thread_id = saved.config["configurable"]["thread_id"]
+        with self.cursor(transaction=False) as cur:
+            return saved._replace(checkpoint=self.blobs.resolve_messages(cur, thread_id, saved.checkpoint))
+
+    def get_tuple(self, config):
+        return self._resolve(super().get_tuple(config))
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        # Materialized first: the parent holds its cursor (and, for the
+        # plain saver, the lock) while it yields
+        for saved in list(super().list(config, filter=filter, before=before, limit=limit)):
+            yield self._resolve(saved)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        if self.message_blobs:
+            # Blobs are committed first, so a checkpoint never refers to a missing one
+            with self.cursor() as cur:
+                checkpoint = self.blobs.store_messages(cur, str(config["configurable"]["thread_id"]), checkpoint)
+        return super().put(config, checkpoint, metadata, new_versions)
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM message_blobs WHERE thread_id = ?", (str(thread_id),))
+
+
+class PooledSqliteSaver(CompactSqliteSaver):
+    """
+    SqliteSaver with a single writer and a pool of readers.
+
+    Writes (put, put_writes, delete_thread) keep SqliteSaver's lock around
+    the shared writer connection. Reads (get_tuple, list) take a connection
+    from the reader pool instead, which WAL lets proceed alongside an
+    in-progress write.
+    The async methods run the sync ones on a worker thread so the saver can
+    also back `astream`/`ainvoke`.
+    """
+
+    def __init__(self, path: str = DATABASE_PATH, *, pool_size: int = SQLITE_READ_POOL_SIZE, serde=None,
+                 message_blobs: bool = CHECKPOINT_MESSAGE_BLOBS):
+        super().__init__(connect(path), serde=serde, message_blobs=message_blobs)
+        self.path = path
+        self.pool_size = pool_size
+        self.readers = queue.Queue()
+        self.opened_readers = 0
+        self.pool_lock = threading.Lock()
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        with self.pool_lock:
+            super().setup()
+
+    @contextmanager
+    def reader(self):
+        self.setup()
+        try:
+            conn = self.readers.get_nowait()
+        except queue.Empty:
+            with self.pool_lock:
+                can_open = self.opened_readers < self.pool_size
+                if can_open:
+                    self.opened_readers += 1
+            conn = connect(self.path, readonly=True) if can_open else self.readers.get()
+        try:
+            yield conn
+        finally:
+            self.readers.put(conn)
+
+    @contextmanager
+    def cursor(self, transaction: bool = True):
+        if transaction:
+            with super().cursor(transaction=True) as cur:
+                yield cur
+            return
+        with self.reader() as conn:
+            cur = conn.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        # SqliteSaver.list reads pending writes through the writer
+        # connection without its lock; here both queries use one reader
+        where, params = search_where(config, filter, before)
+        query = f"""SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata
+                    FROM checkpoints {where} ORDER BY checkpoint_id DESC"""
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        saved = []
+        with self.reader() as conn:
+            for thread_id, ns, checkpoint_id, parent_id, type_, checkpoint, metadata in conn.execute(query, params):
+                writes = conn.execute(
+                    """SELECT task_id, channel, type, value FROM writes
+                       WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx""",
+                    (thread_id, ns, checkpoint_id),
+                ).fetchall()
+                saved.append(CheckpointTuple(
+                    {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id}},
+                    self.serde.loads_typed((type_, checkpoint)),
+                    self.jsonplus_serde.loads(metadata) if metadata is not None else {},
+                    {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": parent_id}}
+                    if parent_id else None,
+                    [(task_id, channel, self.serde.loads_typed((kind, value))) for task_id, channel, kind, value in writes],
+                ))
+        for item in saved:
+            yield self._resolve(item)
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    def close(self):
+        while True:
+            try:
+                self.readers.get_nowait().close()
+            except queue.Empty:
+                break
+        self.conn.close()
+
+
+def wal_checkpoint(saver: SqliteSaver, mode: str = WAL_CHECKPOINT_MODE):
+    """Fold the WAL back into the database file; returns (busy, wal_pages, moved_pages)"""
+    if mode.upper() not in _WAL_CHECKPOINT_MODES:
+        raise ValueError(f"Unsupported WAL checkpoint mode '{mode}'")
+    with saver.lock:
+        return saver.conn.execute(f"PRAGMA wal_checkpoint({mode.upper()})").fetchone()
+
+
+def start_wal_checkpointer(saver: SqliteSaver, interval: float = WAL_CHECKPOINT_SECONDS):
+    """Run wal_checkpoint every `interval` seconds on a daemon thread"""
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            try:
+                wal_checkpoint(saver)
+            except sqlite3.Error as e:
+                print(f"WAL checkpoint failed: {e}")
+
+    if interval > 0:
+        threading.Thread(target=run, name="wal-checkpoint", daemon=True).start()
+    return stop
+
+
+def create_checkpointer(backend: str = CHECKPOINT_BACKEND, path: str = DATABASE_PATH):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported CHECKPOINT_BACKEND '{backend}', expected one of {BACKENDS}")
+    if backend == "memory":
+        return MemorySaver()
+    serde = CompressedSerializer(connect(path))
+    if backend == "pooled":
+        saver = PooledSqliteSaver(path, serde=serde)
+    else:
+        saver = CompactSqliteSaver(connect(path), serde=serde)
+    start_wal_checkpointer(saver)
+    return saver
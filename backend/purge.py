@@ -0,0 +1,163 @@
+"""
+Background purge of deleted threads.
+
+Deleting a thread only marks it in the thread catalog (see
+ThreadCatalog.mark_deleted), which is one indexed upsert however large the
+thread is. This worker then removes the thread's rows table by table in
+chunks of PURGE_BATCH_SIZE, each chunk its own short transaction with a
+PURGE_BATCH_PAUSE_MS pause after it, so requests and turns interleave with
+a purge of thousands of threads instead of queuing behind it:
+
+- checkpoints, pending writes and message blobs, through the checkpoint
+  saver's connection and lock like retention.compact
+- the message index (and with it the search index), tool payloads, batch
+  results and the thread's response-cache setting
+- finally the catalog row, which marks the thread as purged
+
+A thread is purged under its thread lease, so it never races a turn, and
+one purge at a time per thread across worker processes. The worker wakes
+up when threads are deleted and otherwise every PURGE_INTERVAL_SECONDS,
+when it also soft-deletes threads idle for more than THREAD_MAX_AGE_DAYS
+(0 = never).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import Counter, Gauge
+from persistence import connect
+
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "200"))
+PURGE_BATCH_PAUSE_MS = float(os.getenv("PURGE_BATCH_PAUSE_MS", "5"))
+PURGE_INTERVAL_SECONDS = float(os.getenv("PURGE_INTERVAL_SECONDS", "60"))
+THREAD_MAX_AGE_DAYS = float(os.getenv("THREAD_MAX_AGE_DAYS", "0"))
+
+# Owned by the checkpoint saver, in delete order
+CHECKPOINT_TABLES = ("writes", "checkpoints", "message_blobs")
+# Everything else keyed by thread_id; tables that do not exist yet are skipped
+THREAD_TABLES = (
+    "message_index", "conversation_versions", "tool_payloads", "batch_items", "response_cache_opt_out",
+)
+
+purged_rows = Counter(
+    "thread_purge_rows_total",
+    "Rows removed by the thread purge worker",
+    labelnames=("table",),
+)
+purged_threads = Counter("threads_purged_total", "Deleted threads whose data has been purged")
+pending_threads = Gauge("threads_pending_purge", "Deleted threads still waiting to be purged")
+
+
+def delete_in_batches(conn: sqlite3.Connection, lock, table: str, thread_id: str,
+                      batch_size: int = PURGE_BATCH_SIZE, pause: float = PURGE_BATCH_PAUSE_MS / 1000) -> int:
+    """Delete a thread's rows from `table`, one short transaction per batch"""
+    deleted = 0
+    while True:
+        with lock:
+            cursor = conn.execute(
+                f"""DELETE FROM {table} WHERE rowid IN (
+                        SELECT rowid FROM {table} WHERE thread_id = ? LIMIT ?)""",
+                (thread_id, batch_size),
+            )
+            conn.commit()
+        deleted += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            break
+        if pause > 0:
+            time.sleep(pause)
+    if deleted:
+        purged_rows.inc(deleted, table=table)
+    return deleted
+
+
+def existing_tables(conn: sqlite3.Connection, lock, tables) -> list:
+    with lock:
+        found = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return [table for table in tables if table in found]
+
+
+class ThreadPurger:
+    def __init__(self, saver, catalog, leases=None, conn: sqlite3.Connection = None,
+                 batch_size: int = PURGE_BATCH_SIZE, pause: float = PURGE_BATCH_PAUSE_MS / 1000,
+                 interval: float = PURGE_INTERVAL_SECONDS, max_age_days: float = THREAD_MAX_AGE_DAYS):
+        self.saver = saver
+        self.catalog = catalog
+        self.leases = leases
+        self.conn = conn if conn is not None else connect()
+        self.lock = threading.Lock()
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self.max_age_days = max_age_days
+        self.wakeup = threading.Event()
+        self.stop = threading.Event()
+        self.thread = None
+
+    def wake(self):
+        self.wakeup.set()
+
+    def sweep(self, older_than_days: float) -> int:
+        """Soft-delete threads idle for more than `older_than_days`; returns how many"""
+        count = self.catalog.mark_inactive_deleted(time.time() - older_than_days * 86400)
+        if count:
+            self.wake()
+        return count
+
+    def purge_thread(self, thread_id: str) -> dict:
+        """Remove every row of one deleted thread, the catalog row last"""
+        removed = {}
+        if hasattr(self.saver, "conn"):
+            self.saver.setup()
+            for table in existing_tables(self.saver.conn, self.saver.lock, CHECKPOINT_TABLES):
+                removed[table] = delete_in_batches(
+                    self.saver.conn, self.saver.lock, table, thread_id, self.batch_size, self.pause
+                )
+        else:
+            # In-memory checkpoints: nothing to chunk
+            self.saver.delete_thread(thread_id)
+        for table in existing_tables(self.conn, self.lock, THREAD_TABLES):
+            removed[table] = delete_in_batches(self.conn, self.lock, table, thread_id, self.batch_size, self.pause)
+        self.catalog.delete(thread_id)
+        purged_threads.inc()
+        return removed
+
+    def run_once(self, limit: int = 100) -> int:
+        """Purge up to `limit` deleted threads; returns how many were purged"""
+        purged = 0
+        pending_threads.set(self.catalog.pending_purge_count())
+        for thread_id in self.catalog.pending_purge(limit):
+            lease = None
+            if self.leases is not None:
+                # A turn still holds the thread (it will fail on the deleted check); next round
+                lease = self.leases.try_acquire(f"thread:{thread_id}")
+                if lease is None:
+                    continue
+            try:
+                self.purge_thread(thread_id)
+                purged += 1
+            finally:
+                if lease is not None:
+                    lease.release()
+        pending_threads.set(self.catalog.pending_purge_count())
+        return purged
+
+    def _run(self):
+        while not self.stop.is_set():
+            try:
+                if self.max_age_days > 0:
+                    self.sweep(self.max_age_days)
+                # Keep going while whole rounds get purged
+                while self.run_once() and not self.stop.is_set():
+                    pass
+            except Exception as e:
+                print(f"Thread purge failed: {e}")
+            self.wakeup.wait(self.interval if self.interval > 0 else None)
+            self.wakeup.clear()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="thread-purger", daemon=True)
+            self.thread.start()
+        return self.stop
@@ -0,0 +1,296 @@
+"""
+Response cache in front of the chat graph.
+
+Many users ask the same questions ("latest AI news", "price of AAPL"), and
+each one costs a full Gemini round trip. When RESPONSE_CACHE_ENABLED=1 a
+finished turn's final answer is cached and later turns are answered from it:
+
+- the exact tier is keyed on the normalized prompt plus the last
+  RESPONSE_CACHE_CONTEXT_MESSAGES user/assistant messages before it
+- the similarity tier embeds the prompt with a hashing vectorizer (word
+  unigrams and bigrams, no model needed) and searches a NumPy matrix for the
+  nearest cached prompt with the same context, accepting it at cosine
+  similarity >= RESPONSE_CACHE_SIMILARITY and only when both prompts have
+  the same key terms (numbers, tickers, names: every word outside
+  COMMON_WORDS), so "price of MSFT" never gets the answer about AAPL.
+  Answers that used tools are entity-specific and time-sensitive; they are
+  only served to the exact same prompt
+- answers expire after RESPONSE_CACHE_TTL_SECONDS, or the shorter
+  RESPONSE_CACHE_TOOL_TTL_SECONDS when the turn called tools (quotes and
+  searches go stale fast)
+- at most RESPONSE_CACHE_MAX_ENTRIES are kept; the least recently used
+  entry is evicted first
+- threads can opt out; the opt-outs are stored in SQLite
+- every answer remembers the thread it came from. Deleting a thread drops
+  its answers from this process right away, and a hit is only served while
+  its thread is still live (`live`), which covers threads deleted through
+  another worker and threads already purged
+
+The cache lives in process memory, so each worker warms its own.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from metrics import Counter, Gauge
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "0") == "1"
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "600"))
+RESPONSE_CACHE_TOOL_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TOOL_TTL_SECONDS", "60"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.9"))
+RESPONSE_CACHE_CONTEXT_MESSAGES = int(os.getenv("RESPONSE_CACHE_CONTEXT_MESSAGES", "2"))
+RESPONSE_CACHE_DIMENSIONS = int(os.getenv("RESPONSE_CACHE_DIMENSIONS", "2048"))
+
+cache_requests = Counter(
+    "response_cache_requests_total",
+    "Response cache lookups by result (exact, similar, miss, bypass)",
+    labelnames=("result",),
+)
+latency_saved = Counter(
+    "response_cache_latency_saved_seconds_total",
+    "Model time avoided by answering from the response cache",
+)
+hit_ratio = Gauge("response_cache_hit_ratio", "Share of response cache lookups that hit")
+cache_entries = Gauge("response_cache_entries", "Answers held in the response cache")
+
+OPT_OUT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS response_cache_opt_out (
+    thread_id TEXT PRIMARY KEY
+);
+"""
+
+_WORD = re.compile(r"[a-z0-9$%.]+")
+
+# Filler and question words: a near-match may differ in these and nothing else
+COMMON_WORDS = frozenset("""
+    a about after again all also am an and any anything are as at be been before but by can could
+    current currently did do does doing for from get give go got had has have hello help hey hi how
+    i if in into is it its just know latest let like me more most much my need new now of on or
+    our please pls quick quickly recent recently right say says show so some something tell than
+    thank thanks that the their them then there these they this those to today up us very want
+    was we were what whats when where which who whom whose why will with would you your
+""".split())
+
+
+def normalize_prompt(text: str) -> str:
+    return " ".join(text.lower().split()).rstrip("?!. ")
+
+
+def context_key(context) -> str:
+    """The recent (role, content) pairs a cached answer is only valid after"""
+    return "\n".join(f"{role}:{normalize_prompt(content)}" for role, content in context)
+
+
+def embed(text: str, dimensions: int = RESPONSE_CACHE_DIMENSIONS) -> np.ndarray:
+    """L2-normalized signed hashing vector over word unigrams and bigrams"""
+    words = [word.strip(".") for word in _WORD.findall(text.lower())]
+    words = [word for word in words if word]
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature in features:
+        digest = zlib.crc32(feature.encode())
+        vector[digest % dimensions] += 1.0 if digest & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def key_terms(text: str) -> frozenset:
+    """The words of a prompt that name what it is about: numbers and anything uncommon"""
+    words = (word.strip(".") for word in _WORD.findall(text.lower()))
+    return frozenset(
+        word for word in words
+        if any(char.isdigit() for char in word) or (len(word) > 1 and word not in COMMON_WORDS)
+    )
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    kind: str  # "exact" or "similar"
+    similarity: float
+    saved_seconds: float
+    thread_id: str = None
+
+
+@dataclass
+class _Entry:
+    slot: int
+    context: str
+    answer: str
+    expires_at: float
+    cost_seconds: float
+    terms: frozenset
+    used_tools: bool
+    thread_id: str
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        enabled: bool = RESPONSE_CACHE_ENABLED,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        similarity: float = RESPONSE_CACHE_SIMILARITY,
+        dimensions: int = RESPONSE_CACHE_DIMENSIONS,
+    ):
+        self.conn = conn
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.dimensions = dimensions
+        self.lock = threading.Lock()
+        # Exact key -> entry, in least- to most-recently-used order
+        self.entries = OrderedDict()
+        self.slot_keys = [None] * max_entries
+        self.free_slots = list(range(max_entries - 1, -1, -1))
+        self.vectors = np.zeros((max_entries, dimensions), dtype=np.float32) if enabled else None
+        self.hits = 0
+        self.lookups = 0
+        with self.lock:
+            self.conn.executescript(OPT_OUT_SCHEMA)
+            self.conn.commit()
+
+    # ---- opt-out ----
+    def is_enabled_for(self, thread_id: str) -> bool:
+        if not self.enabled:
+            return False
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM response_cache_opt_out WHERE thread_id = ?", (thread_id,)
+            ).fetchone()
+        return row is None
+
+    def set_thread_enabled(self, thread_id: str, enabled: bool):
+        with self.lock:
+            if enabled:
+                self.conn.execute("DELETE FROM response_cache_opt_out WHERE thread_id = ?", (thread_id,))
+            else:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO response_cache_opt_out (thread_id) VALUES (?)", (thread_id,)
+                )
+            self.conn.commit()
+
+    # ---- lookups ----
+    def lookup(self, prompt: str, context, live=None) -> CachedAnswer:
+        """
+        Cached answer for `prompt` after `context`, or None. With `live`,
+        answers whose source thread fails live(thread_id) are dropped
+        instead of served.
+        """
+        if not self.enabled:
+            return None
+        key_context = context_key(context)
+        key = key_context + "\n>" + normalize_prompt(prompt)
+        now = time.time()
+        with self.lock:
+            self.lookups += 1
+            entry = self.entries.get(key)
+            if entry is not None and (entry.expires_at <= now or not self._is_live(entry, live)):
+                self._evict(key)
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return self._hit(entry, "exact", 1.0)
+
+            if 0 < self.similarity <= 1 and self.entries:
+                scores = self.vectors @ embed(prompt, self.dimensions)
+                terms = key_terms(prompt)
+                for slot in np.argsort(scores)[::-1]:
+                    if scores[slot] < self.similarity:
+                        break
+                    candidate_key = self.slot_keys[slot]
+                    if candidate_key is None:
+                        continue
+                    candidate = self.entries[candidate_key]
+                    if candidate.context != key_context or candidate.used_tools or candidate.terms != terms:
+                        continue
+                    if candidate.expires_at <= now or not self._is_live(candidate, live):
+                        self._evict(candidate_key)
+                        continue
+                    self.entries.move_to_end(candidate_key)
+                    return self._hit(candidate, "similar", float(scores[slot]))
+
+            hit_ratio.set(self.hits / self.lookups)
+        cache_requests.inc(result="miss")
+        return None
+
+    def _hit(self, entry: _Entry, kind: str, score: float) -> CachedAnswer:
+        self.hits += 1
+        hit_ratio.set(self.hits / self.lookups)
+        cache_requests.inc(result=kind)
+        latency_saved.inc(entry.cost_seconds)
+        return CachedAnswer(entry.answer, kind, score, entry.cost_seconds, entry.thread_id)
+
+    @staticmethod
+    def _is_live(entry: _Entry, live) -> bool:
+        return live is None or entry.thread_id is None or live(entry.thread_id)
+
+    def bypass(self):
+        cache_requests.inc(result="bypass")
+
+    # ---- stores ----
+    def store(self, prompt: str, context, answer: str, cost_seconds: float, used_tools: bool = False,
+              thread_id: str = None):
+        if not self.enabled or not answer:
+            return
+        key_context = context_key(context)
+        key = key_context + "\n>" + normalize_prompt(prompt)
+        ttl = RESPONSE_CACHE_TOOL_TTL_SECONDS if used_tools else RESPONSE_CACHE_TTL_SECONDS
+        if ttl <= 0:
+            return
+        vector = embed(prompt, self.dimensions)
+        with self.lock:
+            if key in self.entries:
+                self._evict(key)
+            if not self.free_slots:
+                self._evict(next(iter(self.entries)))
+            slot = self.free_slots.pop()
+            self.vectors[slot] = vector
+            self.slot_keys[slot] = key
+            self.entries[key] = _Entry(
+                slot, key_context, answer, time.time() + ttl, cost_seconds, key_terms(prompt), used_tools,
+                thread_id,
+            )
+            cache_entries.set(len(self.entries))
+
+    def _evict(self, key: str):
+        entry = self.entries.pop(key)
+        self.vectors[entry.slot] = 0.0
+        self.slot_keys[entry.slot] = None
+        self.free_slots.append(entry.slot)
+        cache_entries.set(len(self.entries))
+
+    def forget_threads(self, thread_ids) -> int:
+        """Drop the answers that came from these threads; returns how many"""
+        thread_ids = set(thread_ids)
+        with self.lock:
+            keys = [key for key, entry in self.entries.items() if entry.thread_id in thread_ids]
+            for key in keys:
+                self._evict(key)
+        return len(keys)
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.entries):
+                self._evict(key)
+
+
+def replay_chunks(answer: str, size: int = 24):
+    """Split a cached answer into word-aligned chunks for streaming"""
+    chunk = ""
+    for word in re.findall(r"\S+\s*", answer):
+        chunk += word
+        if len(chunk) >= size:
+            yield chunk
+            chunk = ""
+    if chunk:
+        yield chunk
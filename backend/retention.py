@@ -0,0 +1,202 @@
+"""
+Checkpoint retention and compaction.
+
+Every graph super-step stores a full checkpoint, so threads accumulate
+checkpoints that nothing reads again: the app only ever loads the latest
+one. The compactor deletes checkpoints (and their pending writes) according
+to a RetentionPolicy:
+
+- keep_latest: keep only the newest K checkpoints of each thread
+- tool_loop_max_age: drop checkpoints older than this many seconds that sit
+  in the middle of a tool loop, i.e. whose next checkpoint belongs to the
+  same turn (source 'loop' followed by another 'loop')
+
+The newest checkpoint of a thread is never removed, so get_state and
+delete_thread behave the same on compacted threads. Deletes run in small
+batches under the saver's write lock, then free pages are returned to the
+filesystem with incremental VACUUM.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from persistence import connect
+from thread_catalog import checkpoint_id_for_time
+
+RETENTION_KEEP_LATEST = int(os.getenv("RETENTION_KEEP_LATEST", "20"))
+RETENTION_TOOL_LOOP_MAX_AGE_HOURS = float(os.getenv("RETENTION_TOOL_LOOP_MAX_AGE_HOURS", "24"))
+COMPACTION_INTERVAL_SECONDS = float(os.getenv("COMPACTION_INTERVAL_SECONDS", "3600"))
+COMPACTION_BATCH_SIZE = int(os.getenv("COMPACTION_BATCH_SIZE", "500"))
+VACUUM_PAGES_PER_STEP = 1000
+
+_CANDIDATES_QUERY = """
+WITH ranked AS (
+    SELECT thread_id, checkpoint_ns, checkpoint_id,
+           ROW_NUMBER() OVER (
+               PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+           ) AS newest_rank,
+           source,
+           LEAD(source) OVER (
+               PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id
+           ) AS next_source
+    FROM (
+        SELECT thread_id, checkpoint_ns, checkpoint_id,
+               CASE WHEN json_valid(CAST(metadata AS TEXT))
+                    THEN json_extract(CAST(metadata AS TEXT), '$.source') END AS source
+        FROM checkpoints
+    )
+)
+SELECT thread_id, checkpoint_ns, checkpoint_id
+FROM ranked
+WHERE newest_rank > 1
+  AND ((:keep_latest > 0 AND newest_rank > :keep_latest)
+       OR (:cutoff IS NOT NULL AND source = 'loop' AND next_source = 'loop'
+           AND checkpoint_id < :cutoff))
+"""
+
+
+@dataclass
+class RetentionPolicy:
+    keep_latest: int = RETENTION_KEEP_LATEST
+    tool_loop_max_age: Optional[float] = (
+        RETENTION_TOOL_LOOP_MAX_AGE_HOURS * 3600 if RETENTION_TOOL_LOOP_MAX_AGE_HOURS >= 0 else None
+    )
+
+
+def database_path(conn: sqlite3.Connection) -> str:
+    for _, name, path in conn.execute("PRAGMA database_list"):
+        if name == "main":
+            return path
+    raise ValueError("Connection has no main database")
+
+
+def database_size(conn: sqlite3.Connection):
+    """Return (allocated bytes, bytes sitting on the freelist)"""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return page_count * page_size, freelist * page_size
+
+
+def _delete_batch(saver, batch):
+    with saver.lock:
+        cur = saver.conn.cursor()
+        try:
+            cur.executemany(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                batch,
+            )
+            writes = cur.rowcount
+            cur.executemany(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                batch,
+            )
+            checkpoints = cur.rowcount
+            saver.conn.commit()
+        finally:
+            cur.close()
+    return checkpoints, writes
+
+
+def incremental_vacuum(saver, full: bool = False):
+    """
+    Release freelist pages back to the filesystem. Databases created before
+    auto_vacuum=INCREMENTAL was enabled need one full VACUUM first (`full=True`),
+    which rewrites the whole file and blocks writers while it runs.
+    """
+    with saver.lock:
+        mode = saver.conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if mode != 2:
+            if not full:
+                return False
+            saver.conn.commit()
+            saver.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            saver.conn.execute("VACUUM")
+            return True
+
+    # Free pages in steps so writers can interleave with a large vacuum
+    while True:
+        with saver.lock:
+            freelist = saver.conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if not freelist:
+                break
+            saver.conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP})").fetchall()
+            saver.conn.commit()
+    return True
+
+
+def compact(saver, policy: RetentionPolicy = None, *, vacuum: bool = True,
+            full_vacuum: bool = False, batch_size: int = COMPACTION_BATCH_SIZE) -> dict:
+    """Apply the retention policy once and report what was reclaimed"""
+    policy = policy or RetentionPolicy()
+    if not hasattr(saver, "conn"):
+        raise ValueError("Compaction requires a SQLite checkpoint backend")
+    saver.setup()
+    started = time.perf_counter()
+
+    with saver.lock:
+        bytes_before, _ = database_size(saver.conn)
+    cutoff = None
+    if policy.tool_loop_max_age is not None:
+        cutoff = checkpoint_id_for_time(time.time() - policy.tool_loop_max_age)
+
+    checkpoints_deleted = writes_deleted = 0
+    reader = connect(database_path(saver.conn), readonly=True)
+    try:
+        rows = reader.execute(
+            _CANDIDATES_QUERY, {"keep_latest": max(policy.keep_latest, 0), "cutoff": cutoff}
+        )
+        while batch := rows.fetchmany(batch_size):
+            checkpoints, writes = _delete_batch(saver, batch)
+            checkpoints_deleted += checkpoints
+            writes_deleted += writes
+    finally:
+        reader.close()
+
+    vacuumed = incremental_vacuum(saver, full=full_vacuum) if vacuum else False
+    with saver.lock:
+        bytes_after, free_bytes = database_size(saver.conn)
+
+    return {
+        "policy": asdict(policy),
+        "checkpoints_deleted": checkpoints_deleted,
+        "writes_deleted": writes_deleted,
+        "vacuumed": vacuumed,
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "bytes_reclaimed": bytes_before - bytes_after,
+        "free_bytes": free_bytes,
+        "duration_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def start_compactor(saver, policy: RetentionPolicy = None,
+                    interval: float = COMPACTION_INTERVAL_SECONDS, leases=None):
+    """
+    Run compact() every `interval` seconds on a daemon thread. With a
+    LeaseManager only one worker process compacts per interval: the first
+    to claim the round holds an unrenewed lease until just before the next.
+    """
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            if leases is not None and leases.try_acquire("job:compactor", ttl=interval * 0.9, renew=False) is None:
+                continue
+            try:
+                report = compact(saver, policy)
+                if report["checkpoints_deleted"]:
+                    print(
+                        f"Compacted {report['checkpoints_deleted']} checkpoints, "
+                        f"reclaimed {report['bytes_reclaimed']} bytes"
+                    )
+            except Exception as e:
+                print(f"Checkpoint compaction failed: {e}")
+
+    if interval > 0 and hasattr(saver, "conn"):
+        threading.Thread(target=run, name="checkpoint-compactor", daemon=True).start()
+    return stop
@@ -0,0 +1,278 @@
+"""
+Compact checkpoint serialization.
+
+Every checkpoint holds the thread's whole message list, tool payloads
+included, and LangGraph writes one per super-step, so a thread's storage
+grows with the square of its length. Two things keep that down:
+
+- CompressedSerializer wraps the JsonPlus serializer and compresses what it
+  produces with zlib (or zstd when the zstandard package is installed),
+  optionally primed with a dictionary trained on our own checkpoints
+  (`python maintenance.py train-dictionary`). The codec is recorded in the
+  row's `type` column, e.g. "msgpack+zlib:2", so rows written without
+  compression, or with an older dictionary, still load.
+- Messages are stored once per thread in `message_blobs`, keyed by a hash
+  of their serialized form. The checkpoint itself only keeps the list of
+  hashes (see store_messages / resolve_messages, used by the savers in
+  persistence.py). Blobs belong to their thread and go with delete_thread.
+
+`python maintenance.py migrate-checkpoints` rewrites existing rows into
+the current format.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+try:
+    import zstandard
+except ImportError:  # optional, zlib is always available
+    zstandard = None
+
+CHECKPOINT_COMPRESSION = os.getenv("CHECKPOINT_COMPRESSION", "zlib")
+CHECKPOINT_COMPRESSION_LEVEL = int(os.getenv("CHECKPOINT_COMPRESSION_LEVEL", "6"))
+CHECKPOINT_COMPRESS_MIN_BYTES = int(os.getenv("CHECKPOINT_COMPRESS_MIN_BYTES", "64"))
+CHECKPOINT_MESSAGE_BLOBS = os.getenv("CHECKPOINT_MESSAGE_BLOBS", "1") == "1"
+
+CODECS = ("zlib", "zstd", "none")
+DICTIONARY_SIZE = 32 * 1024  # zlib can only look back 32KB
+MESSAGE_REFS = "__message_refs__"
+
+SERDE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS serde_dictionaries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    codec TEXT NOT NULL,
+    data BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS message_blobs (
+    thread_id TEXT NOT NULL,
+    hash BLOB NOT NULL,
+    type TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (thread_id, hash)
+);
+"""
+
+
+# ---- dictionaries ----
+def _zlib_dictionary(samples, size: int, segment: int = 32) -> bytes:
+    """
+    zlib has no trainer: keep the segments that recur across samples, the
+    most common last, since zlib finds nearby matches more cheaply.
+    """
+    counts = Counter()
+    for sample in samples:
+        counts.update({sample[i:i + segment] for i in range(0, max(len(sample) - segment, 0) + 1, segment // 4)})
+    picked, total = [], 0
+    for chunk, seen in counts.most_common():
+        if seen < 2 or total + len(chunk) > size:
+            break
+        picked.append(chunk)
+        total += len(chunk)
+    return b"".join(reversed(picked))
+
+
+def train_dictionary(samples, codec: str = CHECKPOINT_COMPRESSION, size: int = DICTIONARY_SIZE) -> bytes:
+    """Build a compression dictionary for `codec` from serialized samples"""
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("CHECKPOINT_COMPRESSION=zstd needs the zstandard package")
+        return zstandard.train_dictionary(size, list(samples)).as_bytes()
+    if codec == "zlib":
+        return _zlib_dictionary(samples, size)
+    raise ValueError(f"Codec '{codec}' does not use a dictionary")
+
+
+def save_dictionary(conn: sqlite3.Connection, codec: str, data: bytes) -> int:
+    conn.executescript(SERDE_SCHEMA)
+    cursor = conn.execute(
+        "INSERT INTO serde_dictionaries (codec, data, created_at) VALUES (?, ?, ?)",
+        (codec, data, time.time()),
+    )
+    conn.commit()
+    return cursor.lastrowid
+
+
+# ---- serializer ----
+class CompressedSerializer:
+    """
+    SerializerProtocol implementation: JsonPlus, then compression. With a
+    connection, dictionaries come from `serde_dictionaries`; the newest one
+    for the codec is used for writes, any of them for reads.
+    """
+
+    def __init__(self, conn: sqlite3.Connection = None, codec: str = CHECKPOINT_COMPRESSION,
+                 level: int = CHECKPOINT_COMPRESSION_LEVEL, min_size: int = CHECKPOINT_COMPRESS_MIN_BYTES,
+                 base=None):
+        if codec not in CODECS:
+            raise ValueError(f"Unsupported CHECKPOINT_COMPRESSION '{codec}', expected one of {CODECS}")
+        if codec == "zstd" and zstandard is None:
+            raise ValueError("CHECKPOINT_COMPRESSION=zstd needs the zstandard package")
+        self.base = base or JsonPlusSerializer()
+        self.conn = conn
+        self.codec = codec
+        self.level = level
+        self.min_size = min_size
+        self.lock = threading.Lock()
+        self.dictionaries = {}
+        self.write_dictionary = None
+        self.reload_dictionaries()
+
+    def reload_dictionaries(self):
+        if self.conn is None:
+            return
+        try:
+            with self.lock:
+                rows = self.conn.execute("SELECT id, codec, data FROM serde_dictionaries ORDER BY id").fetchall()
+        except sqlite3.OperationalError:
+            # No dictionary has been trained on this database yet
+            rows = []
+        self.dictionaries = {dict_id: (codec, data) for dict_id, codec, data in rows}
+        latest = [dict_id for dict_id, (codec, _) in self.dictionaries.items() if codec == self.codec]
+        self.write_dictionary = latest[-1] if latest else None
+
+    def use_dictionary(self, dict_id: int, data: bytes):
+        """Compress with `data` from now on, e.g. to try a dictionary before saving it"""
+        self.dictionaries[dict_id] = (self.codec, data)
+        self.write_dictionary = dict_id
+
+    def _dictionary(self, dict_id: int) -> bytes:
+        if dict_id not in self.dictionaries:
+            # Trained by another process after this one started
+            self.reload_dictionaries()
+        return self.dictionaries[dict_id][1]
+
+    def compress(self, type_: str, data: bytes):
+        """(type, data) from the base serializer -> (type, stored bytes)"""
+        if self.codec == "none" or len(data) < self.min_size:
+            return type_, data
+        dict_id = self.write_dictionary
+        zdict = self.dictionaries[dict_id][1] if dict_id is not None else None
+        if self.codec == "zstd":
+            dict_data = zstandard.ZstdCompressionDict(zdict) if zdict else None
+            packed = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data).compress(data)
+        else:
+            compressor = zlib.compressobj(self.level, zdict=zdict) if zdict else zlib.compressobj(self.level)
+            packed = compressor.compress(data) + compressor.flush()
+        if len(packed) >= len(data):
+            return type_, data
+        tag = self.codec if dict_id is None else f"{self.codec}:{dict_id}"
+        return f"{type_}+{tag}", packed
+
+    def decompress(self, type_: str, data: bytes):
+        """Inverse of compress(); plain types pass through unchanged"""
+        base_type, _, tag = type_.partition("+")
+        if not tag:
+            return type_, data
+        codec, _, dict_id = tag.partition(":")
+        zdict = self._dictionary(int(dict_id)) if dict_id else None
+        if codec == "zstd":
+            if zstandard is None:
+                raise ValueError("Reading zstd checkpoints needs the zstandard package")
+            dict_data = zstandard.ZstdCompressionDict(zdict) if zdict else None
+            return base_type, zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data)
+        if codec == "zlib":
+            decompressor = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+            return base_type, decompressor.decompress(data) + decompressor.flush()
+        raise ValueError(f"Unknown checkpoint codec '{codec}'")
+
+    def dumps(self, obj) -> bytes:
+        return self.base.dumps(obj)
+
+    def loads(self, data: bytes):
+        return self.base.loads(data)
+
+    def dumps_typed(self, obj):
+        return self.compress(*self.base.dumps_typed(obj))
+
+    def loads_typed(self, data):
+        return self.base.loads_typed(self.decompress(*data))
+
+
+# ---- content-addressed messages ----
+class MessageBlobs:
+    """Writes and reads the per-thread message blobs behind checkpoints"""
+
+    def __init__(self, serde):
+        self.serde = serde
+
+    def encode(self, message):
+        """message -> (hash, type, uncompressed bytes)"""
+        if isinstance(self.serde, CompressedSerializer):
+            type_, raw = self.serde.base.dumps_typed(message)
+        else:
+            type_, raw = self.serde.dumps_typed(message)
+        return hashlib.blake2b(raw, digest_size=16).digest(), type_, raw
+
+    def _compress(self, type_: str, raw: bytes):
+        if isinstance(self.serde, CompressedSerializer):
+            return self.serde.compress(type_, raw)
+        return type_, raw
+
+    def store_messages(self, cur: sqlite3.Cursor, thread_id: str, checkpoint: dict) -> dict:
+        """
+        Store the checkpoint's messages as blobs and return a copy of the
+        checkpoint that refers to them by hash
+        """
+        messages = checkpoint.get("channel_values", {}).get("messages")
+        if not isinstance(messages, list) or not messages:
+            return checkpoint
+        encoded = [self.encode(message) for message in messages]
+        # Only compress what an earlier checkpoint has not stored yet; a
+        # concurrent writer storing the same blob is absorbed by the primary key
+        stored = set()
+        unique = list(dict.fromkeys(digest for digest, _, _ in encoded))
+        for start in range(0, len(unique), 500):
+            chunk = unique[start:start + 500]
+            cur.execute(
+                f"SELECT hash FROM message_blobs WHERE thread_id = ? AND hash IN ({','.join('?' * len(chunk))})",
+                (thread_id, *chunk),
+            )
+            stored.update(digest for (digest,) in cur.fetchall())
+        cur.executemany(
+            "INSERT OR IGNORE INTO message_blobs (thread_id, hash, type, data) VALUES (?, ?, ?, ?)",
+            [(thread_id, digest, *self._compress(type_, raw)) for digest, type_, raw in encoded if digest not in stored],
+        )
+        channel_values = dict(checkpoint["channel_values"])
+        channel_values["messages"] = {MESSAGE_REFS: [digest for digest, _, _ in encoded]}
+        return {**checkpoint, "channel_values": channel_values}
+
+    def resolve_messages(self, cur: sqlite3.Cursor, thread_id: str, checkpoint: dict) -> dict:
+        """Inverse of store_messages(); checkpoints without refs pass through"""
+        if not has_message_refs(checkpoint):
+            return checkpoint
+        hashes = checkpoint["channel_values"]["messages"][MESSAGE_REFS]
+        return {
+            **checkpoint,
+            "channel_values": {**checkpoint["channel_values"], "messages": load_messages(cur, self.serde, thread_id, hashes)},
+        }
+
+
+def has_message_refs(checkpoint: dict) -> bool:
+    messages = checkpoint.get("channel_values", {}).get("messages")
+    return isinstance(messages, dict) and MESSAGE_REFS in messages
+
+
+def load_messages(cur: sqlite3.Cursor, serde, thread_id: str, hashes) -> list:
+    """Decode the blobs `hashes` of a thread, in order"""
+    rows = {}
+    unique = list(dict.fromkeys(hashes))
+    for start in range(0, len(unique), 500):
+        chunk = unique[start:start + 500]
+        cur.execute(
+            f"""SELECT hash, type, data FROM message_blobs
+                WHERE thread_id = ? AND hash IN ({",".join("?" * len(chunk))})""",
+            (thread_id, *chunk),
+        )
+        rows.update((digest, (type_, data)) for digest, type_, data in cur.fetchall())
+    missing = [digest for digest in unique if digest not in rows]
+    if missing:
+        raise ValueError(f"Thread '{thread_id}' is missing {len(missing)} message blobs")
+    return [serde.loads_typed(rows[digest]) for digest in hashes]
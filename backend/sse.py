@@ -0,0 +1,148 @@
+"""
+Server-Sent Events framing and token coalescing for /chat/stream.
+
+Model chunks are often only a few characters long. Instead of writing one
+frame per chunk, chunks are buffered and flushed according to a policy:
+
+- immediate: one frame per chunk
+- size:      flush once STREAM_FLUSH_BYTES of text are buffered
+- time:      flush STREAM_FLUSH_INTERVAL_MS after the first buffered chunk
+
+Every frame carries an event id, and a comment frame is sent whenever the
+stream has been idle for SSE_HEARTBEAT_SECONDS so proxies keep it open
+while tools run. /chat/stream uses "<turn id>:<chunks sent>" ids, so a
+client that lost the connection can resume from its Last-Event-ID.
+
+Progress events (tool_start, tool_end, node) are also sent as named SSE
+events, so EventSource clients only see them when they listen for them;
+content, done and error frames stay unnamed "message" events.
+"""
+
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+FLUSH_MODES = ("immediate", "size", "time")
+
+STREAM_FLUSH_MODE = os.getenv("STREAM_FLUSH_MODE", "time")
+STREAM_FLUSH_BYTES = int(os.getenv("STREAM_FLUSH_BYTES", "64"))
+STREAM_FLUSH_INTERVAL_MS = int(os.getenv("STREAM_FLUSH_INTERVAL_MS", "25"))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+HEARTBEAT_FRAME = b": keep-alive\n\n"
+_ID_PREFIX = b"id: "
+_EVENT_PREFIX = b"\nevent: "
+_DATA_PREFIX = b"\ndata: "
+_FRAME_END = b"\n\n"
+
+
+@dataclass(frozen=True)
+class FlushPolicy:
+    max_bytes: Optional[int] = None
+    max_delay: Optional[float] = None
+
+    @classmethod
+    def from_mode(cls, mode: str, max_bytes: int, interval_ms: int) -> "FlushPolicy":
+        if mode == "immediate":
+            return cls(max_bytes=1)
+        if mode == "size":
+            return cls(max_bytes=max_bytes)
+        if mode == "time":
+            # The byte cap still applies so a fast model cannot build huge frames
+            return cls(max_bytes=max(max_bytes, 4096), max_delay=interval_ms / 1000)
+        raise ValueError(f"Unsupported flush mode '{mode}', expected one of {FLUSH_MODES}")
+
+
+default_policy = FlushPolicy.from_mode(STREAM_FLUSH_MODE, STREAM_FLUSH_BYTES, STREAM_FLUSH_INTERVAL_MS)
+
+
+class SSEEncoder:
+    """Encodes event payloads as SSE frames, with increasing event ids unless given one"""
+
+    def __init__(self):
+        self.last_id = 0
+
+    def frame(self, payload: dict, event: str = None, event_id: str = None) -> bytes:
+        if event_id is None:
+            self.last_id += 1
+            event_id = str(self.last_id)
+        data = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+        name = (_EVENT_PREFIX, event.encode()) if event else ()
+        return b"".join((_ID_PREFIX, event_id.encode(), *name, _DATA_PREFIX, data, _FRAME_END))
+
+
+async def coalesce(chunks, policy: FlushPolicy = default_policy,
+                   heartbeat_interval: float = SSE_HEARTBEAT_SECONDS, progress: dict = None):
+    """
+    Merge an async iterator of text chunks according to `policy`.
+    Yields text to send, or None when a heartbeat is due. Anything that is
+    not text (a progress event) flushes the buffered text and passes
+    through unchanged, so the order of the stream is kept.
+
+    With `progress`, progress["chunks"] is the number of input chunks
+    covered by everything yielded so far whenever a value is yielded.
+    """
+    iterator = chunks.__aiter__()
+    progress = progress if progress is not None else {}
+    progress["chunks"] = 0
+    buffer, buffered_bytes, buffered_at = [], 0, None
+    last_sent = time.monotonic()
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+
+            now = time.monotonic()
+            deadline = last_sent + heartbeat_interval
+            if buffer and policy.max_delay is not None:
+                deadline = min(deadline, buffered_at + policy.max_delay)
+            done, _ = await asyncio.wait({pending}, timeout=max(deadline - now, 0))
+
+            if not done:
+                now = time.monotonic()
+                if buffer and policy.max_delay is not None and now - buffered_at >= policy.max_delay:
+                    progress["chunks"] += len(buffer)
+                    yield "".join(buffer)
+                    buffer, buffered_bytes = [], 0
+                    last_sent = now
+                elif now - last_sent >= heartbeat_interval:
+                    yield None
+                    last_sent = now
+                continue
+
+            task, pending = pending, None
+            try:
+                chunk = task.result()
+            except StopAsyncIteration:
+                break
+
+            if not isinstance(chunk, str):
+                if buffer:
+                    progress["chunks"] += len(buffer)
+                    yield "".join(buffer)
+                    buffer, buffered_bytes = [], 0
+                progress["chunks"] += 1
+                yield chunk
+                last_sent = time.monotonic()
+                continue
+
+            if not buffer:
+                buffered_at = time.monotonic()
+            buffer.append(chunk)
+            buffered_bytes += len(chunk.encode())
+            if policy.max_bytes is not None and buffered_bytes >= policy.max_bytes:
+                progress["chunks"] += len(buffer)
+                yield "".join(buffer)
+                buffer, buffered_bytes = [], 0
+                last_sent = time.monotonic()
+
+        if buffer:
+            progress["chunks"] += len(buffer)
+            yield "".join(buffer)
+    finally:
+        if pending is not None:
+            pending.cancel()
@@ -0,0 +1,42 @@
+"""
+Shared fixtures for the backend tests.
+
+Run from the backend directory with `python -m pytest -q tests`. The tests
+run offline: the model is the fake provider and tools talk to the stub
+upstream from benchmarks/stub_upstream.py. Settings are read at import
+time, so they are set here before any application module is imported.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (BACKEND_DIR, os.path.join(BACKEND_DIR, "benchmarks")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+_scratch = tempfile.mkdtemp(prefix="chatbot-tests-")
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("DATABASE_PATH", os.path.join(_scratch, "chatbot.db"))
+
+from stub_upstream import start_stub_server  # noqa: E402
+
+
+@pytest.fixture
+def stub_upstream():
+    """A local stock/search upstream; yields (state, base_url)"""
+    server, state, base_url = start_stub_server()
+    yield state, base_url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    """Retry right away instead of sleeping between attempts"""
+    import http_client
+
+    monkeypatch.setattr(http_client, "backoff_delay", lambda attempt: 0.0)
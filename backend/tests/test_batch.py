@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+import batch
+from turn_runner import TurnLimiter, TurnRejected
+from turns import TurnScheduler
+
+
+def test_batch_item_queues_behind_interactive_turn(monkeypatch):
+    order = []
+    gate = threading.Event()
+
+    def run(thread_id, message, info):
+        if message == "interactive":
+            gate.wait(5)
+        order.append(message)
+        yield f"{message} done"
+
+    async def scenario():
+        scheduler = TurnScheduler(max_queued=4, limiter=TurnLimiter(max_active=2, max_waiting=2))
+        monkeypatch.setattr(batch, "turn_scheduler", scheduler)
+        monkeypatch.setattr(batch, "stream_turn", run)
+        interactive = await scheduler.submit("t", "interactive", run)
+        item = asyncio.create_task(batch.run_item("b", {"id": "0", "thread_id": "t", "message": "bulk"}))
+        await asyncio.sleep(0.05)
+        assert order == []
+        gate.set()
+        assert [chunk async for chunk in interactive.chunks()] == ["interactive done"]
+        return await asyncio.wait_for(item, 2)
+
+    result = asyncio.run(scenario())
+    assert order == ["interactive", "bulk"]
+    assert result["status"] == "ok" and result["response"] == "bulk done"
+
+
+def test_batch_item_gives_up_after_max_rejections(monkeypatch):
+    class Refuse(TurnLimiter):
+        calls = 0
+
+        async def acquire(self, client="", priority="interactive"):
+            self.calls += 1
+            raise TurnRejected("Server busy", retry_after=0)
+
+    def run(thread_id, message, info):
+        yield "never"
+
+    limiter = Refuse(max_active=1, max_waiting=1)
+    monkeypatch.setattr(batch, "turn_scheduler", TurnScheduler(limiter=limiter))
+    monkeypatch.setattr(batch, "stream_turn", run)
+    monkeypatch.setattr(batch, "BATCH_MAX_REJECTIONS", 2)
+    result = asyncio.run(batch.run_item("b", {"id": "0", "thread_id": "t", "message": "bulk"}))
+    assert result["status"] == "error" and result["code"] == "server_busy"
+    assert limiter.calls == 3
@@ -0,0 +1,24 @@
+import uuid
+
+import pytest
+
+import chatbot_engine
+
+
+class BrokenModel:
+    def invoke(self, messages):
+        raise RuntimeError("model unavailable")
+
+
+def test_failed_turn_still_syncs_catalog_and_index(monkeypatch):
+    monkeypatch.setattr(chatbot_engine, "get_llm_with_tools", lambda: BrokenModel())
+    thread_id = f"failing-{uuid.uuid4().hex}"
+    with pytest.raises(RuntimeError, match="model unavailable"):
+        list(chatbot_engine.stream_turn(thread_id, "hello there"))
+
+    # The graph checkpointed the user's message before the model call failed
+    assert chatbot_engine.get_message_index().version(thread_id) == 1
+    row = chatbot_engine.get_catalog().conn.execute(
+        "SELECT message_count FROM thread_catalog WHERE thread_id = ?", (thread_id,)
+    ).fetchone()
+    assert row == (1,)
@@ -0,0 +1,185 @@
+import time
+
+import pytest
+import requests
+import stub_upstream as stub
+
+from http_client import (
+    CircuitBreaker, CircuitOpenError, HttpClient, UpstreamError, backoff_delay,
+)
+
+
+def fail_then_succeed(monkeypatch, state, failures: int):
+    """Make the stub answer 503 to the first `failures` requests only"""
+    rolls = iter([0.0] * failures)
+    state.fail_rate = 0.5
+    monkeypatch.setattr(stub.random, "random", lambda: next(rolls, 1.0))
+
+
+def test_pooled_get_reuses_connections(stub_upstream):
+    _, base_url = stub_upstream
+    client = HttpClient()
+    for _ in range(3):
+        quote = client.get("stub", f"{base_url}/query", params={"symbol": "AAPL"}).json()
+        assert quote["Global Quote"]["01. symbol"] == "AAPL"
+    pools = client.session.get_adapter(base_url).poolmanager.pools
+    assert sum(pools[key].num_connections for key in pools.keys()) == 1
+
+
+def test_retries_until_the_upstream_recovers(stub_upstream, monkeypatch, no_backoff):
+    state, base_url = stub_upstream
+    fail_then_succeed(monkeypatch, state, 2)
+    client = HttpClient(max_retries=2)
+    response = client.get("stub", f"{base_url}/search", params={"q": "news"})
+    assert response.status_code == 200
+    assert state.requests == 3
+    assert client.breaker("stub").state == "closed"
+
+
+def test_gives_up_after_max_retries(stub_upstream, no_backoff):
+    state, base_url = stub_upstream
+    state.fail_rate = 1.0
+    client = HttpClient(max_retries=2)
+    with pytest.raises(UpstreamError, match="HTTP 503"):
+        client.get("stub", f"{base_url}/query")
+    assert state.requests == 3
+    assert client.breaker("stub").failures == 1
+
+
+def test_read_timeout_is_retried_then_reported(stub_upstream, no_backoff):
+    state, base_url = stub_upstream
+    state.latency = 0.3
+    client = HttpClient(timeout=(1, 0.05), max_retries=1)
+    began = time.perf_counter()
+    with pytest.raises(UpstreamError, match="request failed"):
+        client.get("stub", f"{base_url}/query")
+    assert time.perf_counter() - began < 0.3 * 2
+    assert state.requests == 2
+
+
+def test_backoff_is_jittered_and_capped():
+    delays = [backoff_delay(attempt, base=0.1, cap=0.5) for attempt in range(10) for _ in range(20)]
+    assert all(0 <= delay <= 0.5 for delay in delays)
+    assert len(set(delays)) > 1
+    assert max(backoff_delay(0, base=0.1, cap=0.5) for _ in range(50)) <= 0.1
+
+
+def test_breaker_opens_then_half_opens_with_a_single_trial():
+    breaker = CircuitBreaker("stub", failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker("stub", failure_threshold=1, reset_seconds=0.05)
+    with pytest.raises(ValueError):
+        breaker.call(lambda: (_ for _ in ()).throw(ValueError("boom")))
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_open_breaker_stops_calling_the_upstream(stub_upstream, no_backoff):
+    state, base_url = stub_upstream
+    state.fail_rate = 1.0
+    client = HttpClient(max_retries=0)
+    client.breakers["stub"] = CircuitBreaker("stub", failure_threshold=2, reset_seconds=0.1)
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            client.get("stub", f"{base_url}/query")
+    with pytest.raises(CircuitOpenError):
+        client.get("stub", f"{base_url}/query")
+    assert state.requests == 2
+
+    state.fail_rate = 0.0
+    time.sleep(0.11)
+    assert client.get("stub", f"{base_url}/query").status_code == 200
+    assert client.breaker("stub").state == "closed"
+
+
+def test_failure_responses_that_are_not_retried_pass_through(stub_upstream):
+    _, base_url = stub_upstream
+    client = HttpClient()
+    response = client.get("stub", f"{base_url}/missing")
+    assert response.status_code == 404
+    with pytest.raises(requests.HTTPError):
+        response.raise_for_status()
+
+
+def test_rate_limited_trial_does_not_wedge_the_breaker(stub_upstream, monkeypatch):
+    import http_client
+    from admission import UpstreamLimiter, UpstreamRateLimited
+
+    _, base_url = stub_upstream
+    client = HttpClient(max_retries=0)
+    breaker = client.breakers["stub"] = CircuitBreaker("stub", failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+
+    # Out of tokens while half open: rejected locally, no trial started
+    exhausted = UpstreamLimiter({"stub": (0.001, 1)}, max_wait=0)
+    exhausted.acquire("stub")
+    monkeypatch.setattr(http_client, "upstream_limiter", exhausted)
+    with pytest.raises(UpstreamRateLimited):
+        client.get("stub", f"{base_url}/query")
+    assert not breaker.trial_in_flight
+
+    monkeypatch.setattr(http_client, "upstream_limiter", UpstreamLimiter({}))
+    assert client.get("stub", f"{base_url}/query").status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_unexpected_error_during_trial_counts_as_failure(stub_upstream, monkeypatch):
+    _, base_url = stub_upstream
+    client = HttpClient(max_retries=2)
+    breaker = client.breakers["stub"] = CircuitBreaker("stub", failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    def broken(*args, **kwargs):
+        raise ValueError("bad request arguments")
+
+    monkeypatch.setattr(client.session, "request", broken)
+    with pytest.raises(ValueError):
+        client.get("stub", f"{base_url}/query")
+    assert breaker.state == "open"
+    assert not breaker.trial_in_flight
+
+    monkeypatch.undo()
+    time.sleep(0.06)
+    assert client.get("stub", f"{base_url}/query").status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_rate_limited_retry_settles_the_trial(stub_upstream, monkeypatch, no_backoff):
+    import http_client
+    from admission import UpstreamLimiter, UpstreamRateLimited
+
+    state, base_url = stub_upstream
+    state.fail_rate = 1.0
+    client = HttpClient(max_retries=2)
+    breaker = client.breakers["stub"] = CircuitBreaker("stub", failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    # One token: the first attempt goes out, the retry is turned away
+    monkeypatch.setattr(http_client, "upstream_limiter", UpstreamLimiter({"stub": (0.001, 1)}, max_wait=0))
+    with pytest.raises(UpstreamRateLimited):
+        client.get("stub", f"{base_url}/query")
+    assert state.requests == 1
+    assert breaker.state == "open"
+    assert not breaker.trial_in_flight
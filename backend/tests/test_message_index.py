@@ -0,0 +1,66 @@
+import sqlite3
+
+import pytest
+
+from message_index import MessageIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "index.db"), check_same_thread=False)
+    yield MessageIndex(conn)
+    conn.close()
+
+
+def fill(index):
+    """One old message that is all about rhubarb, then many newer passing mentions"""
+    index.sync_projected("old", [("m0", "user", "rhubarb rhubarb rhubarb rhubarb")])
+    filler = " ".join(["weather"] * 40)
+    for n in range(50):
+        index.sync_projected(f"new-{n:02d}", [(f"m{n}", "user", f"rhubarb {filler}")])
+
+
+def test_search_ranks_every_match(index):
+    fill(index)
+    results, truncated = index.search("rhubarb", limit=5, candidates=0)
+    assert results[0]["thread_id"] == "old"
+    assert len(results) == 5
+    assert not truncated
+    scores = [result["score"] for result in results]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_capped_search_reports_truncation(index):
+    fill(index)
+    results, truncated = index.search("rhubarb", limit=5, candidates=10)
+    assert truncated
+    assert len(results) == 5
+    assert "old" not in {result["thread_id"] for result in results}
+
+    results, truncated = index.search("rhubarb", limit=5, candidates=100)
+    assert not truncated
+    assert results[0]["thread_id"] == "old"
+
+
+def test_thread_search(index):
+    fill(index)
+    results, truncated = index.search("rhubarb", thread_id="old")
+    assert [result["thread_id"] for result in results] == ["old"]
+    assert not truncated
+    assert index.search("rhubarb", thread_id="missing") == ([], False)
+
+
+def test_deleted_threads_do_not_take_result_slots(index):
+    fill(index)
+    for n in range(5):
+        index.sync_projected(f"gone-{n}", [(f"g{n}", "user", "rhubarb rhubarb rhubarb rhubarb rhubarb")])
+    gone = [f"gone-{n}" for n in range(5)]
+    results, _ = index.search("rhubarb", limit=5)
+    assert {result["thread_id"] for result in results} == set(gone)
+
+    for candidates in (0, 100):
+        results, _ = index.search("rhubarb", limit=5, candidates=candidates, exclude=gone)
+        assert len(results) == 5
+        assert results[0]["thread_id"] == "old"
+        assert not set(gone) & {result["thread_id"] for result in results}
+    assert index.search("rhubarb", thread_id="gone-0", exclude=gone) == ([], False)
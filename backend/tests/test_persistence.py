@@ -0,0 +1,89 @@
+import random
+import threading
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.base.id import uuid6
+
+from persistence import PooledSqliteSaver
+
+
+class LockCheckedConnection:
+    """The writer connection, failing any use made without the saver's lock"""
+
+    def __init__(self, conn, lock):
+        self._conn = conn
+        self._lock = lock
+
+    def __getattr__(self, name):
+        if name in ("cursor", "execute", "executescript", "commit") and not self._lock.locked():
+            raise AssertionError(f"writer connection used without the lock: {name}")
+        return getattr(self._conn, name)
+
+
+@pytest.fixture
+def saver(tmp_path):
+    saver = PooledSqliteSaver(str(tmp_path / "checkpoints.db"), pool_size=2)
+    saver.setup()
+    saver.conn = LockCheckedConnection(saver.conn, saver.lock)
+    yield saver
+    saver.conn = saver.conn._conn
+    saver.close()
+
+
+def put_turn(saver, thread_id: str, turn: int, messages: list, config=None):
+    messages = messages + [HumanMessage(content=f"question {turn}", id=f"h{turn}"),
+                           AIMessage(content=f"answer {turn}", id=f"a{turn}")]
+    checkpoint = empty_checkpoint()
+    checkpoint["id"] = str(uuid6(clock_seq=random.getrandbits(14)))
+    checkpoint["channel_values"] = {"messages": messages}
+    config = saver.put(config or {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}},
+                       checkpoint, {"source": "loop", "step": turn}, {})
+    saver.put_writes(config, [("messages", [messages[-1]])], f"task-{turn}")
+    return messages, config
+
+
+def test_list_reads_checkpoints_and_writes_through_a_reader(saver):
+    messages, config = [], None
+    for turn in range(3):
+        messages, config = put_turn(saver, "t1", turn, messages, config)
+
+    listed = list(saver.list({"configurable": {"thread_id": "t1"}}))
+    assert [item.metadata["step"] for item in listed] == [2, 1, 0]
+    newest = listed[0]
+    assert [m.content for m in newest.checkpoint["channel_values"]["messages"]] == [m.content for m in messages]
+    assert newest.pending_writes == [("task-2", "messages", [messages[-1]])]
+    assert newest.parent_config["configurable"]["checkpoint_id"] == listed[1].config["configurable"]["checkpoint_id"]
+    assert newest.checkpoint == saver.get_tuple({"configurable": {"thread_id": "t1"}}).checkpoint
+
+    assert len(list(saver.list({"configurable": {"thread_id": "t1"}}, limit=1))) == 1
+    assert len(list(saver.list({"configurable": {"thread_id": "t1"}}, before=newest.config))) == 2
+    assert [item.metadata["step"] for item in saver.list(None, filter={"step": 1})] == [1]
+
+
+def test_list_runs_alongside_writes(saver):
+    errors = []
+
+    def writer(thread_id):
+        messages, config = [], None
+        try:
+            for turn in range(20):
+                messages, config = put_turn(saver, thread_id, turn, messages, config)
+        except Exception as e:
+            errors.append(e)
+
+    def reader(thread_id):
+        try:
+            for _ in range(40):
+                for item in saver.list({"configurable": {"thread_id": thread_id}}, limit=5):
+                    assert item.checkpoint["channel_values"]["messages"]
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=target, args=(f"t{i}",)) for i in range(3) for target in (writer, reader)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
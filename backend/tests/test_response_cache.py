@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+from response_cache import ResponseCache, embed, key_terms
+
+
+@pytest.fixture
+def cache():
+    # A low threshold, so only the key-term check can turn a near-match away
+    return ResponseCache(sqlite3.connect(":memory:", check_same_thread=False), enabled=True,
+                         max_entries=16, similarity=0.5, dimensions=512)
+
+
+def test_exact_prompt_hits_after_normalization(cache):
+    cache.store("Price of AAPL?", [], "AAPL is at 190", cost_seconds=1.0, used_tools=True)
+    hit = cache.lookup("  price of aapl ", [])
+    assert hit.kind == "exact" and hit.answer == "AAPL is at 190"
+
+
+def test_rephrasing_with_filler_words_hits_the_similar_tier(cache):
+    cache.store("explain quantum computing", [], "Qubits...", cost_seconds=1.0)
+    hit = cache.lookup("Please explain quantum computing to me", [])
+    assert hit.kind == "similar" and hit.answer == "Qubits..."
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("What is the current stock price of AAPL today?", "What is the current stock price of MSFT today?"),
+    ("Tell me the latest news about the war in Israel", "Tell me the latest news about the war in Ukraine"),
+    ("convert 100 usd to eur", "convert 200 usd to eur"),
+    ("what is the weather in London", "what is the weather in Paris"),
+])
+def test_near_match_on_a_different_entity_misses(cache, cached, asked):
+    assert float(embed(cached, 512) @ embed(asked, 512)) >= 0.5
+    cache.store(cached, [], "answer about the cached prompt", cost_seconds=1.0)
+    assert cache.lookup(asked, []) is None
+
+
+def test_answers_that_used_tools_are_only_served_exactly(cache):
+    cache.store("latest AI news", [], "Headlines...", cost_seconds=1.0, used_tools=True)
+    assert cache.lookup("latest AI news please", []) is None
+    assert cache.lookup("latest AI news", []).kind == "exact"
+
+
+def test_similar_hits_need_the_same_context(cache):
+    cache.store("explain it again", [("user", "what is rust")], "Rust is...", cost_seconds=1.0)
+    assert cache.lookup("please explain it again", [("user", "what is go")]) is None
+    assert cache.lookup("please explain it again", [("user", "what is rust")]).kind == "similar"
+
+
+def test_key_terms_keep_numbers_and_names():
+    assert key_terms("What's the price of AAPL today?") == {"price", "aapl"}
+    assert key_terms("convert $100 to EUR") == {"convert", "$100", "eur"}
+    assert key_terms("is it not raining") == {"not", "raining"}
+
+
+def test_deleted_threads_answers_are_dropped(cache):
+    cache.store("explain quantum computing", [], "Qubits...", cost_seconds=1.0, thread_id="gone")
+    cache.store("explain rust lifetimes", [], "Borrows...", cost_seconds=1.0, thread_id="kept")
+    assert cache.lookup("explain quantum computing", []).thread_id == "gone"
+    assert cache.forget_threads(["gone"]) == 1
+    assert cache.lookup("explain quantum computing", []) is None
+    assert cache.lookup("explain rust lifetimes", []).answer == "Borrows..."
+
+
+def test_answers_from_threads_that_are_no_longer_live_are_not_served(cache):
+    # Deleted through another worker, or already purged: this process never heard of it
+    cache.store("explain quantum computing", [], "Qubits...", cost_seconds=1.0, thread_id="gone")
+    live = lambda thread_id: thread_id != "gone"
+    assert cache.lookup("please explain quantum computing", [], live=live) is None
+    assert cache.lookup("explain quantum computing", [], live=live) is None
+    assert not cache.entries
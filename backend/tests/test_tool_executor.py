@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+from tool_executor import ToolRegistry, tool_latency
+
+
+class FakeTool:
+    def __init__(self, name, fn):
+        self.name = name
+        self.fn = fn
+
+    def invoke(self, args):
+        return self.fn(**args)
+
+
+def observed(tool: str) -> dict:
+    """outcome -> number of latency observations for `tool`"""
+    return {outcome: entry[2] for (name, outcome), entry in tool_latency.values.items() if name == tool}
+
+
+@pytest.fixture
+def release():
+    gate = threading.Event()
+    yield gate
+    gate.set()
+
+
+def test_timed_out_call_is_observed_once(release):
+    finished = threading.Event()
+
+    def slow():
+        release.wait(5)
+        finished.set()
+        return {"ok": True}
+
+    registry = ToolRegistry([FakeTool("slow_once", slow)], timeouts={"slow_once": 0.05})
+    events = []
+    results = registry.run_calls([{"name": "slow_once", "args": {}}],
+                                 on_event=lambda kind, call, **details: events.append(details))
+    assert "timed out" in results[0]["error"]
+    assert events[-1]["outcome"] == "timeout"
+    release.set()
+    assert finished.wait(2)
+    time.sleep(0.05)
+    assert observed("slow_once") == {"timeout": 1}
+
+
+def test_queued_call_is_not_reported_as_a_timeout(release):
+    ran = []
+
+    def blocker():
+        release.wait(5)
+        return {"ok": True}
+
+    def quick():
+        ran.append(True)
+        return {"ok": True}
+
+    registry = ToolRegistry([FakeTool("blocker", blocker), FakeTool("quick_queued", quick)], max_concurrency=1,
+                            timeouts={"blocker": 0.1, "quick_queued": 0.1})
+    outcomes = {}
+    registry.run_calls(
+        [{"name": "blocker", "args": {}}, {"name": "quick_queued", "args": {}}],
+        on_event=lambda kind, call, **details: outcomes.__setitem__(call["name"], details.get("outcome")),
+    )
+    assert outcomes == {"blocker": "timeout", "quick_queued": "queued"}
+    release.set()
+    time.sleep(0.05)
+    assert ran == []
+
+
+def test_timeout_starts_when_the_call_runs():
+    def sleepy():
+        time.sleep(0.15)
+        return {"ok": True}
+
+    registry = ToolRegistry([FakeTool("sleepy_started", sleepy)], max_concurrency=1,
+                            timeouts={"sleepy_started": 0.25})
+    # The second call waits ~0.15s for the first, then runs within its own timeout
+    results = registry.run_calls([{"name": "sleepy_started", "args": {}}] * 2)
+    assert results == [{"ok": True}, {"ok": True}]
+
+
+def test_error_results_use_one_outcome_rule():
+    def failing():
+        return {"error": "upstream said no"}
+
+    def raising():
+        raise RuntimeError("boom")
+
+    registry = ToolRegistry([FakeTool("failing_dict", failing), FakeTool("raising_tool", raising)])
+    outcomes = []
+    registry.run_calls([{"name": "failing_dict", "args": {}}, {"name": "raising_tool", "args": {}}],
+                       on_event=lambda kind, call, **details: outcomes.append(details.get("outcome")))
+    assert outcomes.count("error") == 2
+    assert observed("failing_dict") == {"error": 1}
+    assert observed("raising_tool") == {"error": 1}
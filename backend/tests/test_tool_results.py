@@ -0,0 +1,107 @@
+import json
+
+import pytest
+from langchain_core.messages import AIMessage
+from stub_upstream import quote_payload, search_payload
+
+import tool_results
+from persistence import connect
+from tool_results import ToolPayloadStore, compact, format_tool_result, render
+
+
+@pytest.fixture
+def store():
+    return ToolPayloadStore(connect(":memory:"))
+
+
+def test_quote_keeps_the_fields_the_model_needs():
+    value = compact("get_stock_price", quote_payload("AAPL"))
+    assert set(value) == {"symbol", "price", "change", "change_percent", "volume", "day"}
+    assert value["symbol"] == "AAPL"
+    assert isinstance(value["price"], float) and isinstance(value["volume"], int)
+
+
+def test_search_is_one_short_line_per_result():
+    raw = search_payload("python release", count=3)
+    raw["results"][0]["title"] = "T" * 500
+    lines = compact("duckduckgo_search", raw).split("\n")
+    assert len(lines) == 3
+    assert len(lines[0]) < 60 + 40 + len(raw["results"][0]["url"]) + 10
+    assert lines[1].startswith(f"- {raw['results'][1]['title']}: {raw['results'][1]['url']} — Snippet 2")
+    assert compact("duckduckgo_search", {"results": []}) == "No results found"
+    assert compact("duckduckgo_search", {"error": "timeout"}) == {"error": "timeout"}
+
+
+def test_render_drops_whole_results_to_fit_the_cap():
+    text = render("duckduckgo_search", compact("duckduckgo_search", search_payload("news", count=8)),
+                  limits={"duckduckgo_search": 400})
+    assert len(text) <= 400
+    assert text.endswith("more omitted)")
+    assert all(line.startswith("- ") for line in text.split("\n")[:-1])
+
+
+def test_render_cuts_anything_else_at_the_cap():
+    text = render("other", {"data": "x" * 500}, limits={"other": 50})
+    assert len(text) == 50 and text.endswith("…")
+
+
+def test_payload_id_stays_out_of_the_model_text(store):
+    raw = search_payload("market news", count=8)
+    content, artifact = format_tool_result("duckduckgo_search", raw, store, "thread-1")
+    assert "payload_id" not in content
+    assert content.endswith("more omitted)")
+    saved = store.get(artifact["payload_id"])
+    assert saved["payload"] == raw
+    assert saved["thread_id"] == "thread-1" and saved["tool"] == "duckduckgo_search"
+
+
+def test_results_shown_in_full_are_not_stored(store, monkeypatch):
+    assert format_tool_result("calculator", {"result": 4}, store, "thread-1") == ('{"result":4}', None)
+    # Compaction drops a quote's open, high and low, but nothing was cut off
+    assert format_tool_result("get_stock_price", quote_payload("AAPL"), store, "thread-1")[1] is None
+    monkeypatch.setattr(tool_results, "TOOL_PAYLOAD_STORE", False)
+    assert format_tool_result("duckduckgo_search", search_payload("news", count=8), store, "thread-1")[1] is None
+    assert store.conn.execute("SELECT COUNT(*) FROM tool_payloads").fetchone()[0] == 0
+
+
+def test_large_raw_results_are_stored_past_the_threshold(store, monkeypatch):
+    raw = quote_payload("AAPL")
+    monkeypatch.setattr(tool_results, "TOOL_PAYLOAD_MIN_CHARS", len(json.dumps(raw)) + 1)
+    assert format_tool_result("get_stock_price", raw, store, "thread-1")[1] is None
+    monkeypatch.setattr(tool_results, "TOOL_PAYLOAD_MIN_CHARS", len(tool_results.dumps(raw)))
+    artifact = format_tool_result("get_stock_price", raw, store, "thread-1")[1]
+    assert store.get(artifact["payload_id"])["payload"] == raw
+
+
+def test_compact_results_are_smaller_than_the_previous_format():
+    quote = quote_payload("NVDA")
+    search = search_payload("latest market news today", count=5)
+    previous_search = "\n".join(f"- {r['title']}: {r['url']}" for r in search["results"])
+    assert len(format_tool_result("get_stock_price", quote)[0]) < len(str(quote))
+    assert len(format_tool_result("duckduckgo_search", search)[0]) < len(previous_search)
+
+
+def test_tool_node_round_trips_the_raw_payload(stub_upstream, monkeypatch):
+    import chat_tools
+    from chatbot_engine import get_tool_payloads, tool_node
+    from fastapi.testclient import TestClient
+    from main import app
+
+    _, base_url = stub_upstream
+    monkeypatch.setattr(chat_tools, "ALPHA_VANTAGE_URL", f"{base_url}/query")
+    monkeypatch.setattr(tool_results, "TOOL_PAYLOAD_MIN_CHARS", 0)
+    call = {"name": "get_stock_price", "args": {"symbol": "TSLA"}, "id": "call_tsla", "type": "tool_call"}
+    events = []
+    update = tool_node({"messages": [AIMessage(content="", tool_calls=[call])]},
+                       {"configurable": {"thread_id": "payload-thread"}}, events.append)
+
+    message = update["messages"][0]
+    assert json.loads(message.content)["symbol"] == "TSLA"
+    payload_id = message.artifact["payload_id"]
+    assert get_tool_payloads().get(payload_id)["payload"] == quote_payload("TSLA")
+    assert [event["type"] for event in events] == ["tool_start", "tool_end"]
+
+    response = TestClient(app).get(f"/tool-payloads/{payload_id}")
+    assert response.status_code == 200
+    assert response.json()["payload"] == quote_payload("TSLA")
+    assert TestClient(app).get("/tool-payloads/missing").status_code == 404
@@ -0,0 +1,162 @@
+import asyncio
+import threading
+
+import pytest
+
+from turn_runner import TurnLimiter, TurnRejected
+from turns import ThreadQueueFull, TurnScheduler
+
+
+def blocking_run(gates: dict):
+    """A turn body that waits for gates[message] before answering"""
+    def run(thread_id, message, info):
+        gate = gates.get(message)
+        if gate is not None:
+            gate.wait(5)
+        yield f"{message} done"
+    return run
+
+
+async def collect(subscription):
+    return [chunk async for chunk in subscription.chunks()]
+
+
+async def wait_until(condition, timeout: float = 2.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+def test_queued_turns_do_not_hold_worker_slots():
+    async def scenario():
+        limiter = TurnLimiter(max_active=2, max_waiting=0)
+        scheduler = TurnScheduler(max_queued=4, limiter=limiter)
+        gates = {"a1": threading.Event()}
+        run = blocking_run(gates)
+
+        a1 = await scheduler.submit("a", "a1", run)
+        queued = [await scheduler.submit("a", f"a{i}", run) for i in (2, 3, 4)]
+        await wait_until(lambda: a1.turn.slot is not None)
+        assert limiter.active == 1
+
+        # Another client's thread still gets a slot and finishes
+        b1 = await scheduler.submit("b", "b1", run, client="other")
+        assert await asyncio.wait_for(collect(b1), 2) == ["b1 done"]
+
+        gates["a1"].set()
+        assert await collect(a1) == ["a1 done"]
+        results = [await asyncio.wait_for(collect(sub), 2) for sub in queued]
+        assert results == [["a2 done"], ["a3 done"], ["a4 done"]]
+        await wait_until(lambda: limiter.active == 0)
+
+    asyncio.run(scenario())
+
+
+def test_turns_on_one_thread_run_in_order():
+    async def scenario():
+        scheduler = TurnScheduler(max_queued=4, limiter=TurnLimiter(max_active=4, max_waiting=4))
+        order = []
+
+        def run(thread_id, message, info):
+            order.append(message)
+            yield message
+
+        subscriptions = [await scheduler.submit("t", f"m{i}", run) for i in range(4)]
+        for subscription in subscriptions:
+            await collect(subscription)
+        assert order == ["m0", "m1", "m2", "m3"]
+
+    asyncio.run(scenario())
+
+
+def test_queued_turn_refused_a_slot_reports_it_to_subscribers():
+    class RefuseSecond(TurnLimiter):
+        calls = 0
+
+        async def acquire(self, client="", priority="interactive"):
+            self.calls += 1
+            if self.calls == 2:
+                raise TurnRejected("Server busy", retry_after=3)
+            return await super().acquire(client, priority)
+
+    async def scenario():
+        limiter = RefuseSecond(max_active=2, max_waiting=2)
+        scheduler = TurnScheduler(max_queued=4, limiter=limiter)
+        gates = {"a1": threading.Event()}
+        run = blocking_run(gates)
+
+        a1 = await scheduler.submit("a", "a1", run)
+        # Queued: submit succeeds, the slot is only asked for after a1
+        a2 = await scheduler.submit("a", "a2", run)
+        a3 = await scheduler.submit("a", "a3", run)
+        assert limiter.calls == 1
+        gates["a1"].set()
+        assert await collect(a1) == ["a1 done"]
+        with pytest.raises(TurnRejected):
+            await collect(a2)
+        assert await collect(a3) == ["a3 done"]
+        await wait_until(lambda: limiter.active == 0)
+
+    asyncio.run(scenario())
+
+
+def test_identical_submission_attaches_and_depth_is_bounded():
+    async def scenario():
+        scheduler = TurnScheduler(max_queued=1, limiter=TurnLimiter(max_active=2, max_waiting=2))
+        gates = {"a1": threading.Event()}
+        run = blocking_run(gates)
+
+        a1 = await scheduler.submit("a", "a1", run)
+        again = await scheduler.submit("a", "a1", run)
+        assert again.turn is a1.turn and again.coalesced
+        await scheduler.submit("a", "a2", run)
+        with pytest.raises(ThreadQueueFull):
+            await scheduler.submit("a", "a3", run)
+        gates["a1"].set()
+        assert await collect(again) == ["a1 done"]
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_turn_keeps_its_slot_until_the_worker_returns():
+    async def scenario():
+        limiter = TurnLimiter(max_active=1, max_waiting=4)
+        scheduler = TurnScheduler(max_queued=4, limiter=limiter)
+        gates = {"a1": threading.Event()}
+        started = threading.Event()
+        order = []
+
+        def run(thread_id, message, info):
+            started.set()
+            gate = gates.get(message)
+            if gate is not None:
+                # A model call that cannot be interrupted
+                gate.wait(5)
+            order.append(message)
+            yield f"{message} done"
+
+        a1 = await scheduler.submit("a", "a1", run)
+        a1.turn.grace = 0
+        await wait_until(started.is_set)
+        a1.detach()
+        await wait_until(a1.turn.done.is_set)
+        with pytest.raises(Exception):
+            await collect(a1)
+
+        # The worker is still blocked: its slot and its thread stay taken
+        assert limiter.active == 1
+        a2 = await scheduler.submit("a", "a2", run)
+        b1 = asyncio.create_task(scheduler.submit("b", "b1", run))
+        await asyncio.sleep(0.05)
+        assert not b1.done() and order == []
+
+        gates["a1"].set()
+        b1 = await asyncio.wait_for(b1, 2)
+        assert await asyncio.wait_for(collect(a2), 2) == ["a2 done"]
+        assert await asyncio.wait_for(collect(b1), 2) == ["b1 done"]
+        assert order[0] == "a1"
+        await wait_until(lambda: limiter.active == 0)
+
+    asyncio.run(scenario())
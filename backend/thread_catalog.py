@@ -0,0 +1,311 @@
+"""
+Thread catalog: one indexed row per conversation thread.
+
+The sidebar only needs a name and a few counters per thread, so those live in
+their own table instead of being recovered from checkpoints. Listing threads
+is a single keyset-paginated query on this table and never touches a
+checkpoint blob.
+
+Deleting a thread only sets `deleted_at`: the thread disappears from every
+listing and refuses new turns at once, and the purge worker (purge.py)
+removes its data later and finally the catalog row itself.
+"""
+
+import base64
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS thread_catalog (
+    thread_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    last_activity REAL NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    deleted_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_thread_catalog_last_activity
+    ON thread_catalog (last_activity, thread_id);
+CREATE INDEX IF NOT EXISTS idx_thread_catalog_created_at
+    ON thread_catalog (created_at, thread_id);
+"""
+
+DELETED_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_thread_catalog_deleted_at
+    ON thread_catalog (deleted_at) WHERE deleted_at IS NOT NULL;
+"""
+
+ORDER_COLUMNS = ("last_activity", "created_at")
+DIRECTIONS = ("desc", "asc")
+MAX_PAGE_SIZE = 500
+NAME_LENGTH = 50
+
+# uuid6 timestamps count 100ns intervals since the Gregorian epoch (1582-10-15)
+_GREGORIAN_OFFSET = 12219292800
+
+
+class ThreadDeleted(Exception):
+    """Raised for a turn on a thread that has been deleted"""
+
+
+def make_thread_name(message: str) -> str:
+    """Build a sidebar name from the first user message"""
+    return message[:NAME_LENGTH] + "..." if len(message) > NAME_LENGTH else message
+
+
+def checkpoint_id_time(checkpoint_id: str) -> float:
+    """Recover the creation time (epoch seconds) encoded in a uuid6 checkpoint id"""
+    value = uuid.UUID(checkpoint_id).int
+    ticks = ((value >> 80) << 12) | ((value >> 64) & 0xFFF)
+    return ticks / 1e7 - _GREGORIAN_OFFSET
+
+
+def checkpoint_id_for_time(timestamp: float) -> str:
+    """
+    Smallest uuid6 checkpoint id at `timestamp`. uuid6 strings sort by time,
+    so `checkpoint_id < checkpoint_id_for_time(t)` selects checkpoints created before t.
+    """
+    ticks = int((timestamp + _GREGORIAN_OFFSET) * 1e7)
+    value = ((ticks >> 12) << 80) | (0x6 << 76) | ((ticks & 0xFFF) << 64)
+    return str(uuid.UUID(int=value))
+
+
+def encode_cursor(value, thread_id: str) -> str:
+    raw = json.dumps([value, thread_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        value, thread_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    return value, thread_id
+
+
+class ThreadCatalog:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.executescript(CATALOG_SCHEMA)
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(thread_catalog)")}
+            if "deleted_at" not in columns:
+                # Catalogs from before soft delete
+                self.conn.execute("ALTER TABLE thread_catalog ADD COLUMN deleted_at REAL")
+            self.conn.executescript(DELETED_INDEX)
+            self.conn.commit()
+
+    def start_turn(self, thread_id: str, name: str):
+        """Register a turn on a thread, creating its catalog row if needed"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                """INSERT INTO thread_catalog (thread_id, name, created_at, last_activity)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT(thread_id) DO UPDATE SET
+                       name = CASE WHEN thread_catalog.name = '' THEN excluded.name
+                                   ELSE thread_catalog.name END,
+                       last_activity = excluded.last_activity""",
+                (thread_id, name, now, now),
+            )
+            self.conn.commit()
+
+    def finish_turn(self, thread_id: str, message_count: int):
+        """Record the message count once a turn has been checkpointed"""
+        with self.lock:
+            self.conn.execute(
+                """UPDATE thread_catalog
+                   SET message_count = ?, last_activity = ?
+                   WHERE thread_id = ?""",
+                (message_count, time.time(), thread_id),
+            )
+            self.conn.commit()
+
+    def delete(self, thread_id: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM thread_catalog WHERE thread_id = ?", (thread_id,))
+            self.conn.commit()
+
+    def mark_deleted(self, thread_ids) -> int:
+        """
+        Soft-delete threads, including ones the catalog has never seen.
+        Returns how many were not already deleted.
+        """
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.executemany(
+                """INSERT INTO thread_catalog (thread_id, created_at, last_activity, deleted_at)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT(thread_id) DO UPDATE SET deleted_at = excluded.deleted_at
+                   WHERE thread_catalog.deleted_at IS NULL""",
+                [(thread_id, now, now, now) for thread_id in dict.fromkeys(thread_ids)],
+            )
+            self.conn.commit()
+        return cursor.rowcount
+
+    def mark_inactive_deleted(self, before: float) -> int:
+        """Soft-delete every thread without activity since `before`"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE thread_catalog SET deleted_at = ? WHERE deleted_at IS NULL AND last_activity < ?",
+                (time.time(), before),
+            )
+            self.conn.commit()
+        return cursor.rowcount
+
+    def is_deleted(self, thread_id: str) -> bool:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM thread_catalog WHERE thread_id = ? AND deleted_at IS NOT NULL", (thread_id,)
+            ).fetchone()
+        return row is not None
+
+    def is_live(self, thread_id: str) -> bool:
+        """Whether the thread is catalogued and not deleted (purged threads have no row)"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM thread_catalog WHERE thread_id = ? AND deleted_at IS NULL", (thread_id,)
+            ).fetchone()
+        return row is not None
+
+    def deleted_ids(self) -> list:
+        """Every deleted thread whose data is still to be purged"""
+        with self.lock:
+            rows = self.conn.execute("SELECT thread_id FROM thread_catalog WHERE deleted_at IS NOT NULL").fetchall()
+        return [thread_id for thread_id, in rows]
+
+    def pending_purge(self, limit: int = 100) -> list:
+        """Deleted threads whose data is still to be purged, oldest deletion first"""
+        with self.lock:
+            rows = self.conn.execute(
+                """SELECT thread_id FROM thread_catalog
+                   WHERE deleted_at IS NOT NULL ORDER BY deleted_at LIMIT ?""",
+                (limit,),
+            ).fetchall()
+        return [thread_id for thread_id, in rows]
+
+    def pending_purge_count(self) -> int:
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM thread_catalog WHERE deleted_at IS NOT NULL"
+            ).fetchone()[0]
+
+    def set_names(self, entries):
+        """
+        Write (thread_id, name, created_at, last_activity) rows in one
+        transaction. Existing rows only get the new name.
+        """
+        with self.lock:
+            self.conn.executemany(
+                """INSERT INTO thread_catalog (thread_id, name, created_at, last_activity)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT(thread_id) DO UPDATE SET name = excluded.name""",
+                entries,
+            )
+            self.conn.commit()
+
+    def names(self, thread_ids) -> dict:
+        """thread_id -> sidebar name for the given threads"""
+        thread_ids = list(set(thread_ids))
+        if not thread_ids:
+            return {}
+        placeholders = ",".join("?" * len(thread_ids))
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT thread_id, name FROM thread_catalog WHERE thread_id IN ({placeholders})",
+                thread_ids,
+            ).fetchall()
+        found = dict(rows)
+        return {thread_id: found.get(thread_id) or f"Chat {thread_id[:8]}" for thread_id in thread_ids}
+
+    def list_threads(self, limit=100, cursor=None, order="last_activity", direction="desc"):
+        """
+        Return one page of threads and the cursor for the next page.
+        The cursor is None once the last page has been returned.
+        """
+        if order not in ORDER_COLUMNS:
+            raise ValueError(f"Unsupported order '{order}'")
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Unsupported direction '{direction}'")
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        op = "<" if direction == "desc" else ">"
+        where, params = "WHERE deleted_at IS NULL", []
+        if cursor:
+            where += f" AND ({order}, thread_id) {op} (?, ?)"
+            params.extend(decode_cursor(cursor))
+
+        query = f"""SELECT thread_id, name, created_at, last_activity, message_count
+                    FROM thread_catalog
+                    {where}
+                    ORDER BY {order} {direction}, thread_id {direction}
+                    LIMIT ?"""
+        with self.lock:
+            rows = self.conn.execute(query, (*params, limit + 1)).fetchall()
+
+        threads = [
+            {
+                "thread_id": thread_id,
+                "name": name or f"Chat {thread_id[:8]}",
+                "created_at": created_at,
+                "last_activity": last_activity,
+                "message_count": message_count,
+            }
+            for thread_id, name, created_at, last_activity, message_count in rows[:limit]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last = threads[-1]
+            next_cursor = encode_cursor(last[order], last["thread_id"])
+        return threads, next_cursor
+
+    def backfill_from_checkpoints(self):
+        """
+        Seed an empty catalog from an existing checkpoints table.
+
+        Only checkpoint ids and the JSON metadata column are read: timestamps
+        come from the uuid6 checkpoint ids and names from the `name` key that
+        older versions stored in checkpoint metadata. Message counts are left
+        at zero until the thread's next turn.
+        """
+        with self.lock:
+            has_checkpoints = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'checkpoints'"
+            ).fetchone()
+            if not has_checkpoints:
+                return 0
+            if self.conn.execute("SELECT 1 FROM thread_catalog LIMIT 1").fetchone():
+                return 0
+
+            rows = self.conn.execute(
+                """SELECT thread_id,
+                          MIN(checkpoint_id),
+                          MAX(checkpoint_id),
+                          MAX(CASE WHEN json_valid(CAST(metadata AS TEXT))
+                                   THEN json_extract(CAST(metadata AS TEXT), '$.name') END)
+                   FROM checkpoints
+                   WHERE checkpoint_ns = ''
+                   GROUP BY thread_id"""
+            ).fetchall()
+
+            entries = []
+            for thread_id, first_id, last_id, name in rows:
+                try:
+                    created_at = checkpoint_id_time(first_id)
+                    last_activity = checkpoint_id_time(last_id)
+                except ValueError:
+                    created_at = last_activity = time.time()
+                entries.append((thread_id, name or "", created_at, last_activity))
+
+            self.conn.executemany(
+                """INSERT OR IGNORE INTO thread_catalog (thread_id, name, created_at, last_activity)
+                   VALUES (?, ?, ?, ?)""",
+                entries,
+            )
+            self.conn.commit()
+        return len(entries)
@@ -0,0 +1,192 @@
+"""
+TTL cache for tool results.
+
+Stock quotes and web searches are repeated across users all the time, and
+Alpha Vantage in particular has a tight per-minute quota. Results are
+cached per tool, keyed on the tool name and its normalized arguments:
+
+- each tool has its own TTL; tools without one (calculator) bypass the cache
+- entries are evicted least-recently-used once TOOL_CACHE_MAX_BYTES is hit
+- concurrent identical calls share a single upstream request
+- with TOOL_CACHE_SHARED=1 a SQLite table acts as a second tier shared by
+  every worker process using the same database
+
+Error payloads and Alpha Vantage throttling notices are never cached.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from metrics import Counter, Gauge
+
+TOOL_CACHE_TTLS = os.getenv("TOOL_CACHE_TTLS", "get_stock_price=60,duckduckgo_search=600")
+TOOL_CACHE_MAX_BYTES = int(os.getenv("TOOL_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+TOOL_CACHE_SHARED = os.getenv("TOOL_CACHE_SHARED", "0") == "1"
+
+cache_requests = Counter(
+    "tool_cache_requests_total",
+    "Tool cache lookups by result (hit, shared_hit, coalesced, miss)",
+    labelnames=("tool", "result"),
+)
+cache_bytes = Gauge("tool_cache_bytes", "Approximate size of the in-process tool cache")
+
+SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tool_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tool_cache_expires_at ON tool_cache (expires_at);
+"""
+
+# Alpha Vantage answers throttled requests with HTTP 200 and one of these keys
+THROTTLE_KEYS = ("Note", "Information", "Error Message")
+
+
+def parse_ttls(spec: str) -> dict:
+    ttls = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, seconds = item.partition("=")
+        ttls[name.strip()] = float(seconds)
+    return ttls
+
+
+def _normalize_value(value):
+    if isinstance(value, str):
+        return " ".join(value.split())
+    return value
+
+
+def normalize_args(tool_name: str, args: dict) -> dict:
+    args = {key: _normalize_value(value) for key, value in args.items()}
+    if tool_name == "get_stock_price" and isinstance(args.get("symbol"), str):
+        args["symbol"] = args["symbol"].upper()
+    elif tool_name == "duckduckgo_search" and isinstance(args.get("query"), str):
+        args["query"] = args["query"].lower()
+    return args
+
+
+def cache_key(tool_name: str, args: dict) -> str:
+    return tool_name + ":" + json.dumps(
+        normalize_args(tool_name, args), sort_keys=True, separators=(",", ":"), default=str
+    )
+
+
+def is_cacheable(result) -> bool:
+    if isinstance(result, dict):
+        return not any(key in result for key in ("error", *THROTTLE_KEYS))
+    if isinstance(result, str):
+        return not result.startswith("An error occurred")
+    return result is not None
+
+
+class SharedToolCache:
+    """Second cache tier in SQLite, visible to every process on the same database"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.executescript(SHARED_SCHEMA)
+            self.conn.commit()
+
+    def get(self, key: str):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM tool_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value, ttl: float):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO tool_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, default=str), time.time() + ttl),
+            )
+            self.conn.execute("DELETE FROM tool_cache WHERE expires_at <= ?", (time.time(),))
+            self.conn.commit()
+
+
+class ToolResultCache:
+    def __init__(self, ttls: dict = None, max_bytes: int = TOOL_CACHE_MAX_BYTES,
+                 shared: SharedToolCache = None):
+        self.ttls = ttls if ttls is not None else parse_ttls(TOOL_CACHE_TTLS)
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.entries = OrderedDict()  # key -> (expires_at, size, value)
+        self.size = 0
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def _get_local(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, size, value = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            self.size -= size
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def _set_local(self, key: str, value, ttl: float):
+        size = len(key) + len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= old[1]
+        self.entries[key] = (time.monotonic() + ttl, size, value)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted_size, _) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+        cache_bytes.set(self.size)
+
+    def get_or_call(self, tool_name: str, args: dict, call):
+        """Return a cached result for this tool call, or run `call()` once and cache it"""
+        ttl = self.ttls.get(tool_name)
+        if not ttl:
+            return call()
+
+        key = cache_key(tool_name, args)
+        with self.lock:
+            entry = self._get_local(key)
+            if entry is not None:
+                cache_requests.inc(tool=tool_name, result="hit")
+                return entry[2]
+            future = self.inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self.inflight[key] = Future()
+
+        if not leader:
+            cache_requests.inc(tool=tool_name, result="coalesced")
+            return future.result()
+
+        try:
+            result = self.shared.get(key) if self.shared else None
+            if result is not None:
+                cache_requests.inc(tool=tool_name, result="shared_hit")
+            else:
+                cache_requests.inc(tool=tool_name, result="miss")
+                result = call()
+                if is_cacheable(result) and self.shared:
+                    self.shared.set(key, result, ttl)
+            if is_cacheable(result):
+                with self.lock:
+                    self._set_local(key, result, ttl)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
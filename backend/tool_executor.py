@@ -0,0 +1,126 @@
+"""
+Concurrent execution of the tool calls requested in a single model turn.
+
+When Gemini asks for several tools at once (three quotes and a search, say)
+they run side by side on a shared thread pool, so the turn waits for the
+slowest call rather than the sum of all of them. The pool size is the
+global cap on tool calls in flight across every turn in the process. Each
+call has its own timeout, counted from when it starts running; a call that
+cannot even start within that time, because the pool is full, is dropped
+with outcome "queued". Results are returned in call order whatever order
+they finish in.
+"""
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import Histogram
+
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "8"))
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "20"))
+# Per-tool overrides, e.g. "get_stock_price=10,duckduckgo_search=15"
+TOOL_TIMEOUTS = os.getenv("TOOL_TIMEOUTS", "")
+
+tool_latency = Histogram(
+    "tool_call_duration_seconds",
+    "Wall time of individual tool calls (for outcome=queued, time spent waiting for the pool)",
+    labelnames=("tool", "outcome"),
+)
+
+
+def outcome_of(result) -> str:
+    return "error" if isinstance(result, dict) and "error" in result else "ok"
+
+
+def parse_timeouts(spec: str) -> dict:
+    timeouts = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, seconds = item.partition("=")
+        timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+
+class ToolRegistry:
+    def __init__(self, tools, *, max_concurrency: int = TOOL_MAX_CONCURRENCY,
+                 default_timeout: float = TOOL_TIMEOUT_SECONDS, timeouts: dict = None,
+                 cache=None):
+        self.tools = list(tools)
+        self.cache = cache
+        self.by_name = {t.name: t for t in self.tools}
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts if timeouts is not None else parse_timeouts(TOOL_TIMEOUTS)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="tool")
+
+    def timeout_for(self, name: str) -> float:
+        return self.timeouts.get(name, self.default_timeout)
+
+    def invoke(self, name: str, args: dict):
+        """Run one tool synchronously, turning failures into an error payload"""
+        tool = self.by_name.get(name)
+        if tool is None:
+            return {"error": f"Unknown tool '{name}'"}
+        try:
+            if self.cache is not None:
+                return self.cache.get_or_call(name, args, lambda: tool.invoke(args))
+            return tool.invoke(args)
+        except Exception as e:
+            return {"error": str(e)}
+
+    def _invoke_timed(self, name: str, args: dict, timing: dict):
+        # Read by run_calls: the timeout only runs once the call has a worker
+        timing["started"] = time.monotonic()
+        try:
+            return self.invoke(name, args)
+        finally:
+            timing["finished"] = time.monotonic()
+
+    def run_calls(self, tool_calls, on_event=None) -> list:
+        """
+        Run every tool call concurrently and return the results in call order.
+        `on_event(kind, call, **details)` is told when each call starts
+        ("tool_start") and when it finishes ("tool_end", with result,
+        duration and outcome), in the order things happen, on this thread.
+        Latency is observed here, once per call.
+        """
+        pending = {}
+        for index, call in enumerate(tool_calls):
+            timing = {}
+            future = self.executor.submit(self._invoke_timed, call["name"], call["args"], timing)
+            pending[future] = (index, call, time.monotonic(), timing)
+            if on_event is not None:
+                on_event("tool_start", call)
+
+        def deadline(submitted: float, timing: dict, name: str) -> float:
+            return timing.get("started", submitted) + self.timeout_for(name)
+
+        results = [None] * len(tool_calls)
+        while pending:
+            nearest = min(deadline(submitted, timing, call["name"]) for _, call, submitted, timing in pending.values())
+            wait(pending, timeout=max(nearest - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for future in list(pending):
+                index, call, submitted, timing = pending[future]
+                name, timeout = call["name"], self.timeout_for(call["name"])
+                if future.done():
+                    result = future.result()
+                    outcome = outcome_of(result)
+                elif now < deadline(submitted, timing, name):
+                    continue
+                elif "started" in timing:
+                    # The worker keeps running until the tool returns; only the turn moves on
+                    result = {"error": f"Tool '{name}' timed out after {timeout}s"}
+                    outcome = "timeout"
+                elif future.cancel():
+                    result = {"error": f"Tool '{name}' did not start within {timeout}s, too many tool calls running"}
+                    outcome = "queued"
+                else:
+                    # Picked up by a worker just now: its timeout starts when it runs
+                    continue
+                del pending[future]
+                results[index] = result
+                duration = timing.get("finished", now) - timing.get("started", submitted)
+                tool_latency.observe(duration, tool=name, outcome=outcome)
+                if on_event is not None:
+                    on_event("tool_end", call, result=result, duration=duration, outcome=outcome)
+        return results
@@ -0,0 +1,215 @@
+"""
+Compact tool results for the model and the checkpoint.
+
+A ToolMessage stays in the thread for good: it is checkpointed on every
+later step and re-sent to the model on every later turn. So instead of
+str() of whatever the tool returned (a full Alpha Vantage response, a list
+of search hits), each tool has a compactor that keeps the fields the model
+needs:
+
+- get_stock_price:   JSON with symbol, price, change, change_percent,
+                     volume and day
+- duckduckgo_search: one "- title: url — snippet" line per result
+- anything else:     the result as is, as JSON
+
+The text is capped per tool (TOOL_RESULT_LIMITS, else
+TOOL_RESULT_MAX_CHARS), dropping trailing results first. When that cap
+cuts results off, or the raw result is larger than TOOL_PAYLOAD_MIN_CHARS,
+the raw payload goes to the `tool_payloads` table and its payload_id goes
+in the ToolMessage artifact, which the model never sees; GET
+/tool-payloads/{payload_id} returns it. Fields the compactor drops from a
+small result (an Alpha Vantage quote's open, high and low) are not worth a
+row per call. Payloads belong to their thread and are purged with it.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+from tool_cache import THROTTLE_KEYS
+
+TOOL_RESULT_MAX_CHARS = int(os.getenv("TOOL_RESULT_MAX_CHARS", "1000"))
+# Per-tool caps, e.g. "get_stock_price=300,duckduckgo_search=1200"
+TOOL_RESULT_LIMITS = os.getenv("TOOL_RESULT_LIMITS", "get_stock_price=300,duckduckgo_search=450")
+TOOL_TITLE_CHARS = int(os.getenv("TOOL_TITLE_CHARS", "60"))
+TOOL_SNIPPET_CHARS = int(os.getenv("TOOL_SNIPPET_CHARS", "40"))
+TOOL_PAYLOAD_STORE = os.getenv("TOOL_PAYLOAD_STORE", "1") == "1"
+# Raw results at least this large are kept even when nothing was cut off
+TOOL_PAYLOAD_MIN_CHARS = int(os.getenv("TOOL_PAYLOAD_MIN_CHARS", "4096"))
+
+PAYLOAD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tool_payloads (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT NOT NULL,
+    tool TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tool_payloads_thread ON tool_payloads (thread_id);
+"""
+
+
+def parse_limits(spec: str) -> dict:
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, chars = item.partition("=")
+        limits[name.strip()] = int(chars)
+    return limits
+
+
+def _number(value):
+    try:
+        number = round(float(str(value).rstrip("%")), 4)
+    except (TypeError, ValueError):
+        return value
+    return int(number) if number.is_integer() else number
+
+
+def _shorten(text, limit: int) -> str:
+    if limit <= 0:
+        return ""
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+# ---- compactors ----
+def compact_quote(raw):
+    if not isinstance(raw, dict):
+        return raw
+    for key in THROTTLE_KEYS:
+        if key in raw:
+            return {"error": raw[key]}
+    quote = raw.get("Global Quote")
+    if quote is None:
+        return raw
+    if not quote:
+        return {"error": "No quote found for this symbol"}
+    fields = {key.split(". ", 1)[-1]: value for key, value in quote.items()}
+    return {
+        "symbol": fields.get("symbol"),
+        "price": _number(fields.get("price")),
+        "change": _number(fields.get("change")),
+        "change_percent": fields.get("change percent"),
+        "volume": _number(fields.get("volume")),
+        "day": fields.get("latest trading day"),
+    }
+
+
+def compact_search(raw):
+    if not isinstance(raw, dict) or "results" not in raw:
+        return raw
+    # Plain lines: JSON keys would cost more than the snippets
+    lines = []
+    for item in raw["results"]:
+        line = f"- {_shorten(item.get('title'), TOOL_TITLE_CHARS)}: {item.get('url') or item.get('href')}"
+        snippet = _shorten(item.get("snippet") or item.get("content") or item.get("body"), TOOL_SNIPPET_CHARS)
+        lines.append(f"{line} — {snippet}" if snippet else line)
+    return "\n".join(lines) or "No results found"
+
+
+COMPACTORS = {
+    "get_stock_price": compact_quote,
+    "duckduckgo_search": compact_search,
+}
+
+
+def compact(tool: str, raw):
+    compactor = COMPACTORS.get(tool)
+    return compactor(raw) if compactor else raw
+
+
+_limits = parse_limits(TOOL_RESULT_LIMITS)
+
+
+def dumps(value) -> str:
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def render(tool: str, value, limits: dict = None) -> str:
+    """Compact text for `value`, cut to the tool's size cap"""
+    limits = limits if limits is not None else _limits
+    cap = limits.get(tool, TOOL_RESULT_MAX_CHARS)
+    text = dumps(value)
+    if len(text) <= cap:
+        return text
+    if isinstance(value, str) and "\n" in value:
+        # One result per line: keep whole lines
+        lines = value.split("\n")
+        for kept in range(len(lines) - 1, 0, -1):
+            text = "\n".join(lines[:kept] + [f"({len(lines) - kept} more omitted)"])
+            if len(text) <= cap:
+                return text
+    if isinstance(value, dict) and isinstance(value.get("results"), list):
+        # Whole results read better than a cut-off one
+        results = value["results"]
+        for kept in range(len(results) - 1, 0, -1):
+            text = dumps({**value, "results": results[:kept], "omitted": len(results) - kept})
+            if len(text) <= cap:
+                return text
+    return text[:cap - 1] + "…"
+
+
+# ---- payload store ----
+class ToolPayloadStore:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.executescript(PAYLOAD_SCHEMA)
+            self.conn.commit()
+
+    def put(self, thread_id: str, tool: str, payload) -> str:
+        payload_id = uuid.uuid4().hex[:16]
+        data = zlib.compress(json.dumps(payload, separators=(",", ":"), default=str).encode())
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO tool_payloads (id, thread_id, tool, created_at, data) VALUES (?, ?, ?, ?, ?)",
+                (payload_id, thread_id, tool, time.time(), data),
+            )
+            self.conn.commit()
+        return payload_id
+
+    def get(self, payload_id: str):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT thread_id, tool, created_at, data FROM tool_payloads WHERE id = ?", (payload_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        thread_id, tool, created_at, data = row
+        return {
+            "id": payload_id,
+            "thread_id": thread_id,
+            "tool": tool,
+            "created_at": created_at,
+            "payload": json.loads(zlib.decompress(data)),
+        }
+
+    def delete_thread(self, thread_id: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM tool_payloads WHERE thread_id = ?", (thread_id,))
+            self.conn.commit()
+
+
+def format_tool_result(tool: str, raw, store: ToolPayloadStore = None, thread_id: str = None) -> tuple:
+    """
+    (content, artifact) for a tool result's ToolMessage: compact text
+    within the tool's cap, and {"payload_id": ...} when the raw result was
+    set aside (else None)
+    """
+    value = compact(tool, raw)
+    text = render(tool, value)
+    artifact = None
+    if store is not None and TOOL_PAYLOAD_STORE and isinstance(raw, (dict, list)):
+        raw_text = dumps(raw)
+        cut = text != dumps(value)
+        large = len(raw_text) >= TOOL_PAYLOAD_MIN_CHARS and text != raw_text
+        if cut or large:
+            artifact = {"payload_id": store.put(thread_id, tool, raw)}
+    return text, artifact
@@ -0,0 +1,244 @@
+"""
+Runs blocking LangGraph turns on a bounded worker pool and bridges their
+output back to the event loop.
+
+The compiled graph, the Gemini client and the SQLite checkpointer are all
+synchronous, so iterating `chatbot.stream(...)` inside an async endpoint
+blocks every other request. Each turn instead runs on its own worker thread
+and hands items to the request through a bounded buffer: a slow client
+stalls only its own worker, and the number of turns in flight is capped per
+process.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import Gauge, Histogram
+
+MAX_CONCURRENT_TURNS = int(os.getenv("MAX_CONCURRENT_TURNS", "16"))
+MAX_WAITING_TURNS = int(os.getenv("MAX_WAITING_TURNS", "64"))
+STREAM_BUFFER_SIZE = int(os.getenv("STREAM_BUFFER_SIZE", "256"))
+
+executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_TURNS, thread_name_prefix="turn")
+
+turns_active = Gauge("chat_turns_active", "Turns holding a worker slot")
+turns_waiting = Gauge("chat_turns_waiting", "Turns queued for a worker slot")
+queue_wait = Histogram(
+    "chat_turn_queue_wait_seconds",
+    "Time turns waited for a worker slot",
+    labelnames=("priority",),
+)
+
+# Waiting turns are served in this order; /chat/batch items are bulk
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, BULK)
+
+_DONE = object()
+
+
+class TurnRejected(Exception):
+    """Raised when too many turns are already waiting for a worker"""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TurnSlot:
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.released = False
+        self.acquired_at = time.monotonic()
+
+    def release(self):
+        # Safe to call from both the stream's finally block and the
+        # response's background task, whichever runs first wins.
+        if not self.released:
+            self.released = True
+            self.limiter._release(time.monotonic() - self.acquired_at)
+
+
+class TurnLimiter:
+    """
+    Hands out up to `max_active` worker slots. Waiting turns are served
+    interactive before bulk and, within a priority, round robin between
+    clients, so one client's burst queues behind its own turns rather
+    than everyone else's. Once `max_waiting` turns wait, a newcomer takes
+    the place of the newest waiter of the busiest client (lower priority
+    first) if that client has more turns waiting than the newcomer's;
+    otherwise the newcomer is refused. Either way the refused turn gets
+    TurnRejected with a Retry-After estimated from recent turn durations.
+    """
+
+    def __init__(self, max_active: int, max_waiting: int):
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.waiting = 0
+        # priority -> client -> futures waiting for a slot, in arrival order
+        self.queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self.average_hold = 1.0
+
+    async def acquire(self, client: str = "", priority: str = INTERACTIVE) -> TurnSlot:
+        if self.active < self.max_active and not self.waiting:
+            return self._grant()
+        if self.waiting >= self.max_waiting and not self._evict(client, priority):
+            raise self._rejection()
+        future = asyncio.get_running_loop().create_future()
+        self.queues[priority].setdefault(client, deque()).append(future)
+        self.waiting += 1
+        turns_waiting.set(self.waiting)
+        started = time.perf_counter()
+        try:
+            slot = await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as we were cancelled: pass the slot on
+                future.result().release()
+            else:
+                self._forget(priority, client, future)
+            raise
+        queue_wait.observe(time.perf_counter() - started, priority=priority)
+        return slot
+
+    def _rejection(self) -> TurnRejected:
+        return TurnRejected(
+            f"Server busy: {self.active} turns running, {self.waiting} waiting",
+            retry_after=max(1.0, self.average_hold * (self.waiting + 1) / self.max_active),
+        )
+
+    def _evict(self, client: str, priority: str) -> bool:
+        """Refuse the newest turn of a heavier waiter to make room; False if there is none"""
+        rank = PRIORITIES.index(priority)
+        own = sum(len(clients.get(client, ())) for clients in self.queues.values())
+        for victim_priority in reversed(PRIORITIES[rank:]):
+            clients = self.queues[victim_priority]
+            if not clients:
+                continue
+            victim = max(clients, key=lambda name: len(clients[name]))
+            if victim_priority == priority and len(clients[victim]) <= own + 1:
+                continue
+            future = clients[victim].pop()
+            if not clients[victim]:
+                del clients[victim]
+            self.waiting -= 1
+            turns_waiting.set(self.waiting)
+            if not future.done():
+                future.set_exception(self._rejection())
+            return True
+        return False
+
+    def _grant(self) -> TurnSlot:
+        self.active += 1
+        turns_active.set(self.active)
+        return TurnSlot(self)
+
+    def _forget(self, priority: str, client: str, future):
+        waiters = self.queues[priority].get(client)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            if not waiters:
+                del self.queues[priority][client]
+            self.waiting -= 1
+            turns_waiting.set(self.waiting)
+
+    def _next_waiter(self):
+        for priority in PRIORITIES:
+            clients = self.queues[priority]
+            if clients:
+                # The first client in line, which then goes to the back
+                client, waiters = next(iter(clients.items()))
+                future = waiters.popleft()
+                del clients[client]
+                if waiters:
+                    clients[client] = waiters
+                return future
+        return None
+
+    def _release(self, held: float):
+        self.average_hold += 0.1 * (held - self.average_hold)
+        self.active -= 1
+        while self.active < self.max_active:
+            future = self._next_waiter()
+            if future is None:
+                break
+            self.waiting -= 1
+            turns_waiting.set(self.waiting)
+            if not future.done():
+                # Skips waiters cancelled before they got to clean up
+                future.set_result(self._grant())
+        turns_active.set(self.active)
+
+
+turn_limiter = TurnLimiter(MAX_CONCURRENT_TURNS, MAX_WAITING_TURNS)
+
+
+async def iterate_in_worker(fn, *args, buffer_size: int = STREAM_BUFFER_SIZE, on_exit=None):
+    """
+    Run the blocking generator `fn(*args)` on the turn pool and yield its
+    items asynchronously. At most `buffer_size` items are held between the
+    worker and the consumer; beyond that the worker waits for the consumer.
+    Closing this generator (e.g. on client disconnect) stops the worker at
+    its next item. `on_exit` is called on the event loop once the worker
+    has actually returned, which can be well after the consumer stopped
+    (the worker is blocked in a model or tool call until it returns).
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    space = threading.Semaphore(buffer_size)
+    cancelled = threading.Event()
+
+    def hand_over(item, error=None):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+        except RuntimeError:
+            # Event loop already closed, nobody is listening any more
+            cancelled.set()
+
+    def produce():
+        items = None
+        try:
+            if cancelled.is_set():
+                # Closed while this waited for a pool thread
+                return
+            items = fn(*args)
+            for item in items:
+                while not space.acquire(timeout=0.1):
+                    if cancelled.is_set():
+                        return
+                if cancelled.is_set():
+                    return
+                hand_over(item)
+        except BaseException as e:
+            hand_over(_DONE, e)
+        else:
+            hand_over(_DONE)
+        finally:
+            try:
+                # Runs the generator's own cleanup when the consumer went away
+                if hasattr(items, "close"):
+                    items.close()
+            finally:
+                if on_exit is not None:
+                    try:
+                        loop.call_soon_threadsafe(on_exit)
+                    except RuntimeError:
+                        pass
+
+    loop.run_in_executor(executor, produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                break
+            space.release()
+            yield item
+    finally:
+        cancelled.set()
@@ -0,0 +1,269 @@
+"""
+Per-thread turn scheduling.
+
+Turns on one thread run one after another; turns on different threads run
+in parallel. A submission identical to a turn that is still queued or
+running on the same thread (a double-submit, a second tab) does not start
+another graph run: it attaches to the existing turn and reads the same
+chunks from the first one on. At most THREAD_QUEUE_DEPTH turns wait behind
+the running one per thread; past that submit() raises ThreadQueueFull.
+Only a running turn holds a worker slot from the turn limiter: a turn
+queued behind another on its thread asks for one when that turn ends, so
+idle queues never keep other clients' turns out.
+
+Chunks are kept on the turn until it ends so late subscribers can catch up,
+which also means a slow client no longer holds back the worker. They are
+also the replay buffer for clients that lost their connection: every turn
+has an id, and resume() subscribes again from any chunk position, while
+the turn runs and for STREAM_REPLAY_SECONDS after it ended, without
+running anything again. A turn is cancelled once every subscriber has been
+gone for STREAM_RESUME_GRACE_SECONDS. Its worker thread cannot be
+interrupted inside a model or tool call, so the turn keeps its worker slot,
+and its place at the head of the thread's queue, until that thread returns.
+
+This only orders turns inside one process. Worker processes are kept off
+each other's threads by leases (see leases.py).
+"""
+
+import asyncio
+import os
+import time
+import uuid
+
+from metrics import Counter, Histogram
+from turn_runner import INTERACTIVE, iterate_in_worker, turn_limiter
+
+THREAD_QUEUE_DEPTH = int(os.getenv("THREAD_QUEUE_DEPTH", "4"))
+STREAM_RESUME_GRACE_SECONDS = float(os.getenv("STREAM_RESUME_GRACE_SECONDS", "10"))
+STREAM_REPLAY_SECONDS = float(os.getenv("STREAM_REPLAY_SECONDS", "30"))
+
+turns_coalesced = Counter(
+    "chat_turns_coalesced_total",
+    "Submissions attached to an identical queued or running turn",
+)
+thread_queue_rejected = Counter(
+    "chat_thread_queue_rejected_total",
+    "Submissions rejected because their thread's queue was full",
+)
+thread_queue_wait = Histogram(
+    "chat_thread_queue_wait_seconds",
+    "Time a turn waited for the previous turn on its thread",
+)
+
+
+class ThreadQueueFull(Exception):
+    """Raised when a thread already has THREAD_QUEUE_DEPTH turns waiting"""
+
+
+class TurnCancelled(Exception):
+    """Raised to subscribers of a turn that was cancelled before it finished"""
+
+
+class Turn:
+    def __init__(self, thread_id: str, message: str, slot=None, grace: float = STREAM_RESUME_GRACE_SECONDS):
+        self.id = uuid.uuid4().hex
+        self.thread_id = thread_id
+        self.message = message
+        # The worker slot, once the turn has one
+        self.slot = slot
+        # Set once the worker thread owns the slot and will release it on exit
+        self.slot_in_worker = False
+        # Set when the turn has let go of its slot and its thread's queue
+        self.exited = asyncio.Event()
+        self.chunks = []
+        self.info = {}
+        self.error = None
+        self.subscribers = 0
+        self.done = asyncio.Event()
+        self.task = None
+        self.grace = grace
+        self._cancel_timer = None
+        self._changed = asyncio.Event()
+
+    def _publish(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _attach(self):
+        self.subscribers += 1
+        if self._cancel_timer is not None:
+            self._cancel_timer.cancel()
+            self._cancel_timer = None
+
+    def _detach(self):
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.done.is_set():
+            if self.grace > 0:
+                # Leave the client time to reconnect
+                self._cancel_timer = asyncio.get_running_loop().call_later(self.grace, self.task.cancel)
+            else:
+                self.task.cancel()
+
+
+class Subscription:
+    """One request's view of a turn; detach() is safe to call more than once"""
+
+    def __init__(self, turn: Turn, coalesced: bool = False, start: int = 0, resumed: bool = False):
+        self.turn = turn
+        self.coalesced = coalesced
+        self.start = start
+        self.resumed = resumed
+        self.detached = False
+        turn._attach()
+
+    @property
+    def info(self) -> dict:
+        info = dict(self.turn.info)
+        if self.coalesced:
+            info["coalesced"] = True
+        if self.resumed:
+            info["resumed"] = True
+        return info
+
+    async def chunks(self):
+        """
+        Yield every chunk of the turn from position `start` on, then raise
+        its error if it failed
+        """
+        turn = self.turn
+        position = self.start
+        try:
+            while True:
+                if position < len(turn.chunks):
+                    position += 1
+                    yield turn.chunks[position - 1]
+                elif turn.done.is_set():
+                    if turn.error is not None:
+                        raise turn.error
+                    return
+                else:
+                    await turn._changed.wait()
+        finally:
+            self.detach()
+
+    def detach(self):
+        if not self.detached:
+            self.detached = True
+            self.turn._detach()
+
+
+class TurnScheduler:
+    def __init__(self, max_queued: int = THREAD_QUEUE_DEPTH, limiter=turn_limiter):
+        self.max_queued = max_queued
+        self.limiter = limiter
+        # thread_id -> unfinished turns, the running one first
+        self.threads = {}
+        # turn id -> turn, until STREAM_REPLAY_SECONDS after it ended
+        self.turns = {}
+
+    def _find(self, thread_id: str, message: str):
+        for turn in self.threads.get(thread_id, ()):
+            if turn.message == message and not turn.done.is_set():
+                return turn
+        return None
+
+    def _check_depth(self, thread_id: str):
+        if len(self.threads.get(thread_id, ())) > self.max_queued:
+            thread_queue_rejected.inc()
+            raise ThreadQueueFull(f"Too many turns queued on thread '{thread_id}'")
+
+    async def submit(self, thread_id: str, message: str, run, client: str = "",
+                     priority: str = INTERACTIVE) -> Subscription:
+        """
+        Queue `run(thread_id, message, info)`, a blocking generator of text
+        chunks and event dicts, behind the thread's other turns, or attach to an identical
+        turn. Raises ThreadQueueFull. A turn on an idle thread takes its
+        worker slot here and raises TurnRejected when none can be had; a
+        turn queued behind others takes it once they are done, and its
+        subscribers get the TurnRejected then. `client` and `priority`
+        decide its place in the limiter's queue.
+        """
+        turn = self._find(thread_id, message)
+        if turn is not None:
+            return self._coalesce(turn)
+        self._check_depth(thread_id)
+        slot = None
+        if not self.threads.get(thread_id):
+            slot = await self.limiter.acquire(client, priority)
+            # Another request may have queued a turn on the thread while we waited
+            turn = self._find(thread_id, message)
+            if turn is not None:
+                slot.release()
+                return self._coalesce(turn)
+            if self.threads.get(thread_id):
+                # Behind that turn now: no slot until it is done
+                slot.release()
+                slot = None
+                self._check_depth(thread_id)
+        return self._start(thread_id, message, slot, run, client, priority)
+
+    def _coalesce(self, turn: Turn) -> Subscription:
+        turns_coalesced.inc()
+        return Subscription(turn, coalesced=True)
+
+    def resume(self, turn_id: str, position: int):
+        """
+        Subscribe to a turn again from chunk `position`, or None when the
+        turn is unknown or its replay buffer has expired
+        """
+        turn = self.turns.get(turn_id)
+        if turn is None or not 0 <= position <= len(turn.chunks):
+            return None
+        return Subscription(turn, start=position, resumed=True)
+
+    def _start(self, thread_id: str, message: str, slot, run, client: str = "",
+               priority: str = INTERACTIVE) -> Subscription:
+        queue = self.threads.setdefault(thread_id, [])
+        previous = queue[-1] if queue else None
+        turn = Turn(thread_id, message, slot)
+        queue.append(turn)
+        self.turns[turn.id] = turn
+        # Subscribe before the task can run, so it is not cancelled as unwatched
+        subscription = Subscription(turn)
+        turn.task = asyncio.create_task(self._run(turn, previous, run, client, priority))
+        # A callback rather than a finally block: it also runs when the task
+        # is cancelled before it ever started
+        turn.task.add_done_callback(lambda task: self._finish(turn, task))
+        return subscription
+
+    async def _run(self, turn: Turn, previous, run, client: str, priority: str):
+        if previous is not None:
+            started = time.perf_counter()
+            await previous.done.wait()
+            await previous.exited.wait()
+            thread_queue_wait.observe(time.perf_counter() - started)
+        try:
+            if turn.slot is None:
+                turn.slot = await self.limiter.acquire(client, priority)
+            # No await between here and the worker being started by the loop
+            # below. A cancelled turn's worker runs on until its model or tool
+            # call returns, so the slot is released only when the worker exits.
+            turn.slot_in_worker = True
+            async for chunk in iterate_in_worker(run, turn.thread_id, turn.message, turn.info,
+                                                 on_exit=lambda: self._exit(turn)):
+                turn.chunks.append(chunk)
+                turn._publish()
+        except Exception as e:
+            turn.error = e
+
+    def _finish(self, turn: Turn, task: asyncio.Task):
+        if task.cancelled():
+            turn.error = TurnCancelled("Turn cancelled, every client disconnected")
+        if not turn.slot_in_worker:
+            self._exit(turn)
+        turn.done.set()
+        turn._publish()
+        asyncio.get_running_loop().call_later(STREAM_REPLAY_SECONDS, self.turns.pop, turn.id, None)
+
+    def _exit(self, turn: Turn):
+        """Give up the turn's slot and queue place, once nothing runs for it any more"""
+        if turn.slot is not None:
+            turn.slot.release()
+        queue = self.threads.get(turn.thread_id, [])
+        if turn in queue:
+            queue.remove(turn)
+        if not queue:
+            self.threads.pop(turn.thread_id, None)
+        turn.exited.set()
+
+turn_scheduler = TurnScheduler()
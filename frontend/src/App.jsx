@@ -5,18 +5,34 @@ import './App.css';
 
 function App() {
   const [threads, setThreads] = useState([]);
+  const [threadsCursor, setThreadsCursor] = useState(null);
+  const [isLoadingThreads, setIsLoadingThreads] = useState(false);
   const [currentThreadId, setCurrentThreadId] = useState(null);
   const [messages, setMessages] = useState([]);
+  const [hasEarlierMessages, setHasEarlierMessages] = useState(false);
+  const [isLoadingEarlier, setIsLoadingEarlier] = useState(false);
   const [inputMessage, setInputMessage] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const [streamingMessage, setStreamingMessage] = useState('');
+  const [toolStatus, setToolStatus] = useState('');
   const messagesEndRef = useRef(null);
+  const messagesRef = useRef(null);
+  // Set while earlier messages are prepended, so the view stays where it was
+  const keepScrollRef = useRef(null);
+  // Whether pages past the first are in the sidebar; refreshes keep them
+  const loadedMoreThreadsRef = useRef(false);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
 
   useEffect(() => {
+    const container = messagesRef.current;
+    if (keepScrollRef.current !== null && container) {
+      container.scrollTop = container.scrollHeight - keepScrollRef.current;
+      keepScrollRef.current = null;
+      return;
+    }
     scrollToBottom();
   }, [messages, streamingMessage]);
 
@@ -27,7 +43,14 @@ function App() {
   const loadThreads = async () => {
     try {
       const data = await chatAPI.getThreads();
-      setThreads(data.threads);
+      if (loadedMoreThreadsRef.current) {
+        // Refresh the first page and keep the older pages below it
+        const firstPage = new Set(data.threads.map((thread) => thread.thread_id));
+        setThreads(prev => [...data.threads, ...prev.filter((thread) => !firstPage.has(thread.thread_id))]);
+      } else {
+        setThreads(data.threads);
+        setThreadsCursor(data.next_cursor);
+      }
       
       if (!currentThreadId && data.threads.length === 0) {
         await createNewThread();
@@ -41,11 +64,30 @@ function App() {
     }
   };
 
+  const loadMoreThreads = async () => {
+    if (!threadsCursor || isLoadingThreads) return;
+    setIsLoadingThreads(true);
+    try {
+      const data = await chatAPI.getThreads(threadsCursor);
+      loadedMoreThreadsRef.current = true;
+      setThreads(prev => {
+        const shown = new Set(prev.map((thread) => thread.thread_id));
+        return [...prev, ...data.threads.filter((thread) => !shown.has(thread.thread_id))];
+      });
+      setThreadsCursor(data.next_cursor);
+    } catch (error) {
+      console.error('Error loading more threads:', error);
+    } finally {
+      setIsLoadingThreads(false);
+    }
+  };
+
   const createNewThread = async () => {
     try {
       const data = await chatAPI.createThread();
       setCurrentThreadId(data.thread_id);
       setMessages([]);
+      setHasEarlierMessages(false);
       await loadThreads();
     } catch (error) {
       console.error('Error creating thread:', error);
@@ -56,15 +98,33 @@ function App() {
     try {
       const data = await chatAPI.getConversation(threadId);
       setMessages(data.messages);
+      setHasEarlierMessages(data.has_more);
       setCurrentThreadId(threadId);
     } catch (error) {
       console.error('Error loading conversation:', error);
     }
   };
 
+  const loadEarlierMessages = async () => {
+    const oldest = messages[0];
+    if (!oldest || oldest.seq == null || isLoadingEarlier) return;
+    setIsLoadingEarlier(true);
+    try {
+      const data = await chatAPI.getConversation(currentThreadId, oldest.seq);
+      keepScrollRef.current = messagesRef.current ? messagesRef.current.scrollHeight : null;
+      setMessages(prev => [...data.messages, ...prev]);
+      setHasEarlierMessages(data.has_more);
+    } catch (error) {
+      console.error('Error loading earlier messages:', error);
+    } finally {
+      setIsLoadingEarlier(false);
+    }
+  };
+
   const deleteThread = async (threadId) => {
     try {
       await chatAPI.deleteThread(threadId);
+      setThreads(prev => prev.filter((thread) => thread.thread_id !== threadId));
       
       if (threadId === currentThreadId) {
         await createNewThread();
@@ -87,6 +147,7 @@ function App() {
     setMessages(prev => [...prev, { role: 'user', content: userMessage }]);
     setIsLoading(true);
     setStreamingMessage('');
+    setToolStatus('');
 
     try {
       let accumulatedResponse = '';
@@ -101,6 +162,7 @@ function App() {
         async (threadId) => {
           setMessages(prev => [...prev, { role: 'assistant', content: accumulatedResponse }]);
           setStreamingMessage('');
+          setToolStatus('');
           setIsLoading(false);
           await loadThreads();
         },
@@ -111,7 +173,15 @@ function App() {
             { role: 'assistant', content: 'Sorry, there was an error processing your message.' }
           ]);
           setStreamingMessage('');
+          setToolStatus('');
           setIsLoading(false);
+        },
+        (event) => {
+          if (event.type === 'tool_start') {
+            setToolStatus(`Running ${event.tool}...`);
+          } else if (event.type === 'tool_end') {
+            setToolStatus('');
+          }
         }
       );
     } catch (error) {
@@ -219,12 +289,21 @@ function App() {
                 </button>
               </div>
             ))}
+            {threadsCursor && (
+              <button
+                className="load-more-btn"
+                onClick={loadMoreThreads}
+                disabled={isLoadingThreads}
+              >
+                {isLoadingThreads ? 'Loading...' : 'Load more'}
+              </button>
+            )}
           </div>
         </div>
 
         {/* Main Chat Area */}
         <div className="chat-container">
-          <div className="messages">
+          <div className="messages" ref={messagesRef}>
             {messages.length === 0 && !streamingMessage ? (
               <div className="empty-state">
                 <div className="empty-state-icon">
@@ -253,6 +332,15 @@ function App() {
               </div>
             ) : (
               <>
+                {hasEarlierMessages && (
+                  <button
+                    className="load-more-btn"
+                    onClick={loadEarlierMessages}
+                    disabled={isLoadingEarlier}
+                  >
+                    {isLoadingEarlier ? 'Loading...' : 'Load earlier messages'}
+                  </button>
+                )}
                 {messages.map((msg, index) => (
                   <div key={index} className={`message ${msg.role}`}>
                     <div className="message-avatar">
@@ -288,6 +376,7 @@ function App() {
                       <span></span>
                       <span></span>
                     </div>
+                    {toolStatus && <span className="tool-status">{toolStatus}</span>}
                   </div>
                 </div>
               </div>
@@ -9,10 +9,70 @@ const api = axios.create({
   },
 });
 
+const STREAM_MAX_RECONNECTS = 5;
+const STREAM_RECONNECT_DELAY_MS = 500;
+
+// Incremental Server-Sent Events parser. Feed it text as it arrives, split
+// anywhere; it calls onFrame({ id, event, data }) once per complete frame.
+export const createSSEParser = (onFrame) => {
+  let buffer = '';
+  let id = null;
+  let event = null;
+  let data = [];
+
+  const processLine = (line) => {
+    if (line === '') {
+      // A blank line ends the frame
+      if (data.length) onFrame({ id, event: event || 'message', data: data.join('\n') });
+      id = null;
+      event = null;
+      data = [];
+      return;
+    }
+    if (line.startsWith(':')) return; // comment, e.g. keep-alive
+
+    const colon = line.indexOf(':');
+    const field = colon === -1 ? line : line.slice(0, colon);
+    let value = colon === -1 ? '' : line.slice(colon + 1);
+    if (value.startsWith(' ')) value = value.slice(1);
+
+    if (field === 'data') data.push(value);
+    else if (field === 'event') event = value;
+    else if (field === 'id') id = value;
+  };
+
+  return (text) => {
+    buffer += text;
+    let match;
+    while ((match = /\r\n|\r|\n/.exec(buffer)) !== null) {
+      // A trailing \r may be the first half of \r\n
+      if (match[0] === '\r' && match.index === buffer.length - 1) break;
+      processLine(buffer.slice(0, match.index));
+      buffer = buffer.slice(match.index + match[0].length);
+    }
+  };
+};
+
+const readEventStream = async (response, onFrame) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  const push = createSSEParser(onFrame);
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    // stream: true keeps multi-byte characters split across reads intact
+    push(decoder.decode(value, { stream: true }));
+  }
+  push(decoder.decode());
+};
+
 export const chatAPI = {
-  // Get all threads
-  getThreads: async () => {
-    const response = await api.get('/threads');
+  // Get one page of threads, most recently active first; pass next_cursor for the next page
+  getThreads: async (cursor) => {
+    const response = await api.get('/threads', {
+      params: cursor ? { cursor } : {},
+    });
     return response.data;
   },
 
@@ -22,10 +82,37 @@ export const chatAPI = {
     return response.data;
   },
 
-  // Send message with streaming
-  sendMessageStream: async (message, threadId, onChunk, onComplete, onError) => {
+  // Send message with streaming; onEvent (optional) gets tool_start, tool_end and node events,
+  // and reconnecting when a dropped connection is being resumed
+  sendMessageStream: async (message, threadId, onChunk, onComplete, onError, onEvent) => {
+    let lastEventId = null;
+    let finished = false;
+
+    const handleFrame = (frame) => {
+      let data;
+      try {
+        data = JSON.parse(frame.data);
+      } catch (error) {
+        // A broken frame will not parse any better after a reconnect
+        throw Object.assign(error, { fatal: true });
+      }
+      if (frame.id) lastEventId = frame.id;
+
+      if (data.type === 'content') {
+        onChunk(data.content);
+      } else if (data.type === 'done') {
+        finished = true;
+        onComplete(data.thread_id);
+      } else if (data.type === 'error') {
+        finished = true;
+        onError(data.error);
+      } else if (onEvent) {
+        onEvent(data);
+      }
+    };
+
     try {
-      const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+      let response = await fetch(`${API_BASE_URL}/chat/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -39,31 +126,39 @@ export const chatAPI = {
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
+      // Lets us resume even if the connection drops before the first frame
+      const turnId = response.headers.get('X-Turn-Id');
+      lastEventId = turnId ? `${turnId}:0` : null;
 
-      const reader = response.body.getReader();
-      const decoder = new TextDecoder();
-
+      let attempts = 0;
       while (true) {
-        const { done, value } = await reader.read();
-        
-        if (done) break;
-
-        const chunk = decoder.decode(value);
-        const lines = chunk.split('\n');
-
-        for (const line of lines) {
-          if (line.startsWith('data: ')) {
-            const data = JSON.parse(line.substring(6));
-            
-            if (data.type === 'content') {
-              onChunk(data.content);
-            } else if (data.type === 'done') {
-              onComplete(data.thread_id);
-            } else if (data.type === 'error') {
-              onError(data.error);
+        const resumedFrom = lastEventId;
+        try {
+          if (!response) {
+            // Replays what the turn produced after lastEventId; the model is not called again
+            response = await fetch(`${API_BASE_URL}/chat/stream/resume`, {
+              headers: { 'Last-Event-ID': lastEventId },
+            });
+            if (!response.ok) {
+              throw Object.assign(new Error(`Could not resume the response (status ${response.status})`), {
+                fatal: true,
+              });
             }
           }
+          await readEventStream(response, handleFrame);
+        } catch (error) {
+          if (error.fatal || !lastEventId) throw error;
         }
+        if (finished) return;
+
+        if (lastEventId !== resumedFrom) attempts = 0;
+        if (!lastEventId || attempts >= STREAM_MAX_RECONNECTS) {
+          throw new Error('Connection lost while streaming the response');
+        }
+        attempts += 1;
+        if (onEvent) onEvent({ type: 'reconnecting', attempt: attempts });
+        await new Promise((resolve) => setTimeout(resolve, STREAM_RECONNECT_DELAY_MS * attempts));
+        response = null;
       }
     } catch (error) {
       onError(error.message);
@@ -79,9 +174,12 @@ export const chatAPI = {
     return response.data;
   },
 
-  // Get conversation
-  getConversation: async (threadId) => {
-    const response = await api.get(`/conversation/${threadId}`);
+  // Get conversation: the newest page, or the page before `before` (a message seq);
+  // has_more says whether there are older messages
+  getConversation: async (threadId, before) => {
+    const response = await api.get(`/conversation/${threadId}`, {
+      params: before == null ? {} : { before },
+    });
     return response.data;
   },
 